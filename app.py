@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context, g
 import psycopg2
 import psycopg2.extras
 import re
@@ -16,16 +16,71 @@ import ipaddress
 import ssl
 import requests
 import json
-from PIL import Image, ImageDraw, ImageFont
 import io
+import csv
+import gzip
+import hashlib
 import requests
 import platform
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from db_pool import ConnectionPool, PooledConnection, execute_prepared, inline_positional
+from ttl_cache import TTLCache, InvalidationLog
+from zpl_graphics import GFA_ENCODINGS, crop_to_ink, gfa_ratio, gfa_size, image_to_gfa
+from fonts import CALIBRI_BOLD, get_font, registry as font_registry
+from glyph_atlas import get_atlas, render_text
+from http_pool import HTTPSessionPool
+from json_logging import logging_stats, new_request_id, request_id_var, setup_logging
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsRegistry
+from print_queue import FINAL_STATUSES, STATUS_SPOOLED, JobStore, PrintJobQueue, QueueFullError
 
 app = Flask(__name__)
 
 # Carregar variáveis do .env
 load_dotenv()
 
+# Logs estruturados (JSON por linha) escritos por uma thread de fundo;
+# LOG_LEVEL=DEBUG liga o rastro detalhado de busca/renderização/impressão
+setup_logging()
+log = logging.getLogger('app')
+
+# Métricas Prometheus (/metrics). Com vários workers do gunicorn, METRICS_DIR
+# aponta para um diretório compartilhado onde cada worker grava as suas e a
+# coleta soma todas (o start.sh esvazia o diretório ao subir)
+metrics = MetricsRegistry(os.getenv('METRICS_DIR') or None)
+http_request_seconds = metrics.histogram(
+    'etiquetas_http_request_seconds', 'Duração das requisições HTTP até a resposta', ['endpoint', 'method', 'status']
+)
+http_requests_in_flight = metrics.gauge(
+    'etiquetas_http_requests_in_flight', 'Requisições HTTP em andamento', ['endpoint']
+)
+stage_seconds = metrics.histogram(
+    'etiquetas_stage_seconds', 'Duração de cada etapa: parse, db_lookup, render, print_server, local_print, spool', ['stage']
+)
+stage_in_flight = metrics.gauge('etiquetas_stage_in_flight', 'Etapas em andamento', ['stage'])
+print_fallbacks = metrics.counter(
+    'etiquetas_print_fallbacks_total', 'Trocas de caminho na impressão (Calibri -> ^A0 -> local/spool)', ['from', 'to']
+)
+labels_delivered = metrics.counter(
+    'etiquetas_labels_total', 'Etiquetas entregues por caminho (spool = guardada para reenvio)', ['via']
+)
+gfa_bytes = metrics.counter(
+    'etiquetas_gfa_bytes_total', 'Bytes dos ^GFA renderizados: hex equivalente (raw) e enviado (encoded)', ['kind']
+)
+errors_total = metrics.counter('etiquetas_errors_total', 'Erros por etapa e tipo', ['stage', 'type'])
+
+@contextmanager
+def observe_stage(stage):
+    """Mede a etapa no histograma e a conta como em andamento enquanto dura"""
+    with stage_in_flight.labels(stage).track_inprogress(), stage_seconds.labels(stage).time():
+        yield
+
+def count_error(stage, error):
+    """Conta um erro pela classe da exceção (ou por um tipo já em texto)"""
+    errors_total.labels(stage, error if isinstance(error, str) else type(error).__name__).inc()
+
 def get_db_connection():
     """Conecta ao banco PostgreSQL"""
     conn = psycopg2.connect(
@@ -33,17 +88,55 @@ def get_db_connection():
         database=os.getenv('DB_NAME'),
         user=os.getenv('DB_USER'),
         password=os.getenv('DB_PSW'),
-        port=os.getenv('DB_PORT', 5432)
+        port=os.getenv('DB_PORT', 5432),
+        connection_factory=PooledConnection
     )
     return conn
 
+# Pool de conexões (um por processo do gunicorn, compartilhado entre threads)
+_db_pool = None
+_db_pool_lock = threading.Lock()
+
+def get_db_pool():
+    """Retorna o pool do processo atual, recriando-o após fork"""
+    global _db_pool
+    pool = _db_pool
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+
+    with _db_pool_lock:
+        if _db_pool is None or _db_pool.pid != os.getpid():
+            # Conexões herdadas do processo pai não são fechadas aqui: fechar
+            # o socket compartilhado derrubaria a sessão do outro processo.
+            max_lifetime = float(os.getenv('DB_POOL_MAX_LIFETIME', '0')) or None
+            _db_pool = ConnectionPool(
+                connect=get_db_connection,
+                minconn=int(os.getenv('DB_POOL_MIN', '1')),
+                maxconn=int(os.getenv('DB_POOL_MAX', '4')),
+                timeout=float(os.getenv('DB_POOL_TIMEOUT', '5')),
+                healthcheck_after=float(os.getenv('DB_POOL_HEALTHCHECK_IDLE', '30')),
+                max_lifetime=max_lifetime
+            )
+            try:
+                _db_pool.warm()
+            except Exception as e:
+                log.warning("[POOL] Não foi possível abrir conexões iniciais: %s", e)
+        return _db_pool
+
+@contextmanager
+def db_connection():
+    """Empresta uma conexão do pool e devolve ao final do bloco"""
+    with get_db_pool().connection() as conn:
+        yield conn
+
 def parse_barcode(barcode):
     """Separa o código de barras em peça e OP"""
-    # Remove espaços e converte para maiúsculo
-    barcode = barcode.strip().upper()
-    
-    # Padrão: letras seguidas de números (ex: PBS12345)
-    match = re.match(r'^([A-Z]+)(\d+)$', barcode)
+    with observe_stage('parse'):
+        # Remove espaços e converte para maiúsculo
+        barcode = barcode.strip().upper()
+        
+        # Padrão: letras seguidas de números (ex: PBS12345)
+        match = re.match(r'^([A-Z]+)(\d+)$', barcode)
     if match:
         peca = match.group(1)  # string
         op = match.group(2)    # string que será convertida para int na query
@@ -51,43 +144,185 @@ def parse_barcode(barcode):
     
     return None, None
 
+# Modo de busca do serial:
+#   prepared - uma ida ao banco, statement preparado no servidor (padrão)
+#   joined   - uma ida ao banco sem PREPARE (pgbouncer em modo transaction)
+#   legacy   - duas consultas sequenciais
+SERIAL_LOOKUP_MODE = os.getenv('SERIAL_LOOKUP_MODE', 'prepared').strip().lower()
+
+# Planta usada para buscar projeto/veículo em dados_uso_geral.dados_op
+PLANTA = os.getenv('PLANTA', 'Jarinu')
+
+# Cache de projeto/veículo por (OP, planta): uma OP cobre centenas de leituras
+# seguidas e seus dados não mudam durante o turno. OP_CACHE_SIZE=0 desativa.
+OP_CACHE_SIZE = int(os.getenv('OP_CACHE_SIZE', '512'))
+OP_CACHE_TTL = float(os.getenv('OP_CACHE_TTL', '3600'))
+op_cache = TTLCache(maxsize=OP_CACHE_SIZE, ttl=OP_CACHE_TTL) if OP_CACHE_SIZE > 0 else None
+
+# Atlas de glifos para renderizar seriais (GLYPH_ATLAS=0 volta ao FreeType puro)
+GLYPH_ATLAS_ENABLED = os.getenv('GLYPH_ATLAS', '1').strip().lower() not in ('0', 'false', 'no', 'off')
+
+# Codificação do bitmap no ^GFA: acs (compressão ASCII do ZPL, padrão),
+# z64 (deflate + base64, firmware x.14 ou mais novo) ou hex (sem compressão)
+GFA_ENCODING = os.getenv('GFA_ENCODING', 'acs').strip().lower()
+if GFA_ENCODING not in GFA_ENCODINGS:
+    log.warning("GFA_ENCODING=%s desconhecido, usando hex", GFA_ENCODING)
+    GFA_ENCODING = 'hex'
+
+# Margem fixa (dots) do bitmap antes do recorte na tinta: mantém a altura da
+# tinta na etiqueta e é a referência da redução de payload nos logs/métricas
+LABEL_PADDING = 10
+
+# Invalidações manuais chegam a todos os workers do gunicorn por este log
+cache_invalidations = InvalidationLog(os.getenv('CACHE_INVALIDATION_FILE') or None)
+
+def _invalidate_op_cache(op):
+    if op_cache is None:
+        return
+    if op is None:
+        op_cache.clear()
+    else:
+        op_cache.invalidate_where(lambda key: key[0] == op)
+
+cache_invalidations.register('op', _invalidate_op_cache)
+
+SERIAL_STATEMENT = 'buscar_serial'
+SERIAL_SQL = '''
+    SELECT serial_number, peca, op
+    FROM public.controle_serial_number
+    WHERE peca = $1 AND op = $2
+    ORDER BY created DESC
+    LIMIT 1
+'''
+
+OP_DATA_STATEMENT = 'buscar_dados_op'
+OP_DATA_SQL = '''
+    SELECT codigo_veiculo, modelo
+    FROM dados_uso_geral.dados_op
+    WHERE planta = $1 AND op = $2
+    LIMIT 1
+'''
+
+# $2 e $3 recebem a mesma OP: cada ocorrência tem o tipo inferido da sua
+# coluna, como acontecia nas duas consultas separadas.
+SERIAL_LOOKUP_STATEMENT = 'buscar_serial_com_op'
+SERIAL_LOOKUP_SQL = '''
+    SELECT s.serial_number, s.peca, s.op, d.codigo_veiculo, d.modelo, d.encontrado
+    FROM (
+        SELECT serial_number, peca, op
+        FROM public.controle_serial_number
+        WHERE peca = $1 AND op = $2
+        ORDER BY created DESC
+        LIMIT 1
+    ) s
+    LEFT JOIN LATERAL (
+        SELECT codigo_veiculo, modelo, TRUE AS encontrado
+        FROM dados_uso_geral.dados_op
+        WHERE planta = $4 AND op = $3
+        LIMIT 1
+    ) d ON TRUE
+'''
+
+# Busca em lote (/buscar-lote): todos os pares (peça, OP) em uma consulta.
+# DISTINCT ON pega o serial mais recente de cada par; os dados da OP vêm
+# na mesma ida ao banco. Os arrays chegam deduplicados do Python.
+# As chaves vêm como text: as colunas são comparadas via ::text para a
+# consulta valer com op/peca VARCHAR ou numéricas (em VARCHAR o cast não
+# impede o uso do índice), e peca/op voltam como foram pedidos.
+SERIAL_BATCH_STATEMENT = 'buscar_seriais_lote'
+SERIAL_BATCH_SQL = '''
+    SELECT s.serial_number, s.peca, s.op, d.codigo_veiculo, d.modelo, d.encontrado
+    FROM (
+        SELECT DISTINCT ON (k.peca, k.op) c.serial_number, k.peca, k.op
+        FROM unnest($1::text[], $2::text[]) AS k(peca, op)
+        JOIN public.controle_serial_number c ON c.peca::text = k.peca AND c.op::text = k.op
+        ORDER BY k.peca, k.op, c.created DESC
+    ) s
+    LEFT JOIN LATERAL (
+        SELECT codigo_veiculo, modelo, TRUE AS encontrado
+        FROM dados_uso_geral.dados_op
+        WHERE planta = $3 AND op::text = s.op
+        LIMIT 1
+    ) d ON TRUE
+'''
+
+# Máximo de códigos por requisição em /buscar-lote
+BUSCA_LOTE_LIMIT = int(os.getenv('BUSCA_LOTE_LIMIT', '5000'))
+
+def _execute_lookup(cursor, name, sql, params, prepared):
+    if prepared:
+        execute_prepared(cursor, name, sql, params)
+    else:
+        cursor.execute(*inline_positional(sql, params))
+
+def fetch_serial(cursor, peca, op, prepared=False):
+    """Busca apenas o serial mais recente da peça/OP"""
+    _execute_lookup(cursor, SERIAL_STATEMENT, SERIAL_SQL, (peca, op), prepared)
+    return cursor.fetchone()
+
+def fetch_op_data(cursor, op, prepared=False):
+    """Busca projeto (codigo_veiculo) e veículo (modelo) da OP"""
+    _execute_lookup(cursor, OP_DATA_STATEMENT, OP_DATA_SQL, (PLANTA, op), prepared)
+    return cursor.fetchone()
+
+def fetch_serial_legacy(cursor, peca, op):
+    """Busca serial e dados da OP em duas consultas. Retorna (serial, op_data)"""
+    result = fetch_serial(cursor, peca, op)
+    
+    if not result:
+        return None, None
+    
+    log.debug("Serial encontrado: %s", result)
+    
+    # Buscar projeto e veículo na tabela dados_uso_geral.dados_op
+    log.debug("Buscando projeto e veículo para OP: %s", op)
+    
+    return result, fetch_op_data(cursor, op)
+
+def fetch_serial_joined(cursor, peca, op, prepared=True):
+    """Busca serial e dados da OP em uma única ida ao banco. Retorna (serial, op_data)"""
+    _execute_lookup(cursor, SERIAL_LOOKUP_STATEMENT, SERIAL_LOOKUP_SQL, (peca, op, op, PLANTA), prepared)
+    
+    row = cursor.fetchone()
+    
+    if not row:
+        return None, None
+    
+    log.debug("Serial encontrado: %s", row[:3])
+    
+    op_data = (row[3], row[4]) if row[5] else None
+    return row[:3], op_data
+
 def search_serial_number(peca, op):
     """Busca o serial_number na tabela baseado na peça e OP, e busca projeto/veículo"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        print(f"[DEBUG] Buscando no banco: peca='{peca}', op='{op}'", flush=True)
-        
-        # Buscar serial number
-        cursor.execute('''
-            SELECT serial_number, peca, op
-            FROM public.controle_serial_number 
-            WHERE peca = %s AND op = %s
-            ORDER BY created DESC
-            LIMIT 1
-        ''', (peca, op))
-        
-        result = cursor.fetchone()
-        
-        if not result:
-            conn.close()
-            return None
-        
-        print(f"[DEBUG] Serial encontrado: {result}", flush=True)
-        
-        # Buscar projeto e veículo na tabela dados_uso_geral.dados_op
-        print(f"[DEBUG] Buscando projeto e veículo para OP: {op}", flush=True)
-        
-        cursor.execute('''
-            SELECT codigo_veiculo, modelo
-            FROM dados_uso_geral.dados_op
-            WHERE planta = 'Jarinu' AND op = %s
-            LIMIT 1
-        ''', (op,))
+        op_key = (op, PLANTA)
+        op_data = None
+        if op_cache is not None:
+            cache_invalidations.poll()
+            op_data = op_cache.get(op_key)
+        op_data_cached = op_data is not None
+        prepared = SERIAL_LOOKUP_MODE == 'prepared'
+        
+        with observe_stage('db_lookup'), db_connection() as conn:
+            cursor = conn.cursor()
+            
+            log.debug("Buscando no banco: peca='%s', op='%s' (modo %s)", peca, op, SERIAL_LOOKUP_MODE)
+            
+            if op_data_cached:
+                # Projeto/veículo já conhecidos: só o serial vai ao banco
+                log.debug("Projeto/veículo da OP %s vindos do cache", op)
+                result = fetch_serial(cursor, peca, op, prepared=prepared)
+            elif SERIAL_LOOKUP_MODE == 'legacy':
+                result, op_data = fetch_serial_legacy(cursor, peca, op)
+            else:
+                result, op_data = fetch_serial_joined(cursor, peca, op, prepared=prepared)
+            
+            if not result:
+                return None
         
-        op_data = cursor.fetchone()
-        conn.close()
+        if op_data is not None and not op_data_cached and op_cache is not None:
+            op_cache.set(op_key, tuple(op_data))
         
         # Montar resultado
         resultado = {
@@ -101,140 +336,313 @@ def search_serial_number(peca, op):
         if op_data:
             resultado['projeto'] = op_data[0]  # codigo_veiculo
             resultado['veiculo'] = op_data[1]  # modelo
-            print(f"[DEBUG] Projeto: {op_data[0]}, Veículo: {op_data[1]}", flush=True)
+            log.debug("Projeto: %s, Veículo: %s", op_data[0], op_data[1])
         else:
-            print(f"[DEBUG] Nenhum projeto/veículo encontrado para OP {op}", flush=True)
+            log.debug("Nenhum projeto/veículo encontrado para OP %s", op)
         
         return resultado
         
     except Exception as e:
-        print(f"[DEBUG] Erro na busca no banco: {str(e)}", flush=True)
+        log.error("Erro na busca no banco: %s", e)
+        count_error('db_lookup', e)
         return None
 
-def text_to_zpl_image(text, font_path=r"C:\Windows\Fonts\calibrib.ttf", font_size=27):
+def fetch_serials_batch(cursor, pairs, prepared=True):
+    """Busca o serial mais recente e os dados da OP de vários pares (peça, OP)
+
+    Retorna {(peca, op): resultado}; pares sem registro ficam de fora.
+    """
+    pecas = [peca for peca, _ in pairs]
+    ops = [op for _, op in pairs]
+    _execute_lookup(cursor, SERIAL_BATCH_STATEMENT, SERIAL_BATCH_SQL, (pecas, ops, PLANTA), prepared)
+    
+    found = {}
+    for serial_number, peca, op, codigo_veiculo, modelo, encontrado in cursor.fetchall():
+        found[(peca, op)] = {
+            'serial_number': serial_number,
+            'peca': peca,
+            'op': op,
+            'projeto': codigo_veiculo if encontrado else None,
+            'veiculo': modelo if encontrado else None
+        }
+    return found
+
+def search_serial_numbers(pairs):
+    """Busca vários pares (peça, OP) em uma única consulta. Retorna {(peca, op): resultado}"""
+    unique = list(dict.fromkeys(pairs))
+    if not unique:
+        return {}
+    
+    with observe_stage('db_lookup'), db_connection() as conn:
+        cursor = conn.cursor()
+        log.debug("Buscando %s pares peça/OP em lote", len(unique))
+        found = fetch_serials_batch(cursor, unique, prepared=SERIAL_LOOKUP_MODE == 'prepared')
+    
+    # Aproveita a mesma ida ao banco para aquecer o cache de projeto/veículo
+    if op_cache is not None:
+        for resultado in found.values():
+            if resultado['projeto'] is not None or resultado['veiculo'] is not None:
+                op_cache.set((resultado['op'], PLANTA), (resultado['projeto'], resultado['veiculo']))
+    
+    return found
+
+def text_to_zpl_image(text, font_path=CALIBRI_BOLD, font_size=27):
     """Converte texto com fonte Calibri em imagem ZPL (espelhado horizontalmente)"""
     try:
-        print(f"[DEBUG] Texto original: {text}", flush=True)
-        
-        # Criar fonte (tamanho 27)
-        font = ImageFont.truetype(font_path, font_size)
-        
-        # Calcular tamanho do texto
-        bbox = font.getbbox(text)
-        text_width = bbox[2] - bbox[0]
-        text_height = bbox[3] - bbox[1]
-        
-        # Adicionar padding
-        padding = 10
-        img_width = text_width + (padding * 2)
-        img_height = text_height + (padding * 2)
-        
-        # Criar imagem em branco (1 bit - preto e branco)
-        image = Image.new('1', (img_width, img_height), 1)  # 1 = branco
-        draw = ImageDraw.Draw(image)
-        
-        # Desenhar texto normal
-        x = padding
-        y = padding - bbox[1]  # Ajustar baseline
-        draw.text((x, y), text, font=font, fill=0)  # 0 = preto
-        
-        print(f"[DEBUG] Texto desenhado (normal, sem espelhamento): {text}", flush=True)
-        
-        # Converter para bytes ZPL
-        # Calcular bytes por linha (arredondado para múltiplo de 8)
-        bytes_per_row = (img_width + 7) // 8
-        total_bytes = bytes_per_row * img_height
-        
-        # Converter imagem para hex
-        hex_data = []
-        for y in range(img_height):
-            row_bytes = []
-            for x in range(0, img_width, 8):
-                byte_val = 0
-                for bit in range(8):
-                    if x + bit < img_width:
-                        pixel = image.getpixel((x + bit, y))
-                        if pixel == 0:  # Preto
-                            byte_val |= (1 << (7 - bit))
-                row_bytes.append(f"{byte_val:02X}")
-            hex_data.append(''.join(row_bytes))
-        
-        hex_string = ''.join(hex_data)
-        
-        # Calcular posição para centralizar na etiqueta (360 dots de largura)
+        log.debug("Texto original: %s", text)
+        
+        # Fonte carregada uma vez por processo (tamanho 27)
+        font = get_font(font_path, font_size)
+        if font is None:
+            count_error('render', 'fonte_indisponivel')
+            return None
+        
+        with observe_stage('render'):
+            # Desenhar texto normal (1 bit, sem margem); o atlas de glifos
+            # monta o mesmo bitmap do FreeType sem rasterizar a string inteira
+            image = render_text(text, font, padding=0, use_atlas=GLYPH_ATLAS_ENABLED)
+            # Tamanho que o bitmap teria com a margem fixa de 10px de antes
+            padded_bytes = gfa_size(image.width + 2 * LABEL_PADDING, image.height + 2 * LABEL_PADDING)
+            
+            # Recortar na tinta: só linhas e colunas com pixel preto vão no ^GFA
+            image, ink_box = crop_to_ink(image)
+            img_width, img_height = image.size
+            
+            log.debug("Texto desenhado (normal, sem espelhamento): %s", text)
+            
+            # Converter para bytes ZPL (^GFA, bytes por linha arredondados para múltiplo de 8)
+            gfa_data, total_bytes, bytes_per_row = image_to_gfa(image, GFA_ENCODING)
+            gfa_bytes.labels('raw').inc(total_bytes * 2)
+            gfa_bytes.labels('encoded').inc(len(gfa_data))
+            gfa_bytes.labels('padded').inc(padded_bytes * 2)
+        
+        # Centralizar a tinta na etiqueta (360 dots de largura); na vertical a
+        # tinta fica onde ficava com a margem (topo em 15 + margem)
         x_pos = (360 - img_width) // 2
-        y_pos = 15
+        y_pos = 15 + LABEL_PADDING + (ink_box[1] if ink_box else 0)
         
         # Criar comando ZPL
         zpl = (
             f"^XA"
             f"^FO{x_pos},{y_pos}"
-            f"^GFA,{total_bytes},{total_bytes},{bytes_per_row},{hex_string}"
+            f"^GFA,{total_bytes},{total_bytes},{bytes_per_row},{gfa_data}"
             f"^FS"
             f"^XZ"
         )
         
-        print(f"[DEBUG] Imagem gerada: {img_width}x{img_height} pixels", flush=True)
-        print(f"[DEBUG] Posição: X={x_pos}, Y={y_pos}", flush=True)
+        # A redução e a razão do ^GFA custam contas por etiqueta: só em DEBUG
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Imagem gerada: %sx%s pixels (tinta)", img_width, img_height)
+            log.debug(
+                "Bitmap: %s bytes, %s com margem (%.0f%% menor)",
+                total_bytes, padded_bytes, 100 * (1 - total_bytes / padded_bytes),
+            )
+            log.debug("^GFA %s: %s caracteres (%.1fx menor que hex)", GFA_ENCODING, len(gfa_data), gfa_ratio(total_bytes, gfa_data))
+            log.debug("Posição: X=%s, Y=%s", x_pos, y_pos)
         
         return zpl
         
     except Exception as e:
-        print(f"[DEBUG] Erro ao gerar imagem: {str(e)}", flush=True)
+        log.error("Erro ao gerar imagem: %s", e)
+        count_error('render', e)
         return None
 
+# Conexões keep-alive com o servidor de impressão, compartilhadas pelas threads
+# do worker: uma por thread do gunicorn + threads da fila/spool de impressão
+PRINT_SERVER_CONNECT_TIMEOUT = float(os.getenv('PRINT_SERVER_CONNECT_TIMEOUT', '3'))
+PRINT_SERVER_READ_TIMEOUT = float(os.getenv('PRINT_SERVER_READ_TIMEOUT', '15'))
+PRINT_SERVER_FALLBACK_READ_TIMEOUT = float(os.getenv('PRINT_SERVER_FALLBACK_READ_TIMEOUT', '10'))
+PRINT_SERVER_POOL_SIZE = int(os.getenv('PRINT_SERVER_POOL_SIZE') or (
+    int(os.getenv('GUNICORN_THREADS', '4')) + int(os.getenv('PRINT_QUEUE_WORKERS', '2')) + 1
+))
+
+print_server_http = HTTPSessionPool(
+    pool_size=PRINT_SERVER_POOL_SIZE,
+    connect_timeout=PRINT_SERVER_CONNECT_TIMEOUT,
+    read_timeout=PRINT_SERVER_READ_TIMEOUT
+)
+
+# Impressão em lote (/imprimir-lote): máximo de seriais por requisição e
+# timeout de leitura do lote inteiro (renderização + spooler no servidor)
+PRINT_BATCH_LIMIT = int(os.getenv('PRINT_BATCH_LIMIT', '200'))
+PRINT_BATCH_READ_TIMEOUT = float(os.getenv('PRINT_BATCH_READ_TIMEOUT', '60'))
+BATCH_UNSUPPORTED = "Servidor de impressão sem /print-calibri-batch"
+# O servidor esgotou a espera com o job já em envio: a etiqueta pode ter saído,
+# então não há fallback, spool nem impressão local para esse serial
+PRINT_STATUS_UNKNOWN = "Situação da impressão desconhecida: verifique se a etiqueta saiu antes de reimprimir"
+
+def _status_unknown(response):
+    """Resposta de erro do servidor de impressão com "status": "unknown" no JSON"""
+    try:
+        data = response.json()
+    except ValueError:
+        return False
+    return isinstance(data, dict) and data.get('status') == 'unknown'
+
+def default_font_zpl(serial_number):
+    """ZPL com a fonte interna da Zebra, usado quando a Calibri não está disponível"""
+    return (
+        f"^XA"
+        f"^LH0,0"
+        f"^FO0,20"
+        f"^A0N,29,29"
+        f"^FB360,1,0,C,0"
+        f"^FD{serial_number}^FS"
+        f"^PQ1"
+        f"^XZ"
+    )
+
+def request_id_headers():
+    """Repassa o request_id ao servidor de impressão (mesmo ID nos logs dos dois lados)"""
+    request_id = request_id_var.get()
+    return {'X-Request-ID': request_id} if request_id else {}
+
+def post_to_print_server(url, **kwargs):
+    """POST ao servidor de impressão pelo pool, medido como etapa print_server
+
+    Falhas de rede e respostas de erro entram em etiquetas_errors_total.
+    """
+    try:
+        with observe_stage('print_server'):
+            response = print_server_http.post(url, headers=request_id_headers(), **kwargs)
+    except requests.exceptions.RequestException as e:
+        count_error('print_server', e)
+        raise
+    if response.status_code >= 400:
+        count_error('print_server', f"http_{response.status_code}")
+    return response
+
 def print_to_remote_printer(serial_number, printer_server_url):
-    """Envia serial para servidor Windows gerar imagem com Calibri e imprimir"""
+    """Envia serial para servidor Windows gerar imagem com Calibri e imprimir
+
+    Retorna (sucesso, mensagem, pode_repetir). pode_repetir indica falha em que
+    a etiqueta certamente não saiu (servidor inacessível ou indisponível) e o
+    job pode ir para o spool sem risco de duplicar.
+    """
     try:
-        print(f"[DEBUG] ========================================", flush=True)
-        print(f"[DEBUG] IMPRESSÃO REMOTA COM CALIBRI", flush=True)
-        print(f"[DEBUG] ========================================", flush=True)
-        print(f"[DEBUG] Servidor: {printer_server_url}", flush=True)
-        print(f"[DEBUG] Serial: {serial_number}", flush=True)
-        print(f"[DEBUG] Endpoint: {printer_server_url}/print-calibri", flush=True)
-        
-        # Criar endpoint customizado para gerar com Calibri
-        response = requests.post(
+        log.debug("Impressão remota com Calibri: %s/print-calibri, serial %s", printer_server_url, serial_number)
+        
+        # Criar endpoint customizado para gerar com Calibri (conexão keep-alive do pool)
+        response = post_to_print_server(
             f"{printer_server_url}/print-calibri",
             json={"serial": serial_number},
-            timeout=15
+            read_timeout=PRINT_SERVER_READ_TIMEOUT
         )
         
-        print(f"[DEBUG] Status Code: {response.status_code}", flush=True)
-        print(f"[DEBUG] Response: {response.text}", flush=True)
+        log.debug("Status Code: %s", response.status_code)
+        log.debug("Response: %s", response.text)
         
         if response.status_code == 200:
             result = response.json()
-            print(f"[DEBUG] Resposta do servidor: {result}", flush=True)
-            return True, f"Etiqueta impressa na impressora {result.get('printer', 'remota')}"
+            log.debug("Resposta do servidor: %s", result)
+            labels_delivered.labels('calibri').inc()
+            return True, f"Etiqueta impressa na impressora {result.get('printer', 'remota')}", False
+        elif _status_unknown(response):
+            log.warning("Impressão de %s com situação desconhecida", serial_number)
+            return False, PRINT_STATUS_UNKNOWN, False
         else:
-            print(f"[DEBUG] Erro {response.status_code}, tentando método padrão...", flush=True)
+            log.warning("Erro %s, tentando método padrão...", response.status_code)
+            print_fallbacks.labels('calibri', 'a0').inc()
             # Fallback: enviar ZPL simples
-            zpl_fallback = (
-                f"^XA"
-                f"^LH0,0"
-                f"^FO0,20"
-                f"^A0N,29,29"
-                f"^FB360,1,0,C,0"
-                f"^FD{serial_number}^FS"
-                f"^PQ1"
-                f"^XZ"
-            )
-            response = requests.post(
+            zpl_fallback = default_font_zpl(serial_number)
+            response = post_to_print_server(
                 f"{printer_server_url}/print",
                 json={"text": zpl_fallback},
-                timeout=10
+                read_timeout=PRINT_SERVER_FALLBACK_READ_TIMEOUT
             )
             if response.status_code == 200:
-                return True, "Etiqueta impressa (fonte padrão)"
-            return False, f"Erro no servidor: {response.status_code}"
+                labels_delivered.labels('a0').inc()
+                return True, "Etiqueta impressa (fonte padrão)", False
+            if _status_unknown(response):
+                return False, PRINT_STATUS_UNKNOWN, False
+            return False, f"Erro no servidor: {response.status_code}", response.status_code in (502, 503, 504)
             
+    except requests.exceptions.ConnectTimeout:
+        return False, "Timeout ao conectar com servidor de impressão", True
     except requests.exceptions.Timeout:
-        return False, "Timeout ao conectar com servidor de impressão"
+        # A requisição chegou ao servidor: a etiqueta pode ter saído, não repetir
+        return False, "Timeout aguardando resposta do servidor de impressão", False
     except requests.exceptions.ConnectionError:
-        return False, "Não foi possível conectar ao servidor de impressão. Verifique se está rodando."
+        return False, "Não foi possível conectar ao servidor de impressão. Verifique se está rodando.", True
     except Exception as e:
-        return False, f"Erro ao enviar para impressora remota: {str(e)}"
+        return False, f"Erro ao enviar para impressora remota: {str(e)}", False
+
+def print_batch_to_remote_printer(serials, printer_server_url):
+    """Envia vários seriais em uma requisição para /print-calibri-batch
+
+    Retorna (resultados, mensagem, pode_repetir). resultados é a lista de
+    (sucesso, mensagem) por serial, na ordem recebida, ou None se o lote
+    inteiro falhou. Seriais que o servidor não conseguiu renderizar com
+    Calibri saem em um segundo documento com a fonte padrão, como no
+    fallback de print_to_remote_printer.
+    """
+    try:
+        log.debug("Lote de %s seriais para %s/print-calibri-batch", len(serials), printer_server_url)
+        response = post_to_print_server(
+            f"{printer_server_url}/print-calibri-batch",
+            json={"serials": serials},
+            read_timeout=PRINT_BATCH_READ_TIMEOUT
+        )
+        log.debug("Status Code: %s", response.status_code)
+        
+        if response.status_code in (502, 503, 504):
+            return None, f"Erro no servidor: {response.status_code}", True
+        if response.status_code in (404, 405):
+            return None, BATCH_UNSUPPORTED, False
+        try:
+            result = response.json()
+        except ValueError:
+            result = {}
+        server_results = result.get('results')
+        if not isinstance(server_results, list) or len(server_results) != len(serials):
+            return None, result.get('error') or f"Erro no servidor: {response.status_code}", False
+        
+        printer = result.get('printer', 'remota')
+        results = []
+        failed_render = []
+        for index, item in enumerate(server_results):
+            if item.get('status') == 'ok':
+                labels_delivered.labels('calibri').inc()
+                results.append((True, f"Etiqueta impressa na impressora {printer}"))
+            elif item.get('status') == 'unknown':
+                results.append((False, PRINT_STATUS_UNKNOWN))
+            elif response.status_code == 200:
+                # Renderização falhou só neste serial: tenta a fonte padrão
+                results.append(None)
+                failed_render.append(index)
+            else:
+                results.append((False, item.get('error') or result.get('error', 'Erro no servidor')))
+        
+        if failed_render:
+            log.debug("%s serial(is) sem Calibri, enviando com fonte padrão", len(failed_render))
+            print_fallbacks.labels('calibri', 'a0').inc(len(failed_render))
+            response = post_to_print_server(
+                f"{printer_server_url}/print",
+                json={"text": "".join(default_font_zpl(serials[index]) for index in failed_render)},
+                read_timeout=PRINT_SERVER_FALLBACK_READ_TIMEOUT
+            )
+            if response.status_code == 200:
+                outcome = (True, "Etiqueta impressa (fonte padrão)")
+            elif _status_unknown(response):
+                outcome = (False, PRINT_STATUS_UNKNOWN)
+            else:
+                outcome = (False, f"Erro no servidor: {response.status_code}")
+            for index in failed_render:
+                results[index] = outcome
+            if outcome[0]:
+                labels_delivered.labels('a0').inc(len(failed_render))
+        
+        return results, result.get('error') or "Lote enviado", False
+            
+    except requests.exceptions.ConnectTimeout:
+        return None, "Timeout ao conectar com servidor de impressão", True
+    except requests.exceptions.Timeout:
+        # O lote chegou ao servidor: etiquetas podem ter saído, não repetir
+        return None, "Timeout aguardando resposta do servidor de impressão", False
+    except requests.exceptions.ConnectionError:
+        return None, "Não foi possível conectar ao servidor de impressão. Verifique se está rodando.", True
+    except Exception as e:
+        return None, f"Erro ao enviar lote para impressora remota: {str(e)}", False
 
 # FUNÇÃO DE APONTAMENTO REMOVIDA
 # def fazer_apontamento(op, item, colaborador, serial):
@@ -259,11 +667,14 @@ def print_to_remote_printer(serial_number, printer_server_url):
 #     except Exception as e:
 #         return False
 
-def print_label(serial_number):
-    """Imprime etiqueta contínua com serial centralizado usando Calibri"""
+def deliver_label(serial_number):
+    """Tenta imprimir agora: servidor remoto e, no Windows, impressão local
+
+    Retorna (sucesso, mensagem, pode_repetir), como print_to_remote_printer.
+    """
     try:
-        print(f"[DEBUG] Preparando impressão do serial: {serial_number}", flush=True)
-        print(f"[DEBUG] Sistema operacional: {platform.system()}", flush=True)
+        log.debug("Preparando impressão do serial: %s", serial_number)
+        log.debug("Sistema operacional: %s", platform.system())
         
         # Tentar gerar imagem com Calibri (tamanho 29, espelhado)
         # No Linux, não tem Calibri, então usa fonte padrão
@@ -274,56 +685,193 @@ def print_label(serial_number):
         
         # Se falhar ou estiver no Linux, usar fonte padrão como fallback
         if not zpl_command:
-            print(f"[AVISO] Usando fonte padrão ZPL", flush=True)
-            zpl_command = (
-                f"^XA"
-                f"^LH0,0"
-                f"^FO0,20"
-                f"^A0N,29,29"
-                f"^FB360,1,0,C,0"
-                f"^FD{serial_number}^FS"
-                f"^PQ1"
-                f"^XZ"
-            )
+            log.warning("Usando fonte padrão ZPL")
+            zpl_command = default_font_zpl(serial_number)
         
-        print(f"[DEBUG] Comando ZPL gerado ({len(zpl_command)} bytes)", flush=True)
+        log.debug("Comando ZPL gerado (%s bytes)", len(zpl_command))
         
         # Sempre tentar usar o servidor de impressão primeiro
         PRINTER_SERVER_URL = os.getenv('PRINTER_SERVER_URL', 'http://10.150.20.40:9021')
         
         # Tentar impressão remota com Calibri primeiro
-        print(f"[DEBUG] Tentando impressão remota com Calibri", flush=True)
-        success, message = print_to_remote_printer(serial_number, PRINTER_SERVER_URL)
+        log.debug("Tentando impressão remota com Calibri")
+        success, message, retryable = print_to_remote_printer(serial_number, PRINTER_SERVER_URL)
         
         if success:
-            return success, message
+            return success, message, False
+        if message == PRINT_STATUS_UNKNOWN:
+            return False, message, False
         
         # Fallback para impressão local se remota falhar
-        print(f"[DEBUG] Impressão remota falhou, usando local: {message}", flush=True)
+        log.debug("Impressão remota falhou, usando local: %s", message)
         if platform.system() == "Windows":
+            print_fallbacks.labels('remote', 'local').inc()
             cmd = [
                 'python', 'send_to_printer.py',
                 '--text', zpl_command
             ]
             
-            print(f"[DEBUG] Executando comando local: {' '.join(cmd)}", flush=True)
+            log.debug("Executando comando local: %s", ' '.join(cmd))
             
-            result = subprocess.run(cmd, capture_output=True, text=True, cwd=Path(__file__).parent)
+            with observe_stage('local_print'):
+                result = subprocess.run(cmd, capture_output=True, text=True, cwd=Path(__file__).parent)
             
-            print(f"[DEBUG] Return code: {result.returncode}", flush=True)
-            print(f"[DEBUG] Stdout: {result.stdout}", flush=True)
-            print(f"[DEBUG] Stderr: {result.stderr}", flush=True)
+            log.debug("Return code: %s", result.returncode)
+            log.debug("Stdout: %s", result.stdout)
+            log.debug("Stderr: %s", result.stderr)
             
             if result.returncode == 0:
-                return True, "Etiqueta impressa localmente (sem Calibri)"
+                labels_delivered.labels('local').inc()
+                return True, "Etiqueta impressa localmente (sem Calibri)", False
             else:
-                return False, f"Erro na impressão local: {result.stderr}"
+                count_error('local_print', f"exit_{result.returncode}")
+                return False, f"Erro na impressão local: {result.stderr}", retryable
         else:
-            return False, "Sistema não suportado para impressão local"
+            # Sem impressão local (Linux/Docker): o spool guarda a etiqueta
+            return False, message, retryable
             
     except Exception as e:
-        print(f"[DEBUG] Exceção na impressão: {str(e)}", flush=True)
-        return False, f"Erro ao executar impressão: {str(e)}"
+        log.error("Exceção na impressão: %s", e)
+        count_error('deliver', e)
+        return False, f"Erro ao executar impressão: {str(e)}", False
+
+def spool_label(serial_number, message):
+    """Grava a etiqueta no spool durável, medida como etapa spool"""
+    with observe_stage('spool'):
+        job = print_jobs.spool_serial(serial_number, message)
+    labels_delivered.labels('spool').inc()
+    return job
+
+def print_label(serial_number):
+    """Imprime etiqueta contínua com serial centralizado usando Calibri
+
+    Se o servidor de impressão estiver fora do ar, a etiqueta vai para o spool
+    durável e sai sozinha quando ele voltar. Com spool pendente, a etiqueta
+    entra direto atrás dele, mantendo a ordem e sem esperar timeouts.
+    """
+    if print_jobs.has_spooled():
+        job = spool_label(serial_number, 'Aguardando etiquetas anteriores do spool')
+        log.info("[SPOOL] %s enfileirado atrás do spool pendente (job %s)", serial_number, job['id'])
+        return True, f"Etiqueta no spool (job {job['id']}): sai quando as anteriores forem impressas"
+    
+    success, message, retryable = deliver_label(serial_number)
+    if not success and retryable and PRINT_SPOOL_ENABLED:
+        print_fallbacks.labels('remote', 'spool').inc()
+        job = spool_label(serial_number, message)
+        log.info("[SPOOL] %s guardado no spool (job %s): %s", serial_number, job['id'], message)
+        return True, f"Servidor de impressão indisponível: etiqueta guardada no spool (job {job['id']}) e será impressa quando ele voltar"
+    return success, message
+
+def print_labels_batch(serials):
+    """Imprime vários seriais em um único documento, na ordem recebida
+
+    Retorna a lista de (sucesso, mensagem) por serial. Com o servidor fora do
+    ar (ou spool pendente), o lote inteiro vai para o spool na mesma ordem.
+    Servidores de impressão sem /print-calibri-batch recebem um serial por vez.
+    """
+    if print_jobs.has_spooled():
+        return [print_label(serial) for serial in serials]
+    
+    PRINTER_SERVER_URL = os.getenv('PRINTER_SERVER_URL', 'http://10.150.20.40:9021')
+    results, message, retryable = print_batch_to_remote_printer(serials, PRINTER_SERVER_URL)
+    if results is not None:
+        return results
+    
+    log.warning("[LOTE] Envio em lote falhou: %s", message)
+    if retryable and PRINT_SPOOL_ENABLED:
+        print_fallbacks.labels('remote', 'spool').inc(len(serials))
+        jobs = [spool_label(serial, message) for serial in serials]
+        log.info("[SPOOL] Lote de %s seriais guardado no spool", len(jobs))
+        return [
+            (True, f"Servidor de impressão indisponível: etiqueta guardada no spool (job {job['id']}) e será impressa quando ele voltar")
+            for job in jobs
+        ]
+    if message == BATCH_UNSUPPORTED:
+        print_fallbacks.labels('batch', 'single').inc()
+        return [print_label(serial) for serial in serials]
+    return [(False, message) for _ in serials]
+
+# Fila assíncrona de impressão (modo "async" de /imprimir e /buscar-e-imprimir).
+# O estado dos jobs fica em SQLite para que qualquer worker responda o polling.
+PRINT_QUEUE_SIZE = int(os.getenv('PRINT_QUEUE_SIZE', '100'))
+PRINT_QUEUE_WORKERS = int(os.getenv('PRINT_QUEUE_WORKERS', '2'))
+PRINT_QUEUE_RETRY_AFTER = int(os.getenv('PRINT_QUEUE_RETRY_AFTER', '5'))
+# Padrão em logs/, o volume montado no container: jobs e spool sobrevivem ao
+# down + rebuild, e o controle_serial.db versionado não é alterado
+PRINT_JOBS_DB = os.getenv('PRINT_JOBS_DB') or str(Path(__file__).parent / 'logs' / 'print_jobs.db')
+PRINT_JOB_RETENTION = float(os.getenv('PRINT_JOB_RETENTION', '86400'))
+PRINT_SSE_TIMEOUT = float(os.getenv('PRINT_SSE_TIMEOUT', '60'))
+PRINT_SSE_POLL = 0.25
+# Cada stream SSE ocupa uma thread do gunicorn enquanto espera o job: acima
+# deste número por worker a resposta é 503 e o cliente consulta /jobs/<id>
+PRINT_SSE_MAX_STREAMS = int(os.getenv('PRINT_SSE_MAX_STREAMS', '1'))
+sse_streams = threading.BoundedSemaphore(PRINT_SSE_MAX_STREAMS) if PRINT_SSE_MAX_STREAMS > 0 else None
+
+# Spool durável: etiquetas que não saíram por servidor fora do ar ficam no
+# mesmo SQLite e são reenviadas em ordem, com backoff exponencial
+PRINT_SPOOL_ENABLED = os.getenv('PRINT_SPOOL', '1').strip().lower() not in ('0', 'false', 'no', 'off')
+
+Path(PRINT_JOBS_DB).parent.mkdir(parents=True, exist_ok=True)
+print_jobs = PrintJobQueue(
+    send=lambda serial: deliver_label(serial),
+    store=JobStore(PRINT_JOBS_DB, retention=PRINT_JOB_RETENTION),
+    maxsize=PRINT_QUEUE_SIZE,
+    workers=PRINT_QUEUE_WORKERS,
+    spool=PRINT_SPOOL_ENABLED,
+    backoff=float(os.getenv('PRINT_SPOOL_BACKOFF', '2')),
+    backoff_max=float(os.getenv('PRINT_SPOOL_BACKOFF_MAX', '300'))
+)
+
+print_jobs.start()
+
+@app.before_request
+def start_print_queue():
+    # Threads de despacho/reenvio do worker atual (após o fork do gunicorn)
+    print_jobs.start()
+
+@app.before_request
+def bind_request_id():
+    # Todas as linhas de log desta requisição levam o mesmo request_id
+    g.request_id = new_request_id(request.headers.get('X-Request-ID'))
+    g.request_id_token = request_id_var.set(g.request_id)
+
+@app.after_request
+def add_request_id_header(response):
+    request_id = g.get('request_id')
+    if request_id:
+        response.headers['X-Request-ID'] = request_id
+    return response
+
+@app.teardown_request
+def unbind_request_id(exc=None):
+    token = g.pop('request_id_token', None)
+    if token is not None:
+        request_id_var.reset(token)
+
+@app.before_request
+def start_request_metrics():
+    # Rota (não a URL) como label: /jobs/<job_id> é uma série só
+    g.metrics_endpoint = request.url_rule.rule if request.url_rule is not None else 'nao_encontrado'
+    g.metrics_start = time.perf_counter()
+    http_requests_in_flight.labels(g.metrics_endpoint).inc()
+
+@app.after_request
+def observe_request_metrics(response):
+    # Streams (/exportar, SSE) são medidos até o início da resposta
+    start = g.get('metrics_start')
+    if start is not None:
+        http_request_seconds.labels(g.metrics_endpoint, request.method, response.status_code).observe(
+            time.perf_counter() - start
+        )
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exc=None):
+    endpoint = g.pop('metrics_endpoint', None)
+    if endpoint is not None:
+        http_requests_in_flight.labels(endpoint).dec()
+    if exc is not None:
+        count_error('request', exc)
 
 @app.route('/')
 def index():
@@ -337,14 +885,14 @@ def buscar():
         data = request.get_json()
         codigo_barras = data.get('codigoBarras', '').strip()
         
-        print(f"[DEBUG] Recebido código: {codigo_barras}", flush=True)
+        log.debug("Recebido código: %s", codigo_barras)
         
         if not codigo_barras:
             return jsonify({'error': 'Código de barras não informado'}), 400
         
         # Separa peça e OP do código de barras
         peca, op = parse_barcode(codigo_barras)
-        print(f"[DEBUG] Peça: {peca}, OP: {op}", flush=True)
+        log.debug("Peça: %s, OP: %s", peca, op)
         
         if not peca or not op:
             return jsonify({'error': 'Formato de código de barras inválido. Use o formato: PBS12345'}), 400
@@ -353,10 +901,10 @@ def buscar():
         resultado = search_serial_number(peca, op)
         
         if not resultado:
-            print(f"[BUSCA] Nenhum registro encontrado para Peça: {peca}, OP: {op}", flush=True)
+            log.info("[BUSCA] Nenhum registro encontrado para Peça: %s, OP: %s", peca, op)
             return jsonify({'error': f'Nenhum registro encontrado para Peça: {peca}, OP: {op}'}), 404
         
-        print(f"[BUSCA] Serial encontrado: {resultado['serial_number']} para Peça: {peca}, OP: {op}", flush=True)
+        log.info("[BUSCA] Serial encontrado: %s para Peça: %s, OP: %s", resultado['serial_number'], peca, op)
         
         return jsonify({
             'success': True,
@@ -366,8 +914,243 @@ def buscar():
         })
         
     except Exception as e:
-        print(f"[ERRO] {str(e)}", flush=True)
+        log.exception("[ERRO] %s", e)
+        return jsonify({'error': f'Erro interno: {str(e)}'}), 500
+
+@app.route('/buscar-lote', methods=['POST'])
+def buscar_lote():
+    """Endpoint para conciliação: busca vários códigos de barras de uma vez
+
+    Corpo: {"codigosBarras": [...]}. Todos os códigos válidos são resolvidos
+    em uma única consulta; a resposta traz um resultado por código, na ordem
+    recebida.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        codigos = data.get('codigosBarras')
+        
+        if not isinstance(codigos, list) or not codigos:
+            return jsonify({'error': 'Lista de códigos de barras não informada'}), 400
+        if len(codigos) > BUSCA_LOTE_LIMIT:
+            return jsonify({'error': f'Máximo de {BUSCA_LOTE_LIMIT} códigos por busca'}), 400
+        
+        parsed = [parse_barcode(codigo) if isinstance(codigo, str) else (None, None) for codigo in codigos]
+        pairs = [pair for pair in parsed if pair[0] and pair[1]]
+        log.info("[BUSCA-LOTE] %s códigos, %s válidos", len(codigos), len(pairs))
+        
+        found = search_serial_numbers(pairs)
+        
+        resultados = []
+        for codigo, (peca, op) in zip(codigos, parsed):
+            if not peca or not op:
+                resultados.append({'codigoBarras': codigo, 'success': False,
+                                   'error': 'Formato de código de barras inválido. Use o formato: PBS12345'})
+            elif (peca, op) in found:
+                resultados.append({'codigoBarras': codigo, 'success': True, 'data': found[(peca, op)],
+                                   'peca': peca, 'op': op})
+            else:
+                resultados.append({'codigoBarras': codigo, 'success': False, 'peca': peca, 'op': op,
+                                   'error': f'Nenhum registro encontrado para Peça: {peca}, OP: {op}'})
+        
+        encontrados = sum(1 for resultado in resultados if resultado['success'])
+        log.info("[BUSCA-LOTE] %s/%s encontrados", encontrados, len(codigos))
+        
+        return jsonify({
+            'success': True,
+            'total': len(codigos),
+            'encontrados': encontrados,
+            'resultados': resultados
+        })
+        
+    except Exception as e:
+        log.exception("[ERRO] %s", e)
+        return jsonify({'error': f'Erro interno: {str(e)}'}), 500
+
+# Exportação de seriais (/exportar): cursor nomeado no servidor, lido em
+# blocos de EXPORT_FETCH_SIZE linhas, com memória constante no worker.
+# Cada exportação usa uma conexão própria (fora do pool) e o número de
+# exportações simultâneas por worker é limitado.
+EXPORT_FETCH_SIZE = int(os.getenv('EXPORT_FETCH_SIZE', '2000'))
+EXPORT_MAX_CONCURRENT = int(os.getenv('EXPORT_MAX_CONCURRENT', '2'))
+_export_slots = threading.BoundedSemaphore(max(1, EXPORT_MAX_CONCURRENT))
+
+# LATERAL ... LIMIT 1 como nas buscas: no máximo uma linha de dados_op por
+# serial (sem duplicar seriais) e op comparada via ::text, qualquer que seja
+# o tipo da coluna em cada tabela.
+EXPORT_COLUMNS = ('serial_number', 'peca', 'op', 'created', 'projeto', 'veiculo')
+EXPORT_SQL = '''
+    SELECT c.serial_number, c.peca, c.op, c.created, d.codigo_veiculo, d.modelo
+    FROM public.controle_serial_number c
+    LEFT JOIN LATERAL (
+        SELECT codigo_veiculo, modelo
+        FROM dados_uso_geral.dados_op
+        WHERE planta = %s AND op::text = c.op::text
+        LIMIT 1
+    ) d ON TRUE
+    WHERE {filtro}
+    ORDER BY c.created, c.serial_number
+'''
+
+def _parse_export_bound(value, end=False):
+    """Data (AAAA-MM-DD) ou data/hora ISO. Uma data sozinha como fim inclui o dia inteiro"""
+    if len(value) == 10:
+        day = datetime.date.fromisoformat(value)
+        if end:
+            day += datetime.timedelta(days=1)
+        return datetime.datetime.combine(day, datetime.time())
+    return datetime.datetime.fromisoformat(value)
+
+def _export_filter(args):
+    """Monta o WHERE da exportação a partir da query string. Retorna (sql, params)"""
+    op = args.get('op', '').strip()
+    peca = args.get('peca', '').strip().upper()
+    inicio = args.get('inicio', '').strip()
+    fim = args.get('fim', '').strip()
+    
+    if not op and not inicio and not fim:
+        raise ValueError('Informe a OP ou o período (inicio/fim)')
+    
+    conditions, params = [], []
+    if op:
+        conditions.append('c.op = %s')
+        params.append(op)
+    if peca:
+        conditions.append('c.peca = %s')
+        params.append(peca)
+    try:
+        if inicio:
+            conditions.append('c.created >= %s')
+            params.append(_parse_export_bound(inicio))
+        if fim:
+            # Data/hora informada: fim exclusivo, como a data seguinte
+            conditions.append('c.created < %s')
+            params.append(_parse_export_bound(fim, end=True))
+    except ValueError:
+        raise ValueError('Datas devem estar no formato AAAA-MM-DD ou AAAA-MM-DDTHH:MM:SS')
+    return ' AND '.join(conditions), params
+
+def _export_rows(cursor):
+    """Linhas do cursor nomeado, buscadas em blocos de EXPORT_FETCH_SIZE"""
+    while True:
+        rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+        if not rows:
+            return
+        yield rows
+
+def _export_cleanup(conn, cursor):
+    """Fecha cursor e conexão da exportação e libera a vaga (uma vez só)"""
+    done = []
+    
+    def cleanup():
+        if done:
+            return
+        done.append(True)
+        try:
+            cursor.close()
+        except psycopg2.Error:
+            pass
+        conn.close()
+        _export_slots.release()
+    return cleanup
+
+def _export_csv(blocks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in blocks:
+        for serial_number, peca, op, created, projeto, veiculo in rows:
+            writer.writerow((serial_number, peca, op, created.isoformat(sep=' ') if created else '', projeto or '', veiculo or ''))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def _export_ndjson(blocks):
+    for rows in blocks:
+        yield ''.join(
+            json.dumps(dict(zip(EXPORT_COLUMNS, (
+                serial_number, peca, op, created.isoformat() if created else None, projeto, veiculo
+            ))), ensure_ascii=False) + '\n'
+            for serial_number, peca, op, created, projeto, veiculo in rows
+        )
+
+@app.route('/exportar', methods=['GET'])
+def exportar():
+    """Exporta todos os seriais de uma OP ou período em CSV ou NDJSON (streaming)
+
+    Query string: op, peca (opcional), inicio/fim (AAAA-MM-DD ou ISO) e
+    formato=csv|ndjson.
+    """
+    formato = request.args.get('formato', 'csv').strip().lower()
+    if formato not in ('csv', 'ndjson'):
+        return jsonify({'error': 'Formato deve ser csv ou ndjson'}), 400
+    try:
+        filtro, params = _export_filter(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if not _export_slots.acquire(blocking=False):
+        response = jsonify({'error': 'Exportações em andamento no limite. Tente novamente em instantes.'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+    
+    conn = None
+    try:
+        conn = get_db_connection()
+        # Cursor nomeado: o resultado fica no servidor e vem em blocos
+        cursor = conn.cursor(name='exportar_seriais')
+        cursor.itersize = EXPORT_FETCH_SIZE
+        cursor.execute(EXPORT_SQL.format(filtro=filtro), [PLANTA] + params)
+    except Exception as e:
+        if conn is not None:
+            conn.close()
+        _export_slots.release()
+        log.error("[EXPORTAÇÃO] Erro ao consultar: %s", e)
         return jsonify({'error': f'Erro interno: {str(e)}'}), 500
+    
+    log.info("[EXPORTAÇÃO] Iniciada (%s): %s", formato, dict(request.args))
+    blocks = _export_rows(cursor)
+    nome = 'seriais_' + '_'.join(
+        request.args.get(key, '').strip().replace(':', '') for key in ('op', 'inicio', 'fim') if request.args.get(key, '').strip()
+    )
+    if formato == 'csv':
+        body, mimetype, extension = _export_csv(blocks), 'text/csv; charset=utf-8', 'csv'
+    else:
+        body, mimetype, extension = _export_ndjson(blocks), 'application/x-ndjson', 'ndjson'
+    response = Response(body, mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{nome}.{extension}"',
+        'X-Accel-Buffering': 'no'
+    })
+    # Chamado pelo servidor ao fim do envio, inclusive se o cliente desconectar
+    response.call_on_close(_export_cleanup(conn, cursor))
+    return response
+
+def enqueue_print(serial_number, extra=None):
+    """Enfileira a impressão e responde 202 com o job (ou 503 com a fila cheia)"""
+    try:
+        job = print_jobs.submit(serial_number)
+    except QueueFullError as e:
+        log.info("[FILA] %s - serial %s recusado", e, serial_number)
+        response = jsonify({'error': f'{str(e)}. Tente novamente em instantes.'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(PRINT_QUEUE_RETRY_AFTER)
+        return response
+    
+    log.info("[FILA] Job %s enfileirado: %s", job['id'], serial_number)
+    body = {
+        'success': True,
+        'message': f'Serial {serial_number} na fila de impressão',
+        'job': job,
+        'status_url': f"/jobs/{job['id']}",
+        'events_url': f"/jobs/{job['id']}/events"
+    }
+    body.update(extra or {})
+    response = jsonify(body)
+    response.status_code = 202
+    response.headers['Location'] = body['status_url']
+    return response
 
 @app.route('/imprimir', methods=['POST'])
 def imprimir():
@@ -379,20 +1162,67 @@ def imprimir():
         if not serial_number:
             return jsonify({'error': 'Serial number não informado'}), 400
         
-        print(f"[IMPRESSÃO] Iniciando impressão do serial: {serial_number}", flush=True)
+        # Modo assíncrono: responde na hora com o ID do job
+        if data.get('async'):
+            return enqueue_print(serial_number)
+        
+        log.info("[IMPRESSÃO] Iniciando impressão do serial: %s", serial_number)
         
         # Imprime a etiqueta
         success, message = print_label(serial_number)
         
         if success:
-            print(f"[IMPRESSÃO] Sucesso: {serial_number} - {message}")
+            log.info("[IMPRESSÃO] Sucesso: %s - %s", serial_number, message)
             return jsonify({'success': True, 'message': message})
         else:
-            print(f"[IMPRESSÃO] Erro: {serial_number} - {message}")
+            log.error("[IMPRESSÃO] Erro: %s - %s", serial_number, message)
             return jsonify({'error': message}), 500
             
     except Exception as e:
-        print(f"[IMPRESSÃO] Erro interno: {str(e)}")
+        log.error("[IMPRESSÃO] Erro interno: %s", e)
+        return jsonify({'error': f'Erro interno: {str(e)}'}), 500
+
+@app.route('/imprimir-lote', methods=['POST'])
+def imprimir_lote():
+    """Endpoint para imprimir vários seriais (retrabalho, etiquetas perdidas)
+
+    Corpo: {"serials": [...]}. Resposta com o resultado de cada serial, na
+    ordem recebida.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        serials = data.get('serials')
+        
+        if not isinstance(serials, list) or not serials:
+            return jsonify({'error': 'Lista de seriais não informada'}), 400
+        if len(serials) > PRINT_BATCH_LIMIT:
+            return jsonify({'error': f'Máximo de {PRINT_BATCH_LIMIT} seriais por lote'}), 400
+        if not all(isinstance(serial, str) and serial.strip() for serial in serials):
+            return jsonify({'error': 'Seriais devem ser textos não vazios'}), 400
+        
+        serials = [serial.strip() for serial in serials]
+        log.info("[IMPRESSÃO-LOTE] Iniciando impressão de %s seriais", len(serials))
+        
+        results = [
+            {'serial': serial, 'success': success, 'message': message}
+            for serial, (success, message) in zip(serials, print_labels_batch(serials))
+        ]
+        printed = sum(1 for result in results if result['success'])
+        log.info("[IMPRESSÃO-LOTE] %s/%s etiquetas impressas", printed, len(serials))
+        
+        body = {
+            'success': printed == len(serials),
+            'total': len(serials),
+            'printed': printed,
+            'results': results
+        }
+        if printed == 0:
+            body['error'] = results[0]['message']
+            return jsonify(body), 500
+        return jsonify(body)
+            
+    except Exception as e:
+        log.error("[IMPRESSÃO-LOTE] Erro interno: %s", e)
         return jsonify({'error': f'Erro interno: {str(e)}'}), 500
 
 @app.route('/imprimir-com-apontamento', methods=['POST'])
@@ -408,7 +1238,7 @@ def imprimir_com_apontamento():
         if not all([serial_number, colaborador, peca, op]):
             return jsonify({'error': 'Dados incompletos para apontamento'}), 400
         
-        print(f"[APONTAMENTO] Iniciando impressão e apontamento: {serial_number} - {colaborador}", flush=True)
+        log.info("[APONTAMENTO] Iniciando impressão e apontamento: %s - %s", serial_number, colaborador)
         
         # Imprime a etiqueta
         success, message = print_label(serial_number)
@@ -418,30 +1248,42 @@ def imprimir_com_apontamento():
             apontamento_success = fazer_apontamento(op, peca, colaborador, serial_number)
             
             if apontamento_success:
-                print(f"[APONTAMENTO] Sucesso completo: {serial_number}")
+                log.info("[APONTAMENTO] Sucesso completo: %s", serial_number)
                 return jsonify({
                     'success': True, 
                     'message': f'Etiqueta impressa e apontamento realizado para {colaborador}'
                 })
             else:
-                print(f"[APONTAMENTO] Impressão OK, mas erro no apontamento: {serial_number}")
+                log.info("[APONTAMENTO] Impressão OK, mas erro no apontamento: %s", serial_number)
                 return jsonify({
                     'success': True, 
                     'message': f'Etiqueta impressa, mas erro no apontamento'
                 })
         else:
-            print(f"[APONTAMENTO] Erro na impressão: {serial_number} - {message}")
+            log.error("[APONTAMENTO] Erro na impressão: %s - %s", serial_number, message)
             return jsonify({'error': f'Erro na impressão: {message}'}), 500
             
     except Exception as e:
-        print(f"[APONTAMENTO] Erro interno: {str(e)}")
+        log.exception("[APONTAMENTO] Erro interno: %s", e)
         return jsonify({'error': f'Erro interno: {str(e)}'}), 500
 
-@app.route('/colaboradores', methods=['GET'])
-def get_colaboradores():
-    """Endpoint para buscar colaboradores da montagem"""
-    try:
-        conn = get_db_connection()
+# Cache da lista de colaboradores: muda pouco (semanalmente) e é pedida a
+# cada carregamento de página. Guarda o JSON pronto e já comprimido; os
+# navegadores revalidam com ETag/Last-Modified e recebem 304.
+COLABORADORES_CACHE_TTL = float(os.getenv('COLABORADORES_CACHE_TTL', '3600'))
+colaboradores_cache = TTLCache(maxsize=1, ttl=COLABORADORES_CACHE_TTL) if COLABORADORES_CACHE_TTL > 0 else None
+_colaboradores_lock = threading.Lock()
+_colaboradores_last = None
+
+def _invalidate_colaboradores_cache(key):
+    if colaboradores_cache is not None:
+        colaboradores_cache.clear()
+
+cache_invalidations.register('colaboradores', _invalidate_colaboradores_cache)
+
+def fetch_colaboradores():
+    """Busca os colaboradores da montagem no banco"""
+    with db_connection() as conn:
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -451,23 +1293,158 @@ def get_colaboradores():
             ORDER BY nome_completo
         ''')
         
-        colaboradores = [row[0] for row in cursor.fetchall()]
-        conn.close()
+        return [row[0] for row in cursor.fetchall()]
+
+def _colaboradores_payload(colaboradores, previous=None):
+    """JSON serializado, versão gzip, ETag e Last-Modified da lista"""
+    body = json.dumps({'success': True, 'colaboradores': colaboradores}, ensure_ascii=False).encode('utf-8')
+    etag = hashlib.sha1(body).hexdigest()[:20]
+    # Mesma lista após expirar o TTL: mantém a data da última mudança
+    if previous is not None and previous['etag'] == etag:
+        last_modified = previous['last_modified']
+    else:
+        last_modified = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+    return {
+        'body': body,
+        'gzip': gzip.compress(body, 6),
+        'etag': etag,
+        'last_modified': last_modified,
+        'count': len(colaboradores)
+    }
+
+def get_colaboradores_payload():
+    """Payload do cache ou do banco (uma consulta por vez por processo)"""
+    global _colaboradores_last
+    if colaboradores_cache is not None:
+        cache_invalidations.poll()
+        payload = colaboradores_cache.get('colaboradores')
+        if payload is not None:
+            return payload
+    
+    with _colaboradores_lock:
+        if colaboradores_cache is not None:
+            payload = colaboradores_cache.get('colaboradores')
+            if payload is not None:
+                return payload
+        try:
+            payload = _colaboradores_payload(fetch_colaboradores(), _colaboradores_last)
+        except Exception as e:
+            if _colaboradores_last is None:
+                raise
+            # Banco indisponível: a última lista conhecida ainda serve
+            log.error("[COLABORADORES] Erro no banco, usando lista anterior: %s", e)
+            return _colaboradores_last
+        _colaboradores_last = payload
+        if colaboradores_cache is not None:
+            colaboradores_cache.set('colaboradores', payload)
+        return payload
+
+@app.route('/colaboradores', methods=['GET'])
+def get_colaboradores():
+    """Endpoint para buscar colaboradores da montagem"""
+    try:
+        payload = get_colaboradores_payload()
+        
+        gzipped = 'gzip' in request.headers.get('Accept-Encoding', '').lower()
+        response = Response(payload['gzip'] if gzipped else payload['body'], mimetype='application/json')
+        if gzipped:
+            response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Vary'] = 'Accept-Encoding'
+        # ETag fraco: o mesmo para as versões com e sem gzip
+        response.set_etag(payload['etag'], weak=True)
+        response.last_modified = payload['last_modified']
+        # O navegador guarda a lista mas revalida a cada uso (304 sem corpo)
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+        
+    except Exception as e:
+        log.error("[COLABORADORES] Erro: %s", e)
+        return jsonify({'error': f'Erro ao buscar colaboradores: {str(e)}'}), 500
+
+@app.route('/cache/colaboradores', methods=['GET'])
+def colaboradores_cache_status():
+    """Estatísticas do cache de colaboradores do processo atual"""
+    if colaboradores_cache is None:
+        return jsonify({'success': True, 'enabled': False})
+    return jsonify({'success': True, 'enabled': True, 'cache': colaboradores_cache.stats()})
+
+@app.route('/cache/colaboradores', methods=['DELETE'])
+def colaboradores_cache_invalidate():
+    """Descarta a lista de colaboradores em todos os processos (ex.: após cadastro)"""
+    try:
+        cache_invalidations.publish('colaboradores')
+        log.info("[CACHE] Invalidação solicitada: colaboradores")
+        return jsonify({
+            'success': True,
+            'invalidated': 'colaboradores',
+            'cache': colaboradores_cache.stats() if colaboradores_cache is not None else None
+        })
+    except Exception as e:
+        log.error("[CACHE] Erro ao invalidar: %s", e)
+        return jsonify({'error': f'Erro ao invalidar cache: {str(e)}'}), 500
+
+@app.route('/pool-status', methods=['GET'])
+def pool_status():
+    """Estatísticas do pool de conexões do processo que atendeu a requisição"""
+    try:
+        return jsonify({
+            'success': True,
+            'pool': get_db_pool().stats()
+        })
+    except Exception as e:
+        log.error("[POOL] Erro: %s", e)
+        return jsonify({'error': f'Erro ao consultar pool: {str(e)}'}), 500
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Métricas no formato do Prometheus, somadas entre os workers"""
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+@app.route('/log-status', methods=['GET'])
+def log_status():
+    """Nível, profundidade da fila e registros descartados do log (por processo)"""
+    return jsonify({'success': True, 'logging': logging_stats()})
+
+@app.route('/print-server-pool', methods=['GET'])
+def print_server_pool_status():
+    """Conexões keep-alive e latência das chamadas ao servidor de impressão (por processo)"""
+    return jsonify({'success': True, 'pool': print_server_http.stats()})
+
+@app.route('/cache/op', methods=['GET'])
+def op_cache_status():
+    """Estatísticas do cache de projeto/veículo do processo atual"""
+    if op_cache is None:
+        return jsonify({'success': True, 'enabled': False})
+    return jsonify({'success': True, 'enabled': True, 'cache': op_cache.stats()})
+
+@app.route('/cache/op', methods=['DELETE'])
+@app.route('/cache/op/<op>', methods=['DELETE'])
+def op_cache_invalidate(op=None):
+    """Invalida uma OP (ou o cache inteiro) em todos os processos"""
+    try:
+        if op is not None:
+            op = op.strip()
+            if not op.isdigit():
+                return jsonify({'error': 'OP inválida'}), 400
+        
+        cache_invalidations.publish('op', op)
+        log.info("[CACHE] Invalidação solicitada: %s", op or 'todas as OPs')
         
         return jsonify({
             'success': True,
-            'colaboradores': colaboradores
+            'invalidated': op or '*',
+            'cache': op_cache.stats() if op_cache is not None else None
         })
         
     except Exception as e:
-        print(f"[COLABORADORES] Erro: {str(e)}", flush=True)
-        return jsonify({'error': f'Erro ao buscar colaboradores: {str(e)}'}), 500
+        log.error("[CACHE] Erro: %s", e)
+        return jsonify({'error': f'Erro ao invalidar cache: {str(e)}'}), 500
 
 @app.route('/test-printer', methods=['GET'])
 def test_printer():
     """Endpoint para testar a impressora"""
     try:
-        print(f"[TEST] Testando impressora...", flush=True)
+        log.info("[TEST] Testando impressora...")
         
         # Teste simples
         test_zpl = "^XA^FO50,50^A0N,50,50^FDTeste^FS^XZ"
@@ -475,9 +1452,9 @@ def test_printer():
         cmd = ['python', 'send_to_printer.py', '--text', test_zpl]
         result = subprocess.run(cmd, capture_output=True, text=True, cwd=Path(__file__).parent)
         
-        print(f"[TEST] Return code: {result.returncode}", flush=True)
-        print(f"[TEST] Stdout: {result.stdout}", flush=True)
-        print(f"[TEST] Stderr: {result.stderr}", flush=True)
+        log.info("[TEST] Return code: %s", result.returncode)
+        log.info("[TEST] Stdout: %s", result.stdout)
+        log.info("[TEST] Stderr: %s", result.stderr)
         
         if result.returncode == 0:
             return jsonify({'success': True, 'message': 'Teste de impressora executado'})
@@ -485,7 +1462,7 @@ def test_printer():
             return jsonify({'error': f'Erro no teste: {result.stderr}'}), 500
             
     except Exception as e:
-        print(f"[TEST] Erro: {str(e)}", flush=True)
+        log.error("[TEST] Erro: %s", e)
         return jsonify({'error': f'Erro no teste: {str(e)}'}), 500
 
 @app.route('/buscar-e-imprimir', methods=['POST'])
@@ -498,7 +1475,7 @@ def buscar_e_imprimir():
         if not codigo_barras:
             return jsonify({'error': 'Código de barras não informado'}), 400
         
-        print(f"[BUSCAR-IMPRIMIR] Código de barras: {codigo_barras}", flush=True)
+        log.info("[BUSCAR-IMPRIMIR] Código de barras: %s", codigo_barras)
         
         # Separa peça e OP do código de barras
         peca, op = parse_barcode(codigo_barras)
@@ -510,17 +1487,27 @@ def buscar_e_imprimir():
         resultado = search_serial_number(peca, op)
         
         if not resultado:
-            print(f"[BUSCAR-IMPRIMIR] Nenhum registro encontrado para Peça: {peca}, OP: {op}")
+            log.info("[BUSCAR-IMPRIMIR] Nenhum registro encontrado para Peça: %s, OP: %s", peca, op)
             return jsonify({'error': f'Nenhum registro encontrado para Peça: {peca}, OP: {op}'}), 404
         
         serial_number = resultado['serial_number']
-        print(f"[BUSCAR-IMPRIMIR] Serial encontrado: {serial_number} - Iniciando impressão", flush=True)
+        
+        if data.get('async'):
+            log.info("[BUSCAR-IMPRIMIR] Serial encontrado: %s - Enfileirando", serial_number)
+            return enqueue_print(serial_number, {
+                'serial': serial_number,
+                'data': resultado,
+                'peca': peca,
+                'op': op
+            })
+        
+        log.info("[BUSCAR-IMPRIMIR] Serial encontrado: %s - Iniciando impressão", serial_number)
         
         # Imprime a etiqueta
         success, message = print_label(serial_number)
         
         if success:
-            print(f"[BUSCAR-IMPRIMIR] Sucesso: Serial {serial_number} impresso")
+            log.info("[BUSCAR-IMPRIMIR] Sucesso: Serial %s impresso", serial_number)
             return jsonify({
                 'success': True,
                 'message': f'Serial {serial_number} enviado para impressão',
@@ -530,13 +1517,74 @@ def buscar_e_imprimir():
                 'op': op
             })
         else:
-            print(f"[BUSCAR-IMPRIMIR] Erro na impressão: {message}")
+            log.error("[BUSCAR-IMPRIMIR] Erro na impressão: %s", message)
             return jsonify({'error': f'Erro na impressão: {message}'}), 500
             
     except Exception as e:
-        print(f"[BUSCAR-IMPRIMIR] Erro interno: {str(e)}")
+        log.exception("[BUSCAR-IMPRIMIR] Erro interno: %s", e)
         return jsonify({'error': f'Erro interno: {str(e)}'}), 500
 
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Estado de um job de impressão (polling)"""
+    job = print_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job não encontrado'}), 404
+    return jsonify({'success': True, 'job': job})
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Server-sent events com as mudanças de estado do job até ele terminar (opcional; o padrão é polling)"""
+    if print_jobs.get(job_id) is None:
+        return jsonify({'error': 'Job não encontrado'}), 404
+    
+    if sse_streams is None or not sse_streams.acquire(blocking=False):
+        response = jsonify({
+            'error': 'Limite de streams SSE atingido; consulte o status do job',
+            'status_url': f"/jobs/{job_id}"
+        })
+        response.status_code = 503
+        response.headers['Retry-After'] = str(PRINT_QUEUE_RETRY_AFTER)
+        return response
+    
+    def stream():
+        deadline = time.monotonic() + PRINT_SSE_TIMEOUT
+        last_sent = None
+        last_beat = time.monotonic()
+        while True:
+            job = print_jobs.get(job_id)
+            if job is None:
+                return
+            state = (job['status'], job['updated'])
+            if state != last_sent:
+                last_sent = state
+                yield f"event: status\ndata: {json.dumps(job)}\n\n"
+                # No spool o job pode levar minutos: o cliente consulta depois
+                if job['status'] in FINAL_STATUSES or job['status'] == STATUS_SPOOLED:
+                    return
+            now = time.monotonic()
+            if now >= deadline:
+                # Cliente reconecta ou passa para polling
+                yield "event: timeout\ndata: {}\n\n"
+                return
+            if now - last_beat >= 10:
+                last_beat = now
+                yield ": keep-alive\n\n"
+            time.sleep(PRINT_SSE_POLL)
+    
+    response = Response(stream_with_context(stream()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # O servidor fecha a resposta ao fim do stream ou na desconexão do cliente
+    response.call_on_close(sse_streams.release)
+    return response
+
+@app.route('/print-queue', methods=['GET'])
+def print_queue_status():
+    """Estatísticas da fila de impressão do processo que atendeu a requisição"""
+    return jsonify({'success': True, 'queue': print_jobs.stats()})
+
 def generate_self_signed_cert():
     """Gera certificados SSL self-signed usando cryptography"""
     # Gerar chave privada
@@ -588,12 +1636,12 @@ def generate_self_signed_cert():
 
 # Gerar certificados SSL se não existirem (para Gunicorn)
 if not os.path.exists('cert.pem') or not os.path.exists('key.pem'):
-    print("⚠️  Certificados SSL não encontrados. Gerando certificados self-signed...")
+    log.warning("Certificados SSL não encontrados. Gerando certificados self-signed...")
     try:
         generate_self_signed_cert()
-        print("✅ Certificados gerados com sucesso!")
+        log.info("Certificados gerados com sucesso")
     except Exception as e:
-        print(f"⚠️  Erro ao gerar certificados: {e}")
+        log.error("Erro ao gerar certificados: %s", e)
 
 if __name__ == '__main__':
     # Criar contexto SSL
@@ -601,6 +1649,12 @@ if __name__ == '__main__':
     context.load_cert_chain('cert.pem', 'key.pem')
     
     print("🚀 Iniciando Sistema de Etiquetas Montagem...")
+    if platform.system() == "Windows":
+        font_ms = font_registry.preload([(CALIBRI_BOLD, 29)])
+        print(f"🔤 Fonte Calibri carregada em {font_ms:.1f}ms")
+        font = get_font(CALIBRI_BOLD, 29)
+        if font is not None and GLYPH_ATLAS_ENABLED:
+            get_atlas(font)
     print("📱 Acesse: https://10.150.16.45:9020")
     print("\n⚠️  Para parar o servidor, pressione Ctrl+C\n")
     
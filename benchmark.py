@@ -0,0 +1,1401 @@
+"""Micro-benchmarks dos caminhos quentes do sistema de etiquetas.
+
+Cada subcomando mede um trecho isolado e imprime um resumo (média, p50, p95).
+
+    python benchmark.py lookup                      # stand-in com latência simulada
+    python benchmark.py lookup --dsn postgresql://postgres@localhost/etiquetas --setup
+    python benchmark.py lookup --dsn postgresql://postgres@localhost/etiquetas_int --setup --op-type integer
+    python benchmark.py encoder --font C:\\Windows\\Fonts\\calibrib.ttf
+    python benchmark.py render --font C:\\Windows\\Fonts\\calibrib.ttf
+    python benchmark.py spool --fake-open-ms 5 --fake-doc-ms 3 --fake-delay-ms 1
+    python benchmark.py dispatch --printers 3 --slow-ms 50
+    python benchmark.py assets --labels 100
+    python benchmark.py template --extra 40
+    python benchmark.py jobstore --pending 5000
+    python benchmark.py http --threads 6 --server-ms 2
+    python benchmark.py batch --size 30 --fake-doc-ms 20
+    python benchmark.py logging
+    python benchmark.py e2e --stations 8 --duration 20
+    python benchmark.py e2e --dsn postgresql://postgres@localhost/etiquetas --setup --workers 2
+    python benchmark.py e2e --compare bench-results/e2e-anterior.json
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import math
+import os
+import platform
+import random
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+# Logs do app e do servidor de impressão não entram na medição
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+
+def _summarize(name: str, samples: list[float]) -> dict:
+    ordered = sorted(samples)
+    summary = {
+        "name": name,
+        "runs": len(samples),
+        "mean_ms": statistics.fmean(samples) * 1000.0,
+        "p50_ms": ordered[len(ordered) // 2] * 1000.0,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000.0,
+    }
+    print(
+        f"{name:<28} runs={summary['runs']:<6} "
+        f"mean={summary['mean_ms']:.3f}ms p50={summary['p50_ms']:.3f}ms p95={summary['p95_ms']:.3f}ms"
+    )
+    return summary
+
+
+def _time_runs(func: Callable[[], object], runs: int, warmup: int = 5) -> list[float]:
+    # Os prints de debug do app iriam para o terminal e distorceriam a medição.
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(warmup):
+            func()
+        samples = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - start)
+    return samples
+
+
+# --------------------------------------------------------------------- lookup
+class _StandInCursor:
+    """Cursor que simula o PostgreSQL: cada execute custa uma ida e volta."""
+
+    def __init__(self, connection: "_StandInConnection") -> None:
+        self.connection = connection
+        self._row: Optional[tuple] = None
+        self._rows: list[tuple] = []
+
+    def execute(self, sql: str, params: tuple = ()) -> None:
+        time.sleep(self.connection.rtt)
+        self.connection.round_trips += 1
+        statement = sql.strip().upper()
+        if statement.startswith("PREPARE"):
+            self.connection.prepared_sql[statement.split()[1]] = statement
+            self._row = None
+            return
+        if statement.startswith("EXECUTE"):
+            statement = self.connection.prepared_sql[statement.split()[1]]
+
+        if "UNNEST" in statement:
+            self._rows = [
+                (f"SN{op}{peca}", peca, op, "P123", "Veículo Teste", True)
+                for peca, op in zip(params[0], params[1])
+            ]
+        elif "LATERAL" in statement:
+            peca, op = params[0], params[1]
+            self._row = (f"SN{op}{peca}", peca, op, "P123", "Veículo Teste", True)
+        elif "CONTROLE_SERIAL_NUMBER" in statement:
+            peca, op = params[0], params[1]
+            self._row = (f"SN{op}{peca}", peca, op)
+        else:
+            self._row = ("P123", "Veículo Teste")
+
+    def fetchone(self) -> Optional[tuple]:
+        return self._row
+
+    def fetchall(self) -> list[tuple]:
+        return self._rows
+
+
+class _StandInConnection:
+    def __init__(self, rtt: float) -> None:
+        self.rtt = rtt
+        self.round_trips = 0
+        self.prepared_statements: set[str] = set()
+        self.prepared_sql: dict[str, str] = {}
+
+    def cursor(self) -> _StandInCursor:
+        return _StandInCursor(self)
+
+
+def _setup_local_postgres(conn, op_type: str = "varchar") -> None:
+    # op_type=integer reproduz bancos em que a OP é numérica (consultas com cast)
+    op_column = "INTEGER" if op_type == "integer" else "VARCHAR(20)"
+    op_value = "" if op_type == "integer" else "::text"
+    cursor = conn.cursor()
+    cursor.execute("CREATE SCHEMA IF NOT EXISTS dados_uso_geral")
+    cursor.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS public.controle_serial_number (
+            id SERIAL PRIMARY KEY,
+            serial_number VARCHAR(50) NOT NULL,
+            part_number VARCHAR(50) NOT NULL DEFAULT '',
+            op {op_column} NOT NULL,
+            peca VARCHAR(10) NOT NULL,
+            created TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    cursor.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS dados_uso_geral.dados_op (
+            op {op_column} PRIMARY KEY,
+            planta VARCHAR(50),
+            codigo_veiculo VARCHAR(50),
+            modelo VARCHAR(100)
+        )
+        """
+    )
+    cursor.execute(
+        "INSERT INTO public.controle_serial_number (serial_number, op, peca) "
+        f"SELECT 'SN' || g, (10000 + g % 500){op_value}, 'PBS' FROM generate_series(1, 20000) g"
+    )
+    cursor.execute(
+        "INSERT INTO dados_uso_geral.dados_op (op, planta, codigo_veiculo, modelo) "
+        f"SELECT (10000 + g){op_value}, 'Jarinu', 'P' || g, 'Modelo ' || g FROM generate_series(0, 499) g "
+        "ON CONFLICT (op) DO NOTHING"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS controle_serial_number_peca_op_created "
+        "ON public.controle_serial_number (peca, op, created DESC)"
+    )
+    conn.commit()
+
+
+def bench_lookup(args: argparse.Namespace) -> list[dict]:
+    import app
+
+    if args.dsn:
+        import psycopg2
+        from db_pool import PooledConnection
+
+        conn = psycopg2.connect(args.dsn, connection_factory=PooledConnection)
+        if args.setup:
+            _setup_local_postgres(conn, args.op_type)
+        target = f"PostgreSQL {args.dsn}"
+    else:
+        conn = _StandInConnection(args.rtt_ms / 1000.0)
+        target = f"stand-in com RTT simulado de {args.rtt_ms}ms"
+
+    print(f"Busca de serial contra {target}")
+    ops = [str(10000 + i % 500) for i in range(args.runs)]
+
+    def run(fetch: Callable) -> Callable[[], object]:
+        counter = iter(range(10 ** 9))
+
+        def _call() -> object:
+            cursor = conn.cursor()
+            result = fetch(cursor, "PBS", ops[next(counter) % len(ops)])
+            if args.dsn:
+                conn.rollback()
+            return result
+
+        return _call
+
+    @contextlib.contextmanager
+    def _borrow():
+        yield conn
+
+    def cached(cursor, peca, op):
+        # search_serial_number completo (cache de OP incluso) sobre a mesma conexão
+        return app.search_serial_number(peca, op)
+
+    app.db_connection = _borrow
+    if app.op_cache is not None:
+        app.op_cache.clear()
+
+    results = []
+    for name, fetch in (
+        ("legacy (2 consultas)", app.fetch_serial_legacy),
+        ("joined", lambda cur, peca, op: app.fetch_serial_joined(cur, peca, op, prepared=False)),
+        ("prepared", app.fetch_serial_joined),
+        ("prepared + cache de OP", cached),
+    ):
+        summary = _summarize(name, _time_runs(run(fetch), args.runs))
+        if isinstance(conn, _StandInConnection):
+            summary["round_trips"] = conn.round_trips
+            print(f"{'':<28} idas ao banco: {conn.round_trips}")
+            conn.round_trips = 0
+        results.append(summary)
+
+    # /buscar-lote: --batch códigos em uma consulta x um /buscar por código
+    pairs = [("PBS", str(10000 + i % 500 + (i // 500) * 1000)) for i in range(args.batch)]
+
+    def batch() -> object:
+        found = app.search_serial_numbers(pairs)
+        if args.dsn:
+            conn.rollback()
+        return found
+
+    summary = _summarize(f"lote de {args.batch} códigos", _time_runs(batch, max(1, args.runs // 20), warmup=1))
+    per_code = results[-1]["mean_ms"] * args.batch
+    print(f"{'':<28} {args.batch} x /buscar estimado: {per_code:.1f}ms "
+          f"({per_code / summary['mean_ms']:.0f}x mais lento)")
+    results.append(summary)
+    return results
+
+
+# -------------------------------------------------------------------- encoder
+DEFAULT_FONT = r"C:\Windows\Fonts\calibrib.ttf"
+
+
+def serial_corpus(count: int, seed: int = 42) -> list[str]:
+    """Seriais no formato das etiquetas (ex.: V04241125J00001)."""
+    rng = random.Random(seed)
+    letters = "ABCDEFGHJKLMNPRSTUVWXYZ"
+    serials = []
+    for _ in range(count):
+        date = f"{rng.randint(1, 28):02d}{rng.randint(1, 12):02d}{rng.randint(24, 26):02d}"
+        serials.append(f"V{rng.randint(0, 99):02d}{date}{rng.choice(letters)}{rng.randint(0, 99999):05d}")
+    return serials
+
+
+def load_bench_font(path: Optional[str], size: int):
+    from PIL import ImageFont
+
+    path = path or DEFAULT_FONT
+    if os.path.exists(path):
+        return ImageFont.truetype(path, size), path
+    return ImageFont.load_default(size), "fonte padrão do Pillow"
+
+
+def render_serial(text: str, font, mirror: bool = False, crop: bool = True):
+    """Mesmo desenho de text_to_zpl_image (recortado na tinta; crop=False: padding 10px)."""
+    from PIL import Image
+    from glyph_atlas import render_freetype
+    from zpl_graphics import crop_to_ink
+
+    if crop:
+        image, _ = crop_to_ink(render_freetype(text, font, padding=0))
+    else:
+        image = render_freetype(text, font)
+    if mirror:
+        image = image.transpose(Image.FLIP_LEFT_RIGHT)
+    return image
+
+
+def legacy_gfa(image) -> tuple[str, int, int]:
+    """Codificador original pixel a pixel, mantido como referência."""
+    img_width, img_height = image.size
+    bytes_per_row = (img_width + 7) // 8
+    total_bytes = bytes_per_row * img_height
+    hex_data = []
+    for y in range(img_height):
+        row_bytes = []
+        for x in range(0, img_width, 8):
+            byte_val = 0
+            for bit in range(8):
+                if x + bit < img_width:
+                    if image.getpixel((x + bit, y)) == 0:
+                        byte_val |= (1 << (7 - bit))
+            row_bytes.append(f"{byte_val:02X}")
+        hex_data.append("".join(row_bytes))
+    return "".join(hex_data), total_bytes, bytes_per_row
+
+
+def bench_encoder(args: argparse.Namespace) -> list[dict]:
+    from zpl_graphics import GFA_ENCODINGS, decode_gfa, image_to_gfa, pack_image
+
+    font, font_name = load_bench_font(args.font, args.size)
+    serials = serial_corpus(args.corpus)
+    images = [render_serial(serial, font, mirror=index % 2 == 1) for index, serial in enumerate(serials)]
+    print(f"Codificação ^GFA de {len(images)} etiquetas ({font_name}, tamanho {args.size})")
+
+    for serial, image in zip(serials, images):
+        if image_to_gfa(image) != legacy_gfa(image):
+            raise SystemExit(f"Saída divergente do codificador original para {serial!r}")
+    print("Saída idêntica ao codificador original em todo o corpus.")
+
+    def cycle(encode: Callable) -> Callable[[], object]:
+        counter = iter(range(10 ** 9))
+        return lambda: encode(images[next(counter) % len(images)])
+
+    results = [
+        _summarize("getpixel (original)", _time_runs(cycle(legacy_gfa), args.runs)),
+        _summarize("tobytes + translate", _time_runs(cycle(image_to_gfa), args.runs)),
+    ]
+
+    # Codificações do campo de dados: tamanho, razão sobre o hex e ida e volta
+    raw_size = sum(len(image_to_gfa(image)[0]) for image in images)
+    for encoding in GFA_ENCODINGS:
+        size = 0
+        for serial, image in zip(serials, images):
+            data, bytes_per_row = pack_image(image)
+            field, total_bytes, _ = image_to_gfa(image, encoding)
+            if decode_gfa(field, total_bytes, bytes_per_row) != data:
+                raise SystemExit(f"{encoding}: campo não decodifica no bitmap original para {serial!r}")
+            size += len(field)
+        summary = _summarize(f"^GFA {encoding}", _time_runs(cycle(lambda image: image_to_gfa(image, encoding)), args.runs))
+        summary.update(mean_chars=size / len(images), ratio=raw_size / size)
+        print(f"{'':<28} {summary['mean_chars']:.0f} caracteres por etiqueta, {summary['ratio']:.2f}x menor que hex")
+        results.append(summary)
+    print("Todas as codificações decodificam de volta no bitmap original.")
+
+    # Recorte na tinta: payload por etiqueta com a margem fixa de 10px x recortado
+    padded = [render_serial(serial, font, mirror=index % 2 == 1, crop=False) for index, serial in enumerate(serials)]
+    print(f"Recorte na tinta (redução por etiqueta, {len(images)} etiquetas):")
+    for encoding in GFA_ENCODINGS:
+        before = [len(image_to_gfa(image, encoding)[0]) for image in padded]
+        after = [len(image_to_gfa(image, encoding)[0]) for image in images]
+        reductions = sorted(1 - new / old for old, new in zip(before, after))
+        summary = {
+            "name": f"recorte {encoding}",
+            "padded_chars": statistics.fmean(before),
+            "cropped_chars": statistics.fmean(after),
+            "reduction_min": reductions[0],
+            "reduction_p50": reductions[len(reductions) // 2],
+            "reduction_max": reductions[-1],
+        }
+        print(
+            f"  {encoding:<4} {summary['padded_chars']:>6.0f} -> {summary['cropped_chars']:>5.0f} caracteres "
+            f"(redução min {summary['reduction_min']:.0%}, p50 {summary['reduction_p50']:.0%}, "
+            f"max {summary['reduction_max']:.0%})"
+        )
+        results.append(summary)
+    return results
+
+
+# --------------------------------------------------------------------- render
+def bench_render(args: argparse.Namespace) -> list[dict]:
+    from PIL import ImageChops
+    from glyph_atlas import get_atlas, render_freetype
+
+    font, font_name = load_bench_font(args.font, args.size)
+    serials = serial_corpus(args.corpus)
+    print(f"Renderização de {len(serials)} seriais ({font_name}, tamanho {args.size})")
+
+    start = time.perf_counter()
+    atlas = get_atlas(font)
+    print(f"Atlas criado e validado em {(time.perf_counter() - start) * 1000:.1f}ms (ativo: {atlas.enabled})")
+
+    fallbacks = 0
+    worst = 0
+    for serial in serials:
+        rendered = atlas.render(serial)
+        if rendered is None:
+            fallbacks += 1
+            continue
+        reference = render_freetype(serial, font)
+        if rendered.size != reference.size:
+            raise SystemExit(f"Tamanho divergente para {serial!r}: {rendered.size} x {reference.size}")
+        diff = ImageChops.logical_xor(rendered, reference)
+        differing = diff.histogram()[255]
+        worst = max(worst, differing)
+    print(f"Pixels divergentes (pior caso): {worst} (tolerância {args.tolerance}); fallbacks para FreeType: {fallbacks}")
+    if worst > args.tolerance:
+        raise SystemExit("Atlas fora da tolerância em relação ao FreeType")
+
+    def cycle(render: Callable) -> Callable[[], object]:
+        counter = iter(range(10 ** 9))
+        return lambda: render(serials[next(counter) % len(serials)], font)
+
+    return [
+        _summarize("FreeType (string inteira)", _time_runs(cycle(render_freetype), args.runs)),
+        _summarize("atlas de glifos", _time_runs(cycle(lambda text, _: atlas.render(text)), args.runs)),
+    ]
+
+
+# ---------------------------------------------------------------------- spool
+def bench_spool(args: argparse.Namespace) -> list[dict]:
+    # O backend fake precisa estar definido antes de importar send_to_printer;
+    # o subprocess herda o mesmo ambiente.
+    os.environ["PRINT_BACKEND"] = "fake"
+    os.environ["PRINT_FAKE_DELAY_MS"] = str(args.fake_delay_ms)
+    os.environ["PRINT_FAKE_OPEN_MS"] = str(args.fake_open_ms)
+    os.environ["PRINT_FAKE_DOC_MS"] = str(args.fake_doc_ms)
+    import print_server_calibri
+    from send_to_printer import FakeSpooler, PrinterSessionManager, PrintJob, process_print_job
+    from zpl_graphics import image_to_gfa
+
+    font, font_name = load_bench_font(args.font, 29)
+    serials = serial_corpus(args.corpus)
+    labels = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for serial in serials:
+            hex_string, total_bytes, bytes_per_row = image_to_gfa(render_serial(serial, font, mirror=True))
+            labels.append(f"^XA^PMY^FO0,15^GFA,{total_bytes},{total_bytes},{bytes_per_row},{hex_string}^FS^PQ1,0,1,Y^XZ")
+    average = statistics.fmean(len(label) for label in labels)
+    print(f"Envio de {len(labels)} etiquetas (~{average:.0f} bytes, {font_name}) para impressora fake: "
+          f"abertura {args.fake_open_ms}ms, documento {args.fake_doc_ms}ms, escrita {args.fake_delay_ms}ms")
+
+    script = Path(__file__).resolve().parent / "send_to_printer.py"
+    counter = iter(range(10 ** 9))
+
+    def via_subprocess() -> None:
+        label = labels[next(counter) % len(labels)]
+        result = subprocess.run([sys.executable, str(script), "--text", label], capture_output=True, text=True)
+        if result.returncode != 0:
+            raise SystemExit(f"send_to_printer.py falhou: {result.stderr}")
+
+    def in_process() -> None:
+        process_print_job(PrintJob(text=labels[next(counter) % len(labels)]))
+
+    client = print_server_calibri.app.test_client()
+
+    def endpoint() -> None:
+        response = client.post("/print", json={"text": labels[next(counter) % len(labels)]})
+        if response.status_code != 200:
+            raise SystemExit(f"/print respondeu {response.status_code}: {response.get_json()}")
+
+    def session(idle_timeout: float, batch: int) -> Callable[[], object]:
+        manager = PrinterSessionManager(
+            FakeSpooler(args.fake_open_ms / 1000.0, args.fake_doc_ms / 1000.0, args.fake_delay_ms / 1000.0),
+            idle_timeout=idle_timeout,
+        )
+        payloads = [label.encode("ascii") for label in labels]
+
+        def _send() -> None:
+            start = next(counter)
+            manager.send("fake", [payloads[(start + i) % len(payloads)] for i in range(batch)])
+        return _send
+
+    subprocess_runs = max(1, args.runs // 10)
+    results = [
+        _summarize("subprocess por etiqueta", _time_runs(via_subprocess, subprocess_runs, warmup=1)),
+        _summarize("process_print_job", _time_runs(in_process, args.runs)),
+        _summarize("POST /print (in-process)", _time_runs(endpoint, args.runs)),
+        _summarize("handle aberto por job", _time_runs(session(0, 1), args.runs)),
+        _summarize("handle persistente", _time_runs(session(300.0, 1), args.runs)),
+    ]
+    batched = _summarize(f"lote de {args.batch} por documento", _time_runs(session(300.0, args.batch), args.runs // args.batch or 1))
+    print(f"{'':<28} por etiqueta: {batched['mean_ms'] / args.batch:.3f}ms")
+    return results + [batched]
+
+
+# ------------------------------------------------------------------- dispatch
+def bench_dispatch(args: argparse.Namespace) -> list[dict]:
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from send_to_printer import FakeSpooler, PrinterDispatcher, PrinterSessionManager
+
+    class _MixedSpooler(FakeSpooler):
+        """Primeira impressora lenta (--slow-ms), demais com --fake-delay-ms."""
+
+        def write(self, handle, payload):
+            if self._open_handles[handle] == "zebra-0":
+                time.sleep(args.slow_ms / 1000.0)
+            return super().write(handle, payload)
+
+    printers = [f"zebra-{index}" for index in range(args.printers)]
+    payload = b"^XA^FO0,15^GFA,4,4,1,FFFFFFFF^FS^XZ"
+    print(f"{args.jobs} jobs por impressora em {args.printers} impressoras "
+          f"(zebra-0 com {args.slow_ms}ms por documento, demais {args.fake_delay_ms}ms)")
+
+    def scenario(name: str, send_one: Callable[[str], object]) -> dict:
+        fast_latencies: list[float] = []
+        lock = threading.Lock()
+
+        def _job(printer: str) -> None:
+            start = time.perf_counter()
+            send_one(printer)
+            if printer != "zebra-0":
+                with lock:
+                    fast_latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.printers * 4) as pool:
+            list(pool.map(_job, [printer for _ in range(args.jobs) for printer in printers]))
+        elapsed = time.perf_counter() - start
+        print(f"{name:<28} total={elapsed * 1000:.1f}ms")
+        return _summarize(f"  {name} (rápidas)", fast_latencies)
+
+    def manager() -> PrinterSessionManager:
+        return PrinterSessionManager(_MixedSpooler(write_delay=args.fake_delay_ms / 1000.0))
+
+    global_lock = threading.Lock()
+    shared = manager()
+
+    def send_global(printer: str) -> None:
+        # Comportamento anterior: um lock para o processo inteiro.
+        with global_lock:
+            shared.send(printer, [payload])
+
+    dispatcher = PrinterDispatcher(manager(), max_batch=args.batch)
+    return [
+        scenario("lock global", send_global),
+        scenario("fila por impressora", lambda printer: dispatcher.submit(printer, payload).result()),
+    ]
+
+
+# --------------------------------------------------------------------- assets
+def bench_assets(args: argparse.Namespace) -> list[dict]:
+    from PIL import Image
+    from send_to_printer import FakeSpooler, PrinterDispatcher, PrinterSessionManager, extract_static_artwork
+    from zpl_graphics import image_to_gfa
+
+    template = Path(args.template).read_text(encoding="utf-8-sig")
+
+    # Logo em 1 bit, como um ^GFA exportado pelo ZebraDesigner no template
+    logo = Image.open(args.logo).convert("RGBA")
+    background = Image.new("RGBA", logo.size, "white")
+    logo = Image.alpha_composite(background, logo).convert("L")
+    logo = logo.resize((args.logo_width, round(logo.height * args.logo_width / logo.width)))
+    logo = logo.point(lambda value: 255 if value >= 128 else 0).convert("1")
+    field, total_bytes, bytes_per_row = image_to_gfa(logo)
+    quantity = template.rfind("^PQ")
+    with_logo = (
+        template[:quantity]
+        + f"^FO20,160^GFA,{total_bytes},{total_bytes},{bytes_per_row},{field}^FS\n"
+        + template[quantity:]
+    )
+
+    rng = random.Random(args.seed)
+
+    def fill(text: str) -> bytes:
+        # Valores de exemplo nos marcadores {N}
+        return re.sub(r"\{(\d+)\}", lambda match: f"V{match.group(1)}-{rng.randrange(10 ** 6)}", text).encode("utf-8")
+
+    results = []
+    for name, text in ((Path(args.template).name, template), (f"{Path(args.template).name} + logo", with_logo)):
+        rewritten, assets = extract_static_artwork(text)
+        print(f"{name}: {len(assets)} gráfico(s) armazenado(s), ~DG de {sum(len(a.command) for a in assets)} bytes")
+        for mode, source, job_assets in (("inline", text, ()), ("~DG + ^XG", rewritten, assets)):
+            spooler = FakeSpooler(keep_documents=args.labels + 1)
+            dispatcher = PrinterDispatcher(PrinterSessionManager(spooler), max_batch=1)
+            payloads = [fill(source) for _ in range(args.labels)]
+            for payload in payloads:
+                dispatcher.submit("fake", payload, job_assets).result()
+            written = sum(len(document) for _, document in spooler.documents)
+            summary = {
+                "name": f"{name} {mode}",
+                "label_bytes": statistics.fmean(len(payload) for payload in payloads),
+                "total_bytes": written,
+                "downloads": dispatcher.assets.downloads,
+            }
+            print(
+                f"  {mode:<10} {summary['label_bytes']:>7.0f} bytes por etiqueta, "
+                f"{written} bytes em {args.labels} etiquetas ({summary['downloads']} download(s) de gráfico)"
+            )
+            results.append(summary)
+        inline, stored = results[-2:]
+        print(f"  {'':<10} redução por etiqueta: {1 - stored['label_bytes'] / inline['label_bytes']:.0%}, "
+              f"no total: {1 - stored['total_bytes'] / inline['total_bytes']:.0%}")
+    return results
+
+
+# ------------------------------------------------------------------- template
+def legacy_apply_template(template_path: Path, payload: Optional[str], token: str, extra_variables: dict) -> str:
+    """_apply_template original: lê o arquivo e faz um str.replace por variável."""
+    from send_to_printer import PrintJobError, _normalize_token_key, _token_candidates
+
+    template_text = template_path.read_text(encoding="utf-8-sig")
+    replacements = [(token, payload)] if payload is not None else []
+    replacements.extend(extra_variables.items())
+    successful_tokens: set[str] = set()
+    for raw_token, value in replacements:
+        for candidate in _token_candidates(raw_token):
+            if candidate in template_text:
+                template_text = template_text.replace(candidate, value)
+                successful_tokens.add(_normalize_token_key(raw_token))
+                break
+    missing = [raw for raw, _ in replacements if _normalize_token_key(raw) not in successful_tokens]
+    if missing:
+        raise PrintJobError(f"Token(s) {missing} não encontrado(s) em {template_path}.")
+    return template_text
+
+
+def bench_template(args: argparse.Namespace) -> list[dict]:
+    import tempfile
+
+    # Sem gráficos armazenados: as duas versões partem do mesmo texto
+    os.environ["PRINT_STORED_GRAPHICS"] = "0"
+    import send_to_printer
+    from send_to_printer import TemplateRegistry, _apply_template, _load_template
+
+    send_to_printer.PRINT_STORED_GRAPHICS = False
+    source = Path(args.template).read_text(encoding="utf-8-sig")
+    existing = sorted({int(number) for number in re.findall(r"\{(\d+)\}", source)})
+    # Marcadores extras ({13}, {14}, ...) em campos novos antes do ^PQ
+    extra = [str(existing[-1] + index + 1) for index in range(args.extra)]
+    quantity = source.rfind("^PQ")
+    fields = "".join(f"^FO20,{20 + index % 300}^A0N,20,20^FD{{{name}}}^FS\n" for index, name in enumerate(extra))
+    text = source[:quantity] + fields + source[quantity:]
+
+    rng = random.Random(args.seed)
+    names = [str(number) for number in existing] + extra
+    jobs = [
+        {f"{{{name}}}": f"{name}-{rng.randrange(10 ** 6)}" for name in names}
+        for _ in range(64)
+    ]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = Path(workdir) / "bench.prn"
+        path.write_text(text, encoding="utf-8")
+        print(f"Template {Path(args.template).name} + {args.extra} campos: {len(names)} marcadores, {len(text)} bytes")
+
+        for variables in jobs:
+            if _apply_template(_load_template(path), None, "{1}", variables)[0] != legacy_apply_template(path, None, "{1}", variables):
+                raise SystemExit("Saída do template compilado diverge da substituição original")
+        print("Saída idêntica à substituição original.")
+
+        counter = iter(range(10 ** 9))
+
+        def legacy() -> None:
+            legacy_apply_template(path, None, "{1}", jobs[next(counter) % len(jobs)])
+
+        def compiled() -> None:
+            # Caminho da CLI: stat a cada job para conferir o mtime
+            _apply_template(_load_template(path), None, "{1}", jobs[next(counter) % len(jobs)])
+
+        registry = TemplateRegistry(Path(workdir))
+        registry.scan()
+
+        def registered() -> None:
+            # Servidor HTTP: só consulta ao dict do registro
+            _apply_template(registry.get("bench.prn"), None, "{1}", jobs[next(counter) % len(jobs)])
+
+        results = [
+            _summarize("read_text + str.replace", _time_runs(legacy, args.runs)),
+            _summarize("compilado (trechos + join)", _time_runs(compiled, args.runs)),
+            _summarize("compilado via registro", _time_runs(registered, args.runs)),
+        ]
+    print(f"{'':<28} ganho: {results[0]['mean_ms'] / results[1]['mean_ms']:.1f}x "
+          f"({results[0]['mean_ms'] / results[2]['mean_ms']:.1f}x sem stat)")
+    return results
+
+
+# ------------------------------------------------------------------ jobstore
+def bench_jobstore(args: argparse.Namespace) -> list[dict]:
+    import tempfile
+    import uuid
+    from print_queue import STATUS_SPOOLED, JobStore
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = JobStore(os.path.join(directory, "print_jobs.db"))
+        start = time.perf_counter()
+        for index in range(args.pending):
+            store.create(uuid.uuid4().hex, f"V{index:014d}", status=STATUS_SPOOLED)
+        print(f"Spool com {args.pending} jobs pendentes criado em {(time.perf_counter() - start) * 1000:.0f}ms")
+
+        counter = iter(range(10 ** 9))
+        results = [
+            _summarize("has_spooled (leitura)", _time_runs(store.has_spooled, args.runs)),
+            _summarize("grava job no spool", _time_runs(
+                lambda: store.create(uuid.uuid4().hex, f"N{next(counter)}", status=STATUS_SPOOLED), args.runs)),
+            _summarize("spool_stats", _time_runs(store.spool_stats, args.runs)),
+        ]
+
+        def claim_and_finish() -> None:
+            job, _ = store.claim_spooled(lease=60.0)
+            store.update(job["id"], "done", "ok")
+
+        results.append(_summarize("reserva + conclui o mais antigo", _time_runs(claim_and_finish, args.runs)))
+        return results
+
+
+# ----------------------------------------------------------------------- http
+def bench_http(args: argparse.Namespace) -> list[dict]:
+    import logging
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+
+    import requests
+    from flask import Flask, jsonify, request
+    from werkzeug.serving import make_server
+
+    from http_pool import HTTPSessionPool
+
+    # Servidor de impressão falso: mesmo Werkzeug threaded (HTTP/1.1) do print_server_calibri.
+    fake = Flask("fake_print_server")
+
+    @fake.route("/print-calibri", methods=["POST"])
+    def _print_calibri():
+        time.sleep(args.server_ms / 1000.0)
+        return jsonify({"success": True, "serial": request.get_json()["serial"]})
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, fake, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/print-calibri"
+    print(f"{args.requests} POSTs com {args.threads} threads para servidor local "
+          f"({args.server_ms}ms por requisição)")
+
+    def scenario(name: str, post: Callable[[], object]) -> dict:
+        latencies: list[float] = []
+        lock = threading.Lock()
+
+        def _one(_: int) -> None:
+            start = time.perf_counter()
+            response = post()
+            elapsed = time.perf_counter() - start
+            if response.status_code != 200:
+                raise SystemExit(f"{name}: HTTP {response.status_code}")
+            with lock:
+                latencies.append(elapsed)
+
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            list(pool.map(_one, range(args.threads * 2)))  # aquecimento
+            latencies.clear()
+            start = time.perf_counter()
+            list(pool.map(_one, range(args.requests)))
+        elapsed = time.perf_counter() - start
+        summary = _summarize(name, latencies)
+        ordered = sorted(latencies)
+        summary["p99_ms"] = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000.0
+        print(f"{'':<28} p99={summary['p99_ms']:.3f}ms vazão={args.requests / elapsed:.0f} req/s")
+        return summary
+
+    http_pool = HTTPSessionPool(pool_size=args.threads)
+    body = {"serial": "V00000000000001"}
+    results = [
+        scenario("requests.post por chamada", lambda: requests.post(url, json=body, timeout=15)),
+        scenario("pool keep-alive", lambda: http_pool.post(url, json=body)),
+    ]
+    for host, stats in http_pool.stats()["hosts"].items():
+        print(f"{'':<28} {host}: {stats['connections_opened']} conexões para {stats['requests']} requisições")
+    server.shutdown()
+    return results
+
+
+# ---------------------------------------------------------------------- batch
+def bench_batch(args: argparse.Namespace) -> list[dict]:
+    import logging
+    import threading
+
+    # Servidor de impressão real (HTTP local) com impressora fake e sem cache
+    # de ZPL, para medir renderização + spooler a cada lote.
+    os.environ["PRINT_BACKEND"] = "fake"
+    os.environ["PRINT_FAKE_OPEN_MS"] = str(args.fake_open_ms)
+    os.environ["PRINT_FAKE_DOC_MS"] = str(args.fake_doc_ms)
+    os.environ["LABEL_CACHE_ENABLED"] = "0"
+    os.environ["RENDER_WORKERS"] = str(args.render_workers)
+    from werkzeug.serving import make_server
+
+    import print_server_calibri
+    from fonts import CALIBRI_BOLD, registry
+
+    font, font_name = load_bench_font(args.font, print_server_calibri.DEFAULT_FONT_SIZE)
+    if font_name != CALIBRI_BOLD:
+        # Sem Calibri (Linux): o servidor usa a fonte do benchmark no lugar dela
+        registry.register(CALIBRI_BOLD, print_server_calibri.DEFAULT_FONT_SIZE, font)
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, print_server_calibri.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}"
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app
+
+    serials = serial_corpus(args.size * (args.runs + 1))
+    batches = iter([serials[i:i + args.size] for i in range(0, len(serials), args.size)])
+    print(f"Lotes de {args.size} seriais ({font_name}, {args.render_workers} threads de renderização), "
+          f"impressora fake: abertura {args.fake_open_ms}ms, documento {args.fake_doc_ms}ms")
+
+    def single_calls() -> None:
+        for serial in next(batches):
+            success, message, _ = app.print_to_remote_printer(serial, url)
+            if not success:
+                raise SystemExit(f"/print-calibri falhou: {message}")
+
+    def one_batch() -> None:
+        results, message, _ = app.print_batch_to_remote_printer(next(batches), url)
+        if results is None or not all(success for success, _ in results):
+            raise SystemExit(f"/print-calibri-batch falhou: {message}")
+
+    results = [
+        _summarize(f"{args.size} x /print-calibri", _time_runs(single_calls, args.runs // 2 or 1, warmup=0)),
+        _summarize("1 x /print-calibri-batch", _time_runs(one_batch, args.runs // 2 or 1, warmup=0)),
+    ]
+    print(f"{'':<28} ganho: {results[0]['mean_ms'] / results[1]['mean_ms']:.1f}x "
+          f"({results[1]['mean_ms'] / args.size:.2f}ms por etiqueta no lote)")
+    server.shutdown()
+    return results
+
+
+# -------------------------------------------------------------------- logging
+def bench_logging(args: argparse.Namespace) -> list[dict]:
+    import logging
+    import threading
+
+    import json_logging
+
+    # Custo por linha na thread da requisição. A saída é um pipe lido por outra
+    # thread, como o stdout do gunicorn lido pelo Docker.
+    read_fd, write_fd = os.pipe()
+
+    def _drain() -> None:
+        while os.read(read_fd, 65536):
+            pass
+
+    threading.Thread(target=_drain, daemon=True).start()
+    devnull = open(write_fd, "w")
+    json_logging.setup_logging(level="INFO", fmt="json", debug_sample=args.sample, stream=devnull)
+    log = logging.getLogger("bench")
+    serial, peca, op = "V04241125J00001", "PBS", "12345"
+    print(f"Log de um scan típico: {args.debug_lines} linhas de detalhe + {args.info_lines} de resumo")
+
+    def with_print() -> None:
+        for _ in range(args.debug_lines + args.info_lines):
+            print(f"[DEBUG] Buscando no banco: peca='{peca}', op='{op}' serial {serial}", file=devnull, flush=True)
+
+    def scan() -> None:
+        for _ in range(args.debug_lines):
+            log.debug("Buscando no banco: peca='%s', op='%s' serial %s", peca, op, serial)
+        for _ in range(args.info_lines):
+            log.info("[BUSCA] Serial encontrado: %s para Peça: %s, OP: %s", serial, peca, op)
+
+    tokens = iter(range(10 ** 9))
+
+    def scan_with_request_id() -> None:
+        token = json_logging.request_id_var.set(f"req-{next(tokens)}")
+        scan()
+        json_logging.request_id_var.reset(token)
+
+    results = [
+        _summarize("print(flush=True)", _time_runs(with_print, args.runs)),
+        _summarize("logging nível INFO", _time_runs(scan_with_request_id, args.runs)),
+    ]
+    logging.getLogger().setLevel(logging.DEBUG)
+    results.append(_summarize(f"logging DEBUG amostrado {args.sample:.0%}", _time_runs(scan_with_request_id, args.runs)))
+    print(f"{'':<28} descartados com a fila cheia: {json_logging.logging_stats()['dropped']}")
+    return results
+
+
+# ------------------------------------------------------------------------ e2e
+# Carga ponta a ponta: app.py e print_server_calibri.py em processos próprios,
+# impressora fake e PostgreSQL local (--dsn) ou stand-in. Estações simuladas
+# fazem scans como os tablets da linha; as etapas vêm do /metrics dos dois.
+
+_METRIC_LINE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})? (\S+)$')
+_METRIC_LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+
+
+class _StandInDatabase:
+    """Uma conexão stand-in por thread do servidor (como o pool do app)."""
+
+    def __init__(self, rtt: float) -> None:
+        self.rtt = rtt
+        self._local = threading.local()
+
+    @contextlib.contextmanager
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = _StandInConnection(self.rtt)
+        yield conn
+
+
+def e2e_app():
+    """WSGI do app para o e2e (também serve de fábrica do gunicorn: `benchmark:e2e_app()`).
+
+    Com BENCH_STANDIN_RTT_MS definido o banco é o stand-in; sem ele o app usa
+    DB_HOST/DB_NAME/... como em produção.
+    """
+    import app
+
+    rtt_ms = os.environ.get("BENCH_STANDIN_RTT_MS")
+    if rtt_ms:
+        app.db_connection = _StandInDatabase(float(rtt_ms) / 1000.0).connection
+    return app.app
+
+
+def bench_serve(args: argparse.Namespace) -> list[dict]:
+    """Sobe um dos servidores em Werkzeug threaded (processo filho do e2e)."""
+    import logging
+
+    from werkzeug.serving import make_server
+
+    if args.role == "print_server":
+        import print_server_calibri
+        from fonts import CALIBRI_BOLD, registry
+
+        font, font_name = load_bench_font(args.font, print_server_calibri.DEFAULT_FONT_SIZE)
+        if font_name != CALIBRI_BOLD:
+            registry.register(CALIBRI_BOLD, print_server_calibri.DEFAULT_FONT_SIZE, font)
+        wsgi = print_server_calibri.app
+    else:
+        wsgi = e2e_app()
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", args.port, wsgi, threaded=True)
+    server.serve_forever()
+    return []
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(url: str, process: subprocess.Popen, log_path: Path, timeout: float = 30.0) -> None:
+    import requests
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            break
+        try:
+            if requests.get(url, timeout=1).status_code == 200:
+                return
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.2)
+    tail = log_path.read_text(encoding="utf-8", errors="replace")[-2000:]
+    raise SystemExit(f"Servidor não respondeu em {url}:\n{tail}")
+
+
+def parse_metrics(text: str) -> dict[tuple, float]:
+    """Exposição do Prometheus -> {(nome, labels ordenados): valor}."""
+    samples = {}
+    for line in text.splitlines():
+        match = _METRIC_LINE.match(line)
+        if match is None:
+            continue
+        name, labels, value = match.groups()
+        key = tuple(sorted(_METRIC_LABEL.findall(labels or "")))
+        samples[(name, key)] = float(value)
+    return samples
+
+
+def _histogram_quantile(buckets: list[tuple[float, float]], quantile: float) -> Optional[float]:
+    """Quantil por interpolação linear nos buckets cumulativos, como o PromQL."""
+    total = buckets[-1][1] if buckets else 0.0
+    if total <= 0:
+        return None
+    rank = quantile * total
+    lower_bound, lower_count = 0.0, 0.0
+    for bound, count in buckets:
+        if count >= rank:
+            if math.isinf(bound):
+                return lower_bound
+            if count == lower_count:
+                return bound
+            return lower_bound + (bound - lower_bound) * (rank - lower_count) / (count - lower_count)
+        lower_bound, lower_count = bound, count
+    return lower_bound
+
+
+def histogram_summary(before: dict, after: dict, metric: str, label: str) -> dict:
+    """Contagem, média e p50/p95/p99 por valor de `label`, só do intervalo medido."""
+    groups: dict[str, dict] = {}
+    for (name, labels), value in after.items():
+        if not name.startswith(metric):
+            continue
+        delta = value - before.get((name, labels), 0.0)
+        labels_dict = dict(labels)
+        group = groups.setdefault(labels_dict.get(label, ""), {"buckets": {}, "sum": 0.0, "count": 0.0})
+        if name == f"{metric}_bucket":
+            bound = float("inf") if labels_dict["le"] == "+Inf" else float(labels_dict["le"])
+            group["buckets"][bound] = group["buckets"].get(bound, 0.0) + delta
+        elif name == f"{metric}_sum":
+            group["sum"] += delta
+        elif name == f"{metric}_count":
+            group["count"] += delta
+
+    summary = {}
+    for value, group in sorted(groups.items()):
+        if group["count"] <= 0:
+            continue
+        buckets = sorted(group["buckets"].items())
+        entry = {"count": int(group["count"]), "mean_ms": group["sum"] / group["count"] * 1000.0}
+        for name, quantile in (("p50_ms", 0.50), ("p95_ms", 0.95), ("p99_ms", 0.99)):
+            estimate = _histogram_quantile(buckets, quantile)
+            entry[name] = None if estimate is None else estimate * 1000.0
+        summary[value] = entry
+    return summary
+
+
+def counter_summary(before: dict, after: dict, metric: str) -> dict:
+    totals = {}
+    for (name, labels), value in after.items():
+        if name != metric:
+            continue
+        delta = value - before.get((name, labels), 0.0)
+        if delta:
+            totals[",".join(f"{key}={label}" for key, label in labels)] = int(delta)
+    return totals
+
+
+def _percentiles(samples: list[float]) -> dict:
+    from metrics import percentile
+
+    ordered = sorted(samples)
+    if not ordered:
+        return {"count": 0}
+
+    def pick(fraction: float) -> float:
+        return percentile(ordered, fraction) * 1000.0
+
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000.0,
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+        "max_ms": ordered[-1] * 1000.0,
+    }
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_e2e(args: argparse.Namespace) -> list[dict]:
+    import shutil
+    import tempfile
+
+    import requests
+
+    workdir = Path(tempfile.mkdtemp(prefix="etiquetas-e2e-"))
+    print_port, app_port = _free_port(), _free_port()
+    print_url, app_url = f"http://127.0.0.1:{print_port}", f"http://127.0.0.1:{app_port}"
+
+    env = dict(os.environ)
+    env.update({
+        "LOG_LEVEL": "WARNING",
+        "PRINT_BACKEND": "fake",
+        "PRINT_FAKE_OPEN_MS": str(args.fake_open_ms),
+        "PRINT_FAKE_DOC_MS": str(args.fake_doc_ms),
+        "PRINT_FAKE_DELAY_MS": str(args.fake_delay_ms),
+        "LABEL_CACHE_ENABLED": "1" if args.label_cache else "0",
+        "PRINTER_SERVER_URL": print_url,
+        "PRINT_JOBS_DB": str(workdir / "print_jobs.db"),
+        "CACHE_INVALIDATION_FILE": str(workdir / "cache-invalidation.log"),
+        "METRICS_DIR": str(workdir / "metrics"),
+        "PYTHONPATH": str(Path(__file__).parent),
+    })
+    if args.dsn:
+        import psycopg2
+        import psycopg2.extensions
+
+        if args.setup:
+            with contextlib.closing(psycopg2.connect(args.dsn)) as conn:
+                _setup_local_postgres(conn, args.op_type)
+        dsn = psycopg2.extensions.parse_dsn(args.dsn)
+        env.update({
+            "DB_HOST": dsn.get("host", "localhost"),
+            "DB_NAME": dsn.get("dbname", ""),
+            "DB_USER": dsn.get("user", ""),
+            "DB_PSW": dsn.get("password", ""),
+            "DB_PORT": dsn.get("port", "5432"),
+            "DB_POOL_MAX": str(max(4, args.threads)),
+        })
+        env.pop("BENCH_STANDIN_RTT_MS", None)
+        database = f"PostgreSQL {args.dsn}"
+    else:
+        env["BENCH_STANDIN_RTT_MS"] = str(args.rtt_ms)
+        database = f"stand-in (RTT {args.rtt_ms}ms)"
+
+    script = str(Path(__file__).resolve())
+    commands = {
+        "print_server": [sys.executable, script, "serve", "--role", "print_server", "--port", str(print_port)]
+        + (["--font", args.font] if args.font else []),
+    }
+    if args.workers > 0:
+        # Mesmo modelo da produção (start.sh): gthread, um processo por worker
+        commands["app"] = [
+            sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{app_port}", "--workers", str(args.workers),
+            "--worker-class", "gthread", "--threads", str(args.threads), "--log-level", "warning",
+            "benchmark:e2e_app()",
+        ]
+        env["GUNICORN_THREADS"] = str(args.threads)
+        app_mode = f"gunicorn {args.workers} workers x {args.threads} threads"
+    else:
+        commands["app"] = [sys.executable, script, "serve", "--role", "app", "--port", str(app_port)]
+        app_mode = "Werkzeug threaded (1 processo)"
+
+    processes = []
+    try:
+        for role, url in (("print_server", print_url), ("app", app_url)):
+            log_path = workdir / f"{role}.log"
+            with open(log_path, "wb") as log_file:
+                process = subprocess.Popen(
+                    commands[role], env=env, cwd=Path(__file__).parent, stdout=log_file, stderr=subprocess.STDOUT,
+                )
+            processes.append(process)
+            _wait_ready(f"{url}/metrics", process, log_path)
+
+        print(f"E2E: {args.stations} estações por {args.duration:.0f}s (+{args.warmup:.0f}s de aquecimento)")
+        print(f"  app: {app_mode}; banco: {database}")
+        print(f"  impressora fake: abertura {args.fake_open_ms}ms, documento {args.fake_doc_ms}ms, "
+              f"escrita {args.fake_delay_ms}ms; cache de ZPL {'ligado' if args.label_cache else 'desligado'}")
+
+        # Códigos no formato da linha, espalhados pelas OPs do _setup_local_postgres
+        rng = random.Random(args.seed)
+        barcodes = [f"PBS{10000 + rng.randrange(args.ops)}" for _ in range(5000)]
+        records: list[tuple[str, float, bool]] = []
+        records_lock = threading.Lock()
+        measuring = threading.Event()
+        stop = threading.Event()
+
+        def post(session, path: str, body: dict) -> tuple[bool, dict]:
+            start = time.perf_counter()
+            try:
+                response = session.post(f"{app_url}{path}", json=body, timeout=60)
+                ok = response.status_code == 200
+                data = response.json() if ok else {}
+            except requests.exceptions.RequestException:
+                ok, data = False, {}
+            if measuring.is_set():
+                with records_lock:
+                    records.append((path, time.perf_counter() - start, ok))
+            return ok, data
+
+        def station(index: int) -> None:
+            station_rng = random.Random(args.seed + index)
+            with requests.Session() as session:
+                while not stop.is_set():
+                    barcode = station_rng.choice(barcodes)
+                    start = time.perf_counter()
+                    if station_rng.random() < args.manual_fraction:
+                        # Busca, conferência na tela e impressão em duas chamadas
+                        ok, data = post(session, "/buscar", {"codigoBarras": barcode})
+                        if ok:
+                            ok, _ = post(session, "/imprimir", {"serialNumber": data["data"]["serial_number"]})
+                    else:
+                        ok, _ = post(session, "/buscar-e-imprimir", {"codigoBarras": barcode})
+                    if measuring.is_set():
+                        with records_lock:
+                            records.append(("scan", time.perf_counter() - start, ok))
+                    if args.think_ms:
+                        time.sleep(station_rng.uniform(0.5, 1.5) * args.think_ms / 1000.0)
+
+        threads = [threading.Thread(target=station, args=(index,), daemon=True) for index in range(args.stations)]
+        for thread in threads:
+            thread.start()
+        time.sleep(args.warmup)
+
+        before_app = parse_metrics(requests.get(f"{app_url}/metrics", timeout=10).text)
+        before_print = parse_metrics(requests.get(f"{print_url}/metrics", timeout=10).text)
+        measuring.set()
+        started = time.perf_counter()
+        time.sleep(args.duration)
+        measuring.clear()
+        elapsed = time.perf_counter() - started
+        after_app = parse_metrics(requests.get(f"{app_url}/metrics", timeout=10).text)
+        after_print = parse_metrics(requests.get(f"{print_url}/metrics", timeout=10).text)
+        stop.set()
+        for thread in threads:
+            thread.join(timeout=65)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    with records_lock:
+        measured = list(records)
+    scans = [latency for kind, latency, _ in measured if kind == "scan"]
+    failed = sum(1 for kind, _, ok in measured if kind == "scan" and not ok)
+    endpoints = sorted({kind for kind, _, _ in measured if kind != "scan"})
+
+    result = {
+        "name": "e2e",
+        "revision": _git_revision(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("func", "dsn")},
+        "database": "postgresql" if args.dsn else "stand-in",
+        "duration_s": elapsed,
+        "scans": len(scans),
+        "errors": failed,
+        "throughput_scans_s": len(scans) / elapsed if elapsed else 0.0,
+        "latency": {"scan": _percentiles(scans)},
+        "stages": {
+            "app": histogram_summary(before_app, after_app, "etiquetas_stage_seconds", "stage"),
+            "print_server": histogram_summary(before_print, after_print, "print_server_stage_seconds", "stage"),
+        },
+        "server_requests": {
+            "app": histogram_summary(before_app, after_app, "etiquetas_http_request_seconds", "endpoint"),
+            "print_server": histogram_summary(before_print, after_print, "print_server_http_request_seconds", "endpoint"),
+        },
+        "labels": counter_summary(before_app, after_app, "etiquetas_labels_total"),
+        "fallbacks": counter_summary(before_app, after_app, "etiquetas_print_fallbacks_total"),
+        "server_errors": {
+            "app": counter_summary(before_app, after_app, "etiquetas_errors_total"),
+            "print_server": counter_summary(before_print, after_print, "print_server_errors_total"),
+        },
+    }
+    for endpoint in endpoints:
+        result["latency"][endpoint] = _percentiles([latency for kind, latency, _ in measured if kind == endpoint])
+
+    def line(name: str, stats: dict) -> None:
+        if not stats.get("count"):
+            return
+        percentiles = " ".join(
+            f"{key[:-3]}={stats[key]:.2f}ms" if stats.get(key) is not None else f"{key[:-3]}=-"
+            for key in ("p50_ms", "p95_ms", "p99_ms")
+        )
+        print(f"  {name:<30} n={stats['count']:<7} média={stats['mean_ms']:.2f}ms {percentiles}")
+
+    print(f"Scans: {len(scans)} em {elapsed:.1f}s = {result['throughput_scans_s']:.1f} scans/s, erros: {failed}")
+    print("Latência no cliente:")
+    for name, stats in result["latency"].items():
+        line(name, stats)
+    print("Etapas (servidor, p50/p95/p99 estimados pelos buckets):")
+    for server, stages in result["stages"].items():
+        for stage, stats in stages.items():
+            line(f"{server} {stage}", stats)
+    if result["fallbacks"] or any(result["server_errors"].values()):
+        print(f"  fallbacks: {result['fallbacks']}; erros: {result['server_errors']}")
+
+    output = Path(args.output) if args.output else (
+        Path("bench-results") / f"e2e-{time.strftime('%Y%m%d-%H%M%S')}-{result['revision'] or 'local'}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"Resultado salvo em {output}")
+
+    if args.compare:
+        previous = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        print(f"Comparação com {args.compare} (revisão {previous.get('revision')}):")
+        old_scan, new_scan = previous["latency"]["scan"], result["latency"]["scan"]
+        print(f"  vazão {previous['throughput_scans_s']:.1f} -> {result['throughput_scans_s']:.1f} scans/s")
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            if old_scan.get(key) and new_scan.get(key):
+                print(f"  scan {key[:-3]} {old_scan[key]:.2f} -> {new_scan[key]:.2f}ms "
+                      f"({(new_scan[key] / old_scan[key] - 1) * 100:+.0f}%)")
+
+    return [result]
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks do sistema de etiquetas.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    lookup = subparsers.add_parser("lookup", help="Compara busca de serial em 2 consultas x 1 consulta.")
+    lookup.add_argument("--dsn", help="DSN de um PostgreSQL local. Sem ele usa o stand-in simulado.")
+    lookup.add_argument("--setup", action="store_true", help="Cria tabelas e dados de exemplo no --dsn.")
+    lookup.add_argument("--op-type", choices=("varchar", "integer"), default="varchar",
+                        help="Tipo da coluna op criada pelo --setup (use um banco vazio).")
+    lookup.add_argument("--rtt-ms", type=float, default=1.0, help="RTT simulado por consulta no stand-in.")
+    lookup.add_argument("--runs", type=int, default=300)
+    lookup.add_argument("--batch", type=int, default=2000, help="Códigos por busca em lote (/buscar-lote).")
+    lookup.set_defaults(func=bench_lookup)
+
+    encoder = subparsers.add_parser("encoder", help="Codificador ^GFA original x vetorizado e as codificações hex/acs/z64.")
+    encoder.add_argument("--font", help=f"Fonte TrueType (padrão {DEFAULT_FONT}, ou a do Pillow).")
+    encoder.add_argument("--size", type=int, default=29)
+    encoder.add_argument("--corpus", type=int, default=200, help="Quantidade de seriais gerados.")
+    encoder.add_argument("--runs", type=int, default=500)
+    encoder.set_defaults(func=bench_encoder)
+
+    render = subparsers.add_parser("render", help="Compara FreeType com o atlas de glifos (pixel a pixel).")
+    render.add_argument("--font", help=f"Fonte TrueType (padrão {DEFAULT_FONT}, ou a do Pillow).")
+    render.add_argument("--size", type=int, default=29)
+    render.add_argument("--corpus", type=int, default=500, help="Quantidade de seriais gerados.")
+    render.add_argument("--runs", type=int, default=1000)
+    render.add_argument("--tolerance", type=int, default=0, help="Máximo de pixels divergentes por etiqueta.")
+    render.set_defaults(func=bench_render)
+
+    spool = subparsers.add_parser("spool", help="Compara subprocess por etiqueta com envio in-process.")
+    spool.add_argument("--font", help=f"Fonte TrueType (padrão {DEFAULT_FONT}, ou a do Pillow).")
+    spool.add_argument("--fake-delay-ms", type=float, default=0.0, help="Tempo simulado de escrita na spooler.")
+    spool.add_argument("--fake-open-ms", type=float, default=0.0, help="Tempo simulado de OpenPrinter/ClosePrinter.")
+    spool.add_argument("--fake-doc-ms", type=float, default=0.0, help="Tempo simulado de StartDoc/EndDoc.")
+    spool.add_argument("--batch", type=int, default=10, help="Etiquetas por documento no envio em lote.")
+    spool.add_argument("--corpus", type=int, default=50, help="Quantidade de seriais gerados.")
+    spool.add_argument("--runs", type=int, default=200, help="Envios in-process (subprocess usa 1/10).")
+    spool.set_defaults(func=bench_spool)
+
+    dispatch = subparsers.add_parser("dispatch", help="Lock global x fila/worker por impressora (impressora fake).")
+    dispatch.add_argument("--printers", type=int, default=3)
+    dispatch.add_argument("--jobs", type=int, default=30, help="Jobs por impressora.")
+    dispatch.add_argument("--slow-ms", type=float, default=50.0, help="Tempo por documento da impressora lenta.")
+    dispatch.add_argument("--fake-delay-ms", type=float, default=2.0, help="Tempo por documento das demais.")
+    dispatch.add_argument("--batch", type=int, default=10, help="Máximo de jobs por documento no worker.")
+    dispatch.set_defaults(func=bench_dispatch)
+
+    assets = subparsers.add_parser("assets", help="Arte estática inline x gráfico armazenado (~DG uma vez, ^XG por etiqueta).")
+    assets.add_argument("--template", default=str(Path(__file__).resolve().parent / "ZEBRA.prn"))
+    assets.add_argument("--logo", default=str(Path(__file__).resolve().parent / "static" / "img" / "logo_opera.png"))
+    assets.add_argument("--logo-width", type=int, default=240, help="Largura do logo na etiqueta, em dots.")
+    assets.add_argument("--labels", type=int, default=100)
+    assets.add_argument("--seed", type=int, default=1)
+    assets.set_defaults(func=bench_assets)
+
+    template = subparsers.add_parser("template", help="_apply_template original x template compilado (ZEBRA.prn).")
+    template.add_argument("--template", default=str(Path(__file__).resolve().parent / "ZEBRA.prn"))
+    template.add_argument("--extra", type=int, default=40, help="Marcadores extras acrescentados ao template.")
+    template.add_argument("--runs", type=int, default=2000)
+    template.add_argument("--seed", type=int, default=1)
+    template.set_defaults(func=bench_template)
+
+    jobstore = subparsers.add_parser("jobstore", help="Custo do spool SQLite com milhares de jobs pendentes.")
+    jobstore.add_argument("--pending", type=int, default=5000, help="Jobs pendentes no spool antes da medição.")
+    jobstore.add_argument("--runs", type=int, default=500)
+    jobstore.set_defaults(func=bench_jobstore)
+
+    http = subparsers.add_parser("http", help="requests.post por chamada x pool keep-alive do servidor de impressão.")
+    http.add_argument("--threads", type=int, default=6, help="Chamadas simultâneas (threads do gunicorn + fila).")
+    http.add_argument("--requests", type=int, default=2000)
+    http.add_argument("--server-ms", type=float, default=2.0, help="Tempo simulado de renderização no servidor.")
+    http.set_defaults(func=bench_http)
+
+    batch = subparsers.add_parser("batch", help="N chamadas a /print-calibri x um /print-calibri-batch.")
+    batch.add_argument("--font", help=f"Fonte TrueType (padrão {DEFAULT_FONT}, ou a do Pillow).")
+    batch.add_argument("--size", type=int, default=30, help="Seriais por lote.")
+    batch.add_argument("--runs", type=int, default=20, help="Lotes medidos (metade em cada modo).")
+    batch.add_argument("--fake-open-ms", type=float, default=0.0, help="Tempo simulado de OpenPrinter/ClosePrinter.")
+    batch.add_argument("--fake-doc-ms", type=float, default=20.0, help="Tempo simulado de StartDoc/EndDoc.")
+    batch.add_argument("--render-workers", type=int, default=4, help="Threads de renderização no servidor.")
+    batch.set_defaults(func=bench_batch)
+
+    logs = subparsers.add_parser("logging", help="print(flush=True) x logging estruturado assíncrono.")
+    logs.add_argument("--debug-lines", type=int, default=14, help="Linhas de detalhe (DEBUG) por scan.")
+    logs.add_argument("--info-lines", type=int, default=2, help="Linhas de resumo (INFO) por scan.")
+    logs.add_argument("--sample", type=float, default=0.1, help="Fração de requisições com DEBUG.")
+    logs.add_argument("--runs", type=int, default=2000)
+    logs.set_defaults(func=bench_logging)
+
+    e2e = subparsers.add_parser("e2e", help="Carga ponta a ponta: app + servidor de impressão + impressora fake.")
+    e2e.add_argument("--stations", type=int, default=8, help="Estações (tablets) fazendo scans simultâneos.")
+    e2e.add_argument("--duration", type=float, default=20.0, help="Segundos medidos.")
+    e2e.add_argument("--warmup", type=float, default=3.0, help="Segundos de aquecimento antes da medição.")
+    e2e.add_argument("--think-ms", type=float, default=0.0, help="Pausa média entre scans de uma estação (0 = carga máxima).")
+    e2e.add_argument("--manual-fraction", type=float, default=0.2,
+                     help="Fração dos scans feitos em /buscar + /imprimir em vez de /buscar-e-imprimir.")
+    e2e.add_argument("--ops", type=int, default=500, help="OPs distintas nos códigos lidos.")
+    e2e.add_argument("--seed", type=int, default=42)
+    e2e.add_argument("--dsn", help="PostgreSQL local. Sem ele o app usa o stand-in.")
+    e2e.add_argument("--setup", action="store_true", help="Cria tabelas e dados de exemplo no --dsn.")
+    e2e.add_argument("--op-type", choices=("varchar", "integer"), default="varchar",
+                     help="Tipo da coluna op criada pelo --setup (use um banco vazio).")
+    e2e.add_argument("--rtt-ms", type=float, default=1.0, help="RTT simulado por consulta no stand-in.")
+    e2e.add_argument("--workers", type=int, default=0, help="Workers do gunicorn (0 = Werkzeug em um processo).")
+    e2e.add_argument("--threads", type=int, default=4, help="Threads por worker do gunicorn.")
+    e2e.add_argument("--font", help=f"Fonte TrueType no lugar da Calibri (padrão {DEFAULT_FONT}, ou a do Pillow).")
+    e2e.add_argument("--fake-open-ms", type=float, default=0.0, help="Tempo simulado de OpenPrinter/ClosePrinter.")
+    e2e.add_argument("--fake-doc-ms", type=float, default=5.0, help="Tempo simulado de StartDoc/EndDoc.")
+    e2e.add_argument("--fake-delay-ms", type=float, default=1.0, help="Tempo simulado de escrita na spooler.")
+    e2e.add_argument("--label-cache", action="store_true", help="Liga o cache de ZPL no servidor de impressão.")
+    e2e.add_argument("--output", help="Arquivo JSON do resultado (padrão bench-results/e2e-<data>-<revisão>.json).")
+    e2e.add_argument("--compare", help="JSON de uma execução anterior para comparar vazão e latência.")
+    e2e.set_defaults(func=bench_e2e)
+
+    serve = subparsers.add_parser("serve", help="Uso interno do e2e: sobe o app ou o servidor de impressão.")
+    serve.add_argument("--role", choices=("app", "print_server"), required=True)
+    serve.add_argument("--port", type=int, required=True)
+    serve.add_argument("--font")
+    serve.set_defaults(func=bench_serve)
+
+    return parser
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    args = build_arg_parser().parse_args(argv)
+    args.func(args)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
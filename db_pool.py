@@ -0,0 +1,297 @@
+"""Pool de conexões PostgreSQL por processo.
+
+Mantém conexões psycopg2 abertas entre requisições para que cada leitura de
+código de barras não pague TCP + autenticação + setup de sessão. O pool é
+thread-safe (workers gthread do gunicorn) e deve ser criado dentro de cada
+processo: conexões herdadas de um fork nunca são reutilizadas.
+
+Uso típico:
+
+    pool = ConnectionPool(connect=lambda: psycopg2.connect(...), minconn=1, maxconn=8)
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        ...
+"""
+from __future__ import annotations
+
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+import psycopg2
+import psycopg2.extensions
+
+from metrics import percentile
+
+# Quantidade de amostras de latência de checkout mantidas para percentis.
+_LATENCY_WINDOW = 1000
+
+_POSITIONAL = re.compile(r"\$(\d+)")
+
+
+class PoolTimeoutError(RuntimeError):
+    """Nenhuma conexão ficou disponível dentro do tempo de espera."""
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    """Conexão psycopg2 com os metadados que o pool precisa acompanhar."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        # Nomes dos statements já preparados nesta sessão (PREPARE é por sessão).
+        self.prepared_statements: set[str] = set()
+
+
+class ConnectionPool:
+    """Pool limitado de conexões com health-check e estatísticas."""
+
+    def __init__(
+        self,
+        connect: Callable[[], psycopg2.extensions.connection],
+        minconn: int = 1,
+        maxconn: int = 8,
+        timeout: float = 5.0,
+        healthcheck_after: float = 30.0,
+        max_lifetime: Optional[float] = None,
+    ) -> None:
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Limites do pool inválidos (0 <= min <= max, max >= 1).")
+
+        self.pid = os.getpid()
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.healthcheck_after = healthcheck_after
+        self.max_lifetime = max_lifetime
+
+        self._connect = connect
+        self._cond = threading.Condition()
+        self._idle: deque = deque()
+        self._size = 0
+        self._in_use = 0
+        self._waiting = 0
+
+        self._checkouts = 0
+        self._timeouts = 0
+        self._created = 0
+        self._discarded = 0
+        self._latencies: deque = deque(maxlen=_LATENCY_WINDOW)
+        self._latency_max = 0.0
+
+    # ------------------------------------------------------------------ API
+    def warm(self) -> None:
+        """Abre as conexões mínimas; falhas ficam para o próximo checkout."""
+        opened = []
+        try:
+            for _ in range(self.minconn):
+                opened.append(self.getconn())
+        finally:
+            for conn in opened:
+                self.putconn(conn)
+
+    def getconn(self) -> psycopg2.extensions.connection:
+        start = time.monotonic()
+        deadline = start + self.timeout
+
+        conn = self._reserve(deadline)
+        if conn is None:
+            conn = self._open()
+        elif not self._is_healthy(conn):
+            self._drop(conn)
+            conn = self._open()
+
+        elapsed = time.monotonic() - start
+        with self._cond:
+            self._checkouts += 1
+            self._latencies.append(elapsed)
+            if elapsed > self._latency_max:
+                self._latency_max = elapsed
+        return conn
+
+    def putconn(self, conn: psycopg2.extensions.connection, discard: bool = False) -> None:
+        if not discard and not conn.closed:
+            try:
+                if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+
+        if discard or conn.closed:
+            self._close_quietly(conn)
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._discarded += 1
+                self._cond.notify()
+            return
+
+        if isinstance(conn, PooledConnection):
+            conn.last_used = time.monotonic()
+
+        with self._cond:
+            self._in_use -= 1
+            self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self) -> Iterator[psycopg2.extensions.connection]:
+        """Empresta uma conexão e devolve ao pool ao final do bloco."""
+        conn = self.getconn()
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self.putconn(conn, discard=broken)
+
+    def close(self) -> None:
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+        for conn in idle:
+            self._close_quietly(conn)
+
+    def stats(self) -> dict:
+        with self._cond:
+            latencies = sorted(self._latencies)
+            checkouts = self._checkouts
+            stats = {
+                "pid": self.pid,
+                "min": self.minconn,
+                "max": self.maxconn,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "waiting": self._waiting,
+                "checkouts": checkouts,
+                "timeouts": self._timeouts,
+                "created": self._created,
+                "discarded": self._discarded,
+            }
+            latency_max = self._latency_max
+
+        stats["checkout_ms"] = {
+            "avg": _ms(sum(latencies) / len(latencies)) if latencies else 0.0,
+            "p50": _ms(percentile(latencies, 0.50)),
+            "p95": _ms(percentile(latencies, 0.95)),
+            "p99": _ms(percentile(latencies, 0.99)),
+            "max": _ms(latency_max),
+        }
+        return stats
+
+    # ------------------------------------------------------------ internos
+    def _reserve(self, deadline: float) -> Optional[psycopg2.extensions.connection]:
+        """Reserva uma vaga: devolve conexão ociosa ou None (abrir nova)."""
+        with self._cond:
+            while True:
+                if self._idle:
+                    self._in_use += 1
+                    return self._idle.pop()
+                if self._size < self.maxconn:
+                    self._size += 1
+                    self._in_use += 1
+                    return None
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeoutError(
+                        f"Pool esgotado: nenhuma das {self.maxconn} conexões foi liberada em {self.timeout}s."
+                    )
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+    def _open(self) -> psycopg2.extensions.connection:
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._created += 1
+        return conn
+
+    def _drop(self, conn: psycopg2.extensions.connection) -> None:
+        """Descarta conexão ruim mantendo a vaga reservada para reabertura."""
+        self._close_quietly(conn)
+        with self._cond:
+            self._discarded += 1
+
+    def _is_healthy(self, conn: psycopg2.extensions.connection) -> bool:
+        if conn.closed:
+            return False
+
+        now = time.monotonic()
+        created_at = getattr(conn, "created_at", None)
+        if self.max_lifetime and created_at is not None and now - created_at > self.max_lifetime:
+            return False
+
+        last_used = getattr(conn, "last_used", None)
+        if last_used is None or now - last_used < self.healthcheck_after:
+            return True
+
+        # Conexão ociosa há muito tempo: firewall/pgbouncer podem ter derrubado.
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    @staticmethod
+    def _close_quietly(conn: psycopg2.extensions.connection) -> None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+def execute_prepared(cursor, name: str, sql: str, params: tuple) -> None:
+    """Executa um statement preparado no servidor, preparando-o no primeiro uso.
+
+    `sql` usa placeholders posicionais do PostgreSQL ($1, $2, ...). O PREPARE é
+    feito uma vez por conexão do pool; conexões avulsas (sem controle do que já
+    foi preparado) executam o SQL diretamente.
+    """
+    prepared = getattr(cursor.connection, "prepared_statements", None)
+    if prepared is None:
+        cursor.execute(*inline_positional(sql, params))
+        return
+
+    if name not in prepared:
+        cursor.execute(f"PREPARE {name} AS {sql}")
+        prepared.add(name)
+
+    placeholders = ", ".join(["%s"] * len(params))
+    cursor.execute(f"EXECUTE {name} ({placeholders})", params)
+
+
+def inline_positional(sql: str, params: tuple) -> tuple[str, tuple]:
+    """Converte placeholders $n em %s do psycopg2, reordenando os parâmetros."""
+    ordered: list = []
+
+    def _swap(match: "re.Match[str]") -> str:
+        ordered.append(params[int(match.group(1)) - 1])
+        return "%s"
+
+    return _POSITIONAL.sub(_swap, sql), tuple(ordered)
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000.0, 3)
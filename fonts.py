@@ -0,0 +1,100 @@
+"""Registro de fontes TrueType carregadas uma única vez por processo.
+
+`ImageFont.truetype` lê e interpreta o arquivo .ttf a cada chamada. O registro
+guarda cada par (caminho, tamanho) já carregado e também lembra dos caminhos
+inexistentes (ex.: C:\\Windows\\Fonts no Linux), para que o fallback não custe
+uma exceção de I/O a cada etiqueta.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from typing import Iterable, Optional
+
+from PIL import ImageFont
+
+log = logging.getLogger(__name__)
+
+CALIBRI_BOLD = r"C:\Windows\Fonts\calibrib.ttf"
+
+
+class FontRegistry:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._fonts: dict[tuple[str, int], ImageFont.FreeTypeFont] = {}
+        self._load_ms: dict[tuple[str, int], float] = {}
+        # caminho -> motivo da falha (arquivo ausente ou inválido)
+        self._unavailable: dict[str, str] = {}
+
+    def get(self, path: str, size: int) -> Optional[ImageFont.FreeTypeFont]:
+        """Retorna a fonte carregada ou None se o arquivo não puder ser usado."""
+        key = (path, size)
+        font = self._fonts.get(key)
+        if font is not None:
+            return font
+        if path in self._unavailable:
+            return None
+
+        with self._lock:
+            font = self._fonts.get(key)
+            if font is not None:
+                return font
+            if path in self._unavailable:
+                return None
+
+            if not os.path.isfile(path):
+                self._unavailable[path] = "arquivo não encontrado"
+                log.warning("[FONTES] Fonte indisponível: %s (arquivo não encontrado)", path)
+                return None
+
+            start = time.perf_counter()
+            try:
+                font = ImageFont.truetype(path, size)
+            except OSError as exc:
+                self._unavailable[path] = str(exc)
+                log.warning("[FONTES] Fonte indisponível: %s (%s)", path, exc)
+                return None
+
+            elapsed_ms = (time.perf_counter() - start) * 1000.0
+            self._fonts[key] = font
+            self._load_ms[key] = elapsed_ms
+            log.info("[FONTES] Carregada %s tamanho %s em %.1fms", path, size, elapsed_ms)
+            return font
+
+    def preload(self, specs: Iterable[tuple[str, int]]) -> float:
+        """Carrega as fontes informadas e retorna o tempo total (ms)."""
+        start = time.perf_counter()
+        for path, size in specs:
+            self.get(path, size)
+        return (time.perf_counter() - start) * 1000.0
+
+    def register(self, path: str, size: int, font: ImageFont.FreeTypeFont) -> None:
+        """Associa uma fonte já carregada ao caminho (ex.: benchmark sem Calibri)."""
+        with self._lock:
+            self._fonts[(path, size)] = font
+            self._load_ms[(path, size)] = 0.0
+            self._unavailable.pop(path, None)
+
+    def forget_unavailable(self) -> None:
+        """Permite nova tentativa para fontes que falharam (ex.: fonte instalada depois)."""
+        with self._lock:
+            self._unavailable.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "loaded": [
+                    {"path": path, "size": size, "load_ms": round(self._load_ms[(path, size)], 3)}
+                    for path, size in self._fonts
+                ],
+                "unavailable": dict(self._unavailable),
+            }
+
+
+registry = FontRegistry()
+
+
+def get_font(path: str, size: int) -> Optional[ImageFont.FreeTypeFont]:
+    return registry.get(path, size)
@@ -0,0 +1,211 @@
+"""Renderização de seriais por atlas de glifos.
+
+Os seriais usam um alfabeto pequeno (dígitos e maiúsculas) em uma única fonte
+e tamanho. Em vez de rasterizar a string inteira no FreeType a cada etiqueta,
+cada glifo é rasterizado uma vez (bitmap 1 bit + deslocamento) e a etiqueta é
+montada colando os glifos nas posições do pen, com kerning por par.
+
+O resultado reproduz `ImageDraw.text` pixel a pixel:
+- posições dos glifos vêm das métricas do modo '1' (hinting monocromático,
+  o mesmo usado ao desenhar em imagem '1');
+- o tamanho da imagem vem de `font.getbbox(texto)` (modo padrão), como em
+  `text_to_zpl_image`.
+
+Strings com caracteres fora do alfabeto, ou cuja tinta começa à esquerda da
+origem (glifo inicial com bearing negativo), voltam para o FreeType. Ao ser
+criado, o atlas se valida contra o FreeType em todos os pares do alfabeto e
+se desativa se encontrar qualquer diferença.
+"""
+from __future__ import annotations
+
+import logging
+import string
+import threading
+from typing import Iterable, Optional
+
+from PIL import Image, ImageDraw, ImageFont
+
+log = logging.getLogger(__name__)
+
+DEFAULT_ALPHABET = string.digits + string.ascii_uppercase
+
+
+def render_freetype(text: str, font: ImageFont.FreeTypeFont, padding: int = 10) -> Image.Image:
+    """Caminho original: rasteriza a string inteira pelo FreeType."""
+    bbox = font.getbbox(text)
+    width = bbox[2] - bbox[0] + padding * 2
+    height = bbox[3] - bbox[1] + padding * 2
+    image = Image.new("1", (width, height), 1)  # 1 = branco
+    ImageDraw.Draw(image).text((padding, padding - bbox[1]), text, font=font, fill=0)
+    return image
+
+
+def _fixed(value: float) -> int:
+    """Converte pixels (float) para 26.6 de ponto fixo, como o FreeType."""
+    return round(value * 64)
+
+
+def _pixel(value: int) -> int:
+    return (value + 32) >> 6
+
+
+class GlyphAtlas:
+    def __init__(self, font: ImageFont.FreeTypeFont, alphabet: str = DEFAULT_ALPHABET) -> None:
+        self.font = font
+        self.alphabet = alphabet
+        self.enabled = True
+
+        # Métricas de tamanho (modo padrão) e de desenho (modo '1'), em 26.6.
+        self._advance_box = {c: _fixed(font.getlength(c)) for c in alphabet}
+        self._advance_ink = {c: _fixed(font.getlength(c, mode="1")) for c in alphabet}
+        self._bbox = {c: font.getbbox(c) for c in alphabet}
+        self._kerning: dict[tuple[str, str], tuple[int, int]] = {}
+        self._lock = threading.Lock()
+
+        self._glyphs: dict[str, Optional[tuple[int, int, Image.Image]]] = {
+            c: self._rasterize(c) for c in alphabet
+        }
+
+    def _rasterize(self, char: str) -> Optional[tuple[int, int, Image.Image]]:
+        """Bitmap do glifo (tinta = 1) e deslocamento da tinta em relação ao pen.
+
+        O glifo é desenhado depois de um espaço, para que a origem da máscara
+        do Pillow seja a mesma de um glifo no meio do serial.
+        """
+        margin = self.font.size * 2
+        pen = _pixel(_fixed(self.font.getlength(" " + char, mode="1")) - self._advance_ink[char])
+        canvas = Image.new("1", (margin * 4, margin * 3), 0)
+        ImageDraw.Draw(canvas).text((margin, margin), " " + char, font=self.font, fill=1)
+        box = canvas.getbbox()
+        if box is None:
+            return None
+        return box[0] - margin - pen, box[1] - margin, canvas.crop(box)
+
+    def _pair(self, left: str, right: str) -> tuple[int, int]:
+        key = (left, right)
+        kerning = self._kerning.get(key)
+        if kerning is None:
+            pair = left + right
+            kerning = (
+                _fixed(self.font.getlength(pair)) - self._advance_box[left] - self._advance_box[right],
+                _fixed(self.font.getlength(pair, mode="1")) - self._advance_ink[left] - self._advance_ink[right],
+            )
+            with self._lock:
+                self._kerning[key] = kerning
+        return kerning
+
+    def render(self, text: str, padding: int = 10) -> Optional[Image.Image]:
+        """Mesma imagem de `render_freetype`, ou None se o texto não for suportado."""
+        if not self.enabled or not text:
+            return None
+
+        glyphs = self._glyphs
+        bboxes = self._bbox
+        pen_box = pen_ink = 0
+        left = top = right = bottom = None
+        placements = []
+        previous = None
+
+        for char in text:
+            if char not in glyphs:
+                return None
+            if previous is not None:
+                kern_box, kern_ink = self._pair(previous, char)
+                pen_box += self._advance_box[previous] + kern_box
+                pen_ink += self._advance_ink[previous] + kern_ink
+
+            x_box = _pixel(pen_box)
+            char_left, char_top, char_right, char_bottom = bboxes[char]
+            left = x_box + char_left if left is None else min(left, x_box + char_left)
+            right = x_box + char_right if right is None else max(right, x_box + char_right)
+            top = char_top if top is None else min(top, char_top)
+            bottom = char_bottom if bottom is None else max(bottom, char_bottom)
+
+            if glyphs[char] is not None:
+                placements.append((_pixel(pen_ink), glyphs[char]))
+            previous = char
+
+        # Tinta à esquerda da origem: o Pillow desloca a máscara; fica com o FreeType.
+        if left < 0:
+            return None
+
+        image = Image.new("1", (right - left + padding * 2, bottom - top + padding * 2), 1)
+        for x, (dx, dy, bitmap) in placements:
+            image.paste(0, (padding + x + dx, padding + dy - top), bitmap)
+        return image
+
+    def validate(self, samples: Optional[Iterable[str]] = None) -> list[str]:
+        """Compara com o FreeType e retorna as amostras divergentes."""
+        mismatches = []
+        for sample in samples if samples is not None else pair_samples(self.alphabet):
+            rendered = self.render(sample)
+            if rendered is None:
+                continue
+            reference = render_freetype(sample, self.font)
+            if rendered.size != reference.size or rendered.tobytes() != reference.tobytes():
+                mismatches.append(sample)
+        return mismatches
+
+
+def pair_samples(alphabet: str, chunk: int = 16) -> list[str]:
+    """Strings que cobrem todos os pares do alfabeto (sequência de De Bruijn)."""
+    size = len(alphabet)
+    sequence: list[int] = []
+    work = [0] * (2 * size)
+
+    def _db(t: int, p: int) -> None:
+        if t > 2:
+            if 2 % p == 0:
+                sequence.extend(work[1:p + 1])
+            return
+        work[t] = work[t - p]
+        _db(t + 1, p)
+        for value in range(work[t - p] + 1, size):
+            work[t] = value
+            _db(t + 1, t)
+
+    _db(1, 1)
+    text = "".join(alphabet[i] for i in sequence) + alphabet[sequence[0]]
+    # Fatias sobrepostas em um caractere para não perder pares nas bordas.
+    return [text[i:i + chunk] for i in range(0, len(text) - 1, chunk - 1)]
+
+
+_atlases: dict[int, tuple[ImageFont.FreeTypeFont, GlyphAtlas]] = {}
+_atlases_lock = threading.Lock()
+
+
+def get_atlas(font: ImageFont.FreeTypeFont) -> GlyphAtlas:
+    """Atlas da fonte, criado e validado no primeiro uso."""
+    entry = _atlases.get(id(font))
+    if entry is not None and entry[0] is font:
+        return entry[1]
+
+    with _atlases_lock:
+        entry = _atlases.get(id(font))
+        if entry is not None and entry[0] is font:
+            return entry[1]
+
+        atlas = GlyphAtlas(font)
+        mismatches = atlas.validate()
+        if mismatches:
+            atlas.enabled = False
+            log.warning(
+                "[ATLAS] Desativado para %s tamanho %s: %s amostra(s) divergem do FreeType",
+                getattr(font, "path", font), font.size, len(mismatches),
+            )
+        _atlases[id(font)] = (font, atlas)
+        return atlas
+
+
+def render_text(
+    text: str,
+    font: ImageFont.FreeTypeFont,
+    padding: int = 10,
+    use_atlas: bool = True,
+) -> Image.Image:
+    """Imagem 1 bit do texto (preto sobre branco) com `padding` em volta."""
+    if use_atlas:
+        image = get_atlas(font).render(text, padding)
+        if image is not None:
+            return image
+    return render_freetype(text, font, padding)
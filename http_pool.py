@@ -0,0 +1,133 @@
+"""Pool de conexões HTTP keep-alive para o servidor de impressão.
+
+`requests.post` solto abre uma conexão TCP nova por etiqueta (e outra no
+fallback). Aqui um único `HTTPAdapter` (pool do urllib3, thread-safe) é
+compartilhado por todas as threads do processo; cada thread usa a sua
+`requests.Session` montada sobre ele, para não dividir cookies/estado.
+Recriado após o fork do gunicorn, como o pool do PostgreSQL.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import Counter, deque
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import percentile
+
+
+class HTTPSessionPool:
+    """Sessões por thread sobre um pool de conexões compartilhado.
+
+    - `pool_size`: conexões mantidas abertas por host (threads do gunicorn +
+      threads da fila de impressão).
+    - `connect_timeout` / `read_timeout`: timeouts padrão, em segundos,
+      separados para que um servidor desligado falhe rápido sem encurtar o
+      tempo de renderização/impressão do outro lado.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = 8,
+        connect_timeout: float = 3.0,
+        read_timeout: float = 15.0,
+        latency_samples: int = 1000,
+    ) -> None:
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._latency_samples = latency_samples
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._reset()
+
+    def _reset(self) -> None:
+        # Sem novas tentativas automáticas: POST não é idempotente e o spool
+        # de impressão decide quando reenviar.
+        self._adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size, max_retries=0)
+        self._local = threading.local()
+        self._pid = os.getpid()
+        self.requests = 0
+        self.errors: Counter = Counter()
+        self.status: Counter = Counter()
+        self._latencies: deque[float] = deque(maxlen=self._latency_samples)
+
+    def session(self) -> requests.Session:
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    # Conexões herdadas do processo pai ficam para ele.
+                    self._reset()
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.mount("http://", self._adapter)
+            session.mount("https://", self._adapter)
+            self._local.session = session
+        return session
+
+    def post(self, url: str, read_timeout: Optional[float] = None, **kwargs) -> requests.Response:
+        """POST pelo pool, com timeout (conexão, leitura) e métricas."""
+        timeout = (self.connect_timeout, read_timeout if read_timeout is not None else self.read_timeout)
+        session = self.session()
+        start = time.perf_counter()
+        try:
+            response = session.post(url, timeout=timeout, **kwargs)
+        except requests.exceptions.RequestException as exc:
+            with self._lock:
+                self.requests += 1
+                self.errors[type(exc).__name__] += 1
+            raise
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.requests += 1
+            self.status[response.status_code] += 1
+            self._latencies.append(elapsed)
+        return response
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = {
+                "pid": self._pid,
+                "pool_size": self.pool_size,
+                "connect_timeout": self.connect_timeout,
+                "read_timeout": self.read_timeout,
+                "requests": self.requests,
+                "status": {str(code): count for code, count in self.status.items()},
+                "errors": dict(self.errors),
+                "latency_ms": {
+                    "samples": len(latencies),
+                    "p50": _percentile_ms(latencies, 0.50),
+                    "p95": _percentile_ms(latencies, 0.95),
+                    "p99": _percentile_ms(latencies, 0.99),
+                    "max": _percentile_ms(latencies, 1.0),
+                },
+            }
+        stats["hosts"] = self._host_stats()
+        return stats
+
+    def _host_stats(self) -> dict:
+        """Conexões abertas x requisições por host (reuso do keep-alive)."""
+        hosts = {}
+        pools = self._adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            # A fila do urllib3 guarda None nas vagas ainda sem conexão.
+            idle = sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool is not None else 0
+            hosts[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                "connections_opened": pool.num_connections,
+                "requests": pool.num_requests,
+                "idle": idle,
+            }
+        return hosts
+
+
+def _percentile_ms(sorted_values: list, fraction: float) -> float:
+    return round(percentile(sorted_values, fraction) * 1000.0, 3)
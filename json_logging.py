@@ -0,0 +1,234 @@
+"""Logging estruturado e não bloqueante.
+
+Substitui os `print(..., flush=True)` dos caminhos quentes. A thread que
+atende a requisição só cria o registro e o coloca em uma fila limitada; uma
+thread por processo formata (JSON por linha ou texto) e escreve no stdout.
+Com a fila cheia o registro é descartado e contado, nunca bloqueia o scan.
+
+- Níveis por `LOG_LEVEL` (em produção INFO: `log.debug(...)` com argumentos
+  preguiçosos custa só a checagem de nível).
+- `LOG_DEBUG_SAMPLE` amostra o DEBUG por requisição: uma requisição sorteada
+  registra todas as suas linhas de DEBUG, as demais nenhuma.
+- Cada linha leva o `request_id` da requisição em andamento (contextvar).
+"""
+from __future__ import annotations
+
+import atexit
+import datetime
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import uuid
+import zlib
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional, TextIO
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+# Atributos padrão do LogRecord; o que vier a mais (extra=...) vira campo do JSON.
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "request_id"}
+
+
+def new_request_id(incoming: Optional[str] = None) -> str:
+    """Reaproveita o X-Request-ID recebido (se for seguro) ou gera um novo."""
+    if incoming and _VALID_REQUEST_ID.match(incoming):
+        return incoming
+    return uuid.uuid4().hex[:16]
+
+
+class RequestContextFilter(logging.Filter):
+    """Anota o registro com o request_id da thread que o criou."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+_debug_sample_rate = 1.0
+
+
+def debug_sampled() -> bool:
+    """Sorteia se o DEBUG da requisição atual deve ser registrado.
+
+    Com request_id o sorteio é determinístico por requisição, para que uma
+    requisição amostrada tenha o rastro completo.
+    """
+    rate = _debug_sample_rate
+    if rate >= 1.0:
+        return True
+    if rate <= 0.0:
+        return False
+    request_id = request_id_var.get()
+    if request_id:
+        return zlib.crc32(request_id.encode("ascii", "replace")) / 0xFFFFFFFF < rate
+    return random.random() < rate
+
+
+class SampledLogger(logging.Logger):
+    """Logger cujo `debug()` aplica a amostragem antes de criar o registro."""
+
+    def debug(self, msg, *args, **kwargs) -> None:
+        if self.isEnabledFor(logging.DEBUG) and debug_sampled():
+            self._log(logging.DEBUG, msg, args, **kwargs)
+
+
+class JsonFormatter(logging.Formatter):
+    """Uma linha JSON por registro: ts, level, logger, msg, request_id, pid e extras."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc)
+            .isoformat(timespec="milliseconds")
+            .replace("+00:00", "Z"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        entry["pid"] = record.process
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Formato legível para desenvolvimento (LOG_FORMAT=text)."""
+
+    def __init__(self) -> None:
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        if getattr(record, "request_id", None) is None:
+            record.request_id = "-"
+        return super().format(record)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler que descarta (e conta) registros quando a fila está cheia.
+
+    Usa `queue.SimpleQueue` (implementada em C, sem lock em Python); o limite
+    `maxsize` é verificado antes do put e pode ser excedido por poucas linhas.
+    """
+
+    def __init__(self, maxsize: int = 10000) -> None:
+        super().__init__(queue.SimpleQueue())
+        self.maxsize = maxsize
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Só resolve a mensagem e o traceback (não são serializáveis depois);
+        # o JSON é montado na thread de escrita.
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.queue.qsize() >= self.maxsize:
+            self.dropped += 1
+            return
+        self.queue.put_nowait(record)
+
+
+_setup_lock = threading.Lock()
+_setup_pid: Optional[int] = None
+_handler: Optional[NonBlockingQueueHandler] = None
+_listener: Optional[QueueListener] = None
+
+
+def setup_logging(
+    level: Optional[str] = None,
+    fmt: Optional[str] = None,
+    debug_sample: Optional[float] = None,
+    queue_size: Optional[int] = None,
+    stream: Optional[TextIO] = None,
+) -> NonBlockingQueueHandler:
+    """Configura o logger raiz do processo (idempotente; refeito após fork).
+
+    Parâmetros omitidos vêm de LOG_LEVEL (INFO), LOG_FORMAT (json|text),
+    LOG_DEBUG_SAMPLE (1.0) e LOG_QUEUE_SIZE (10000).
+    """
+    global _setup_pid, _handler, _listener, _debug_sample_rate
+    with _setup_lock:
+        if _setup_pid == os.getpid() and _handler is not None:
+            return _handler
+
+        level = (level or os.getenv("LOG_LEVEL", "INFO")).strip().upper()
+        fmt = (fmt or os.getenv("LOG_FORMAT", "json")).strip().lower()
+        if debug_sample is None:
+            debug_sample = float(os.getenv("LOG_DEBUG_SAMPLE", "1"))
+        if queue_size is None:
+            queue_size = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+        stream = stream or sys.stdout or sys.stderr
+        # pythonw (servidor de impressão sem janela) não tem stdout
+        output: logging.Handler = logging.StreamHandler(stream) if stream is not None else logging.NullHandler()
+        output.setFormatter(TextFormatter() if fmt == "text" else JsonFormatter())
+
+        handler = NonBlockingQueueHandler(queue_size)
+        handler.addFilter(RequestContextFilter())
+
+        # Amostragem do DEBUG nos loggers já criados (imports) e nos próximos
+        _debug_sample_rate = debug_sample
+        logging.setLoggerClass(SampledLogger)
+        for existing in logging.Logger.manager.loggerDict.values():
+            if type(existing) is logging.Logger:
+                existing.__class__ = SampledLogger
+
+        # Campos que não vão para o JSON: evita sys._getframe e consultas à
+        # thread/processo a cada registro criado
+        logging._srcfile = None
+        logging.logThreads = False
+        logging.logMultiprocessing = False
+        logging.logAsyncioTasks = False
+
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(handler)
+        root.setLevel(level)
+
+        # Listener herdado do processo pai (fork) não existe aqui: só descarta.
+        listener = QueueListener(handler.queue, output, respect_handler_level=False)
+        listener.start()
+        if _listener is None:
+            atexit.register(_stop_listener)
+        _handler, _listener, _setup_pid = handler, listener, os.getpid()
+        return handler
+
+
+def _stop_listener() -> None:
+    # Escreve o que ainda estiver na fila antes de o processo sair.
+    if _listener is not None and _setup_pid == os.getpid() and _listener._thread is not None:
+        _listener.stop()
+
+
+def logging_stats() -> dict:
+    handler = _handler
+    if handler is None:
+        return {"configured": False}
+    return {
+        "configured": True,
+        "level": logging.getLevelName(logging.getLogger().level),
+        "queue_depth": handler.queue.qsize(),
+        "queue_size": handler.maxsize,
+        "dropped": handler.dropped,
+    }
@@ -0,0 +1,448 @@
+"""Métricas no formato texto do Prometheus (`GET /metrics`).
+
+Contadores, gauges e histogramas com labels, sem dependências externas.
+
+Com o gunicorn cada worker é um processo e a coleta cai em um worker
+qualquer. Com `directory` definido (METRICS_DIR), cada processo grava os
+seus valores em um arquivo próprio mapeado em memória
+(`metrics_<pid>.db`): uma atualização é só um `struct.pack_into` no mmap,
+sem syscall. A coleta lê os arquivos de todos os processos e soma. Contadores
+e histogramas de workers que já morreram continuam somando (os totais não
+regridem); gauges (em andamento) só contam processos vivos. O diretório deve
+ser esvaziado antes de subir o servidor (`start.sh` faz isso).
+
+Sem `directory` os valores ficam na memória do processo (servidor de
+impressão, `python app.py`).
+"""
+from __future__ import annotations
+
+import glob
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Iterator, Optional, Sequence
+
+# Limites em segundos: de etapas em memória (~0.1ms) ao timeout do servidor de impressão.
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_HEADER = struct.Struct("i")
+_VALUE = struct.Struct("d")
+_INITIAL_FILE_SIZE = 64 * 1024
+
+
+def _sample_key(name: str, labelvalues: Sequence[str], field: str = "") -> str:
+    """Chave de um valor: métrica, valores dos labels e campo (sum/count/le do bucket)."""
+    return json.dumps([name, list(labelvalues), field], ensure_ascii=False, separators=(",", ":"))
+
+
+class _LocalValues:
+    """Valores na memória do processo."""
+
+    def __init__(self) -> None:
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._values: dict[str, float] = {}
+
+    def add(self, key: str, amount: float) -> None:
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def add_many(self, updates: Sequence[tuple[str, float]]) -> None:
+        with self._lock:
+            for key, amount in updates:
+                self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set(self, key: str, value: float) -> None:
+        with self._lock:
+            self._values[key] = value
+
+    def collect(self, gauges: frozenset) -> dict[str, float]:
+        with self._lock:
+            return dict(self._values)
+
+
+def _read_entries(data: bytes) -> Iterator[tuple[str, float, int]]:
+    """(chave, valor, posição do valor) de um arquivo de métricas."""
+    if len(data) < _HEADER.size:
+        return
+    used = min(_HEADER.unpack_from(data, 0)[0], len(data))
+    pos = 8
+    while pos + 4 <= used:
+        keylen = _HEADER.unpack_from(data, pos)[0]
+        padded = keylen + (8 - (keylen + 4) % 8)
+        value_pos = pos + 4 + padded
+        if value_pos + 8 > used:
+            break
+        key = data[pos + 4:pos + 4 + keylen].decode("utf-8")
+        yield key, _VALUE.unpack_from(data, value_pos)[0], value_pos
+        pos = value_pos + 8
+
+
+def _pid_alive(pid: int) -> bool:
+    if os.name != "posix":
+        # No Windows os.kill(pid, 0) encerraria o processo; lá só há um processo.
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class _MmapValues:
+    """Valores do processo em um arquivo mapeado em memória, lido pelos outros workers.
+
+    Layout: cabeçalho com os bytes usados (int32 + 4 de alinhamento) seguido
+    de entradas `int32 tamanho, chave utf-8 (alinhada a 8), double valor`. A
+    entrada é escrita antes de o cabeçalho avançar, então quem lê nunca vê
+    uma entrada pela metade.
+    """
+
+    def __init__(self, directory: str, gauges: frozenset) -> None:
+        self.pid = os.getpid()
+        self.path = os.path.join(directory, f"metrics_{self.pid}.db")
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, "a+b")
+        size = os.fstat(self._file.fileno()).st_size
+        if size < _INITIAL_FILE_SIZE:
+            self._file.truncate(_INITIAL_FILE_SIZE)
+            size = _INITIAL_FILE_SIZE
+        self._capacity = size
+        self._map = mmap.mmap(self._file.fileno(), self._capacity)
+
+        self._positions: dict[str, int] = {}
+        self._used = _HEADER.unpack_from(self._map, 0)[0]
+        if self._used == 0:
+            self._used = 8
+            _HEADER.pack_into(self._map, 0, self._used)
+        for key, _, value_pos in _read_entries(self._map[:self._used]):
+            self._positions[key] = value_pos
+            # PID reaproveitado de um worker morto: o que estava em andamento acabou.
+            if json.loads(key)[0] in gauges:
+                _VALUE.pack_into(self._map, value_pos, 0.0)
+
+    def add(self, key: str, amount: float) -> None:
+        with self._lock:
+            self._add(key, amount)
+
+    def add_many(self, updates: Sequence[tuple[str, float]]) -> None:
+        with self._lock:
+            for key, amount in updates:
+                self._add(key, amount)
+
+    def _add(self, key: str, amount: float) -> None:
+        pos = self._positions.get(key)
+        if pos is None:
+            pos = self._append(key)
+        _VALUE.pack_into(self._map, pos, _VALUE.unpack_from(self._map, pos)[0] + amount)
+
+    def set(self, key: str, value: float) -> None:
+        with self._lock:
+            pos = self._positions.get(key)
+            if pos is None:
+                pos = self._append(key)
+            _VALUE.pack_into(self._map, pos, value)
+
+    def _append(self, key: str) -> int:
+        encoded = key.encode("utf-8")
+        padded = len(encoded) + (8 - (len(encoded) + 4) % 8)
+        entry_size = 4 + padded + 8
+        while self._used + entry_size > self._capacity:
+            self._grow()
+        pos = self._used
+        struct.pack_into(f"i{padded}sd", self._map, pos, len(encoded), encoded, 0.0)
+        self._used += entry_size
+        _HEADER.pack_into(self._map, 0, self._used)
+        self._positions[key] = pos + 4 + padded
+        return self._positions[key]
+
+    def _grow(self) -> None:
+        self._map.close()
+        self._capacity *= 2
+        self._file.truncate(self._capacity)
+        self._map = mmap.mmap(self._file.fileno(), self._capacity)
+
+    @staticmethod
+    def collect_directory(directory: str, gauges: frozenset) -> dict[str, float]:
+        totals: dict[str, float] = {}
+        own_pid = os.getpid()
+        for path in glob.glob(os.path.join(directory, "metrics_*.db")):
+            try:
+                pid = int(os.path.basename(path)[len("metrics_"):-len(".db")])
+                with open(path, "rb") as handle:
+                    data = handle.read()
+            except (ValueError, OSError):
+                continue
+            alive = pid == own_pid or _pid_alive(pid)
+            for key, value, _ in _read_entries(data):
+                if not alive and json.loads(key)[0] in gauges:
+                    continue
+                totals[key] = totals.get(key, 0.0) + value
+        return totals
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, registry: "MetricsRegistry", name: str, documentation: str, labelnames: Sequence[str]) -> None:
+        self._registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *labelvalues) -> object:
+        values = tuple(map(str, labelvalues))
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} espera os labels {self.labelnames}")
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self._child(values)
+        return child
+
+    @abstractmethod
+    def _child(self, labelvalues: tuple) -> object:
+        """Cria o filho (valor) de uma combinação de labels."""
+
+
+class _CounterChild:
+    def __init__(self, registry: "MetricsRegistry", key: str) -> None:
+        self._registry = registry
+        self._key = key
+
+    def inc(self, amount: float = 1.0) -> None:
+        if amount < 0:
+            raise ValueError("Contadores só aumentam")
+        self._registry._values().add(self._key, amount)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _child(self, labelvalues: tuple) -> _CounterChild:
+        return _CounterChild(self._registry, _sample_key(self.name, labelvalues))
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+
+class _GaugeChild:
+    def __init__(self, registry: "MetricsRegistry", key: str) -> None:
+        self._registry = registry
+        self._key = key
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._registry._values().add(self._key, amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._registry._values().add(self._key, -amount)
+
+    def set(self, value: float) -> None:
+        self._registry._values().set(self._key, value)
+
+    def track_inprogress(self) -> "_InProgress":
+        return _InProgress(self)
+
+
+class _InProgress:
+    def __init__(self, gauge: _GaugeChild) -> None:
+        self._gauge = gauge
+
+    def __enter__(self) -> None:
+        self._gauge.inc()
+
+    def __exit__(self, *exc_info) -> None:
+        self._gauge.dec()
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _child(self, labelvalues: tuple) -> _GaugeChild:
+        return _GaugeChild(self._registry, _sample_key(self.name, labelvalues))
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+
+class _HistogramChild:
+    def __init__(self, registry: "MetricsRegistry", metric: "Histogram", labelvalues: tuple) -> None:
+        self._registry = registry
+        self._bounds = metric.buckets
+        # Um valor por faixa (não cumulativo); a coleta acumula.
+        self._bucket_keys = [_sample_key(metric.name, labelvalues, _format_bound(bound)) for bound in metric.buckets]
+        self._bucket_keys.append(_sample_key(metric.name, labelvalues, "+Inf"))
+        self._sum_key = _sample_key(metric.name, labelvalues, "sum")
+        self._count_key = _sample_key(metric.name, labelvalues, "count")
+
+    def observe(self, value: float) -> None:
+        self._registry._values().add_many((
+            (self._bucket_keys[bisect_left(self._bounds, value)], 1.0),
+            (self._sum_key, value),
+            (self._count_key, 1.0),
+        ))
+
+    def time(self) -> "_Timer":
+        return _Timer(self)
+
+
+class _Timer:
+    def __init__(self, histogram: _HistogramChild) -> None:
+        self._histogram = histogram
+
+    def __enter__(self) -> None:
+        self._start = time.perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        self._histogram.observe(time.perf_counter() - self._start)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        registry: "MetricsRegistry",
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str],
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(float(bound) for bound in buckets if not math.isinf(bound)))
+
+    def _child(self, labelvalues: tuple) -> _HistogramChild:
+        return _HistogramChild(self._registry, self, labelvalues)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+
+class MetricsRegistry:
+    """Conjunto de métricas de um app e a sua exposição em texto."""
+
+    def __init__(self, directory: Optional[str] = None) -> None:
+        self.directory = directory
+        self._metrics: dict[str, _Metric] = {}
+        self._gauges: frozenset = frozenset()
+        self._store: Optional[object] = None
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        metric = self._register(Gauge(self, name, documentation, labelnames))
+        self._gauges = self._gauges | {name}
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(self, name, documentation, labelnames, buckets))
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Métrica {metric.name} já registrada")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def _values(self):
+        store = self._store
+        if store is not None and store.pid == os.getpid():
+            return store
+        with self._lock:
+            if self._store is None or self._store.pid != os.getpid():
+                # Após o fork os valores do processo pai ficam no arquivo dele.
+                self._store = (
+                    _MmapValues(self.directory, self._gauges) if self.directory else _LocalValues()
+                )
+            return self._store
+
+    def collect(self) -> dict[str, float]:
+        """Valores somados de todos os processos, por chave."""
+        if self.directory:
+            return _MmapValues.collect_directory(self.directory, self._gauges)
+        return self._values().collect(self._gauges)
+
+    def render(self) -> str:
+        """Exposição no formato texto 0.0.4 do Prometheus."""
+        samples: dict[str, dict[tuple, dict[str, float]]] = {}
+        for key, value in self.collect().items():
+            name, labelvalues, field = json.loads(key)
+            samples.setdefault(name, {}).setdefault(tuple(labelvalues), {})[field] = value
+
+        lines = []
+        for name, metric in self._metrics.items():
+            lines.append(f"# HELP {name} {_escape_help(metric.documentation)}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for labelvalues, fields in sorted(samples.get(name, {}).items()):
+                if len(labelvalues) != len(metric.labelnames):
+                    continue
+                labels = list(zip(metric.labelnames, labelvalues))
+                if metric.kind != "histogram":
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(fields.get('', 0.0))}")
+                    continue
+                cumulative = 0.0
+                for bound in [_format_bound(bound) for bound in metric.buckets] + ["+Inf"]:
+                    cumulative += fields.get(bound, 0.0)
+                    lines.append(f"{name}_bucket{_format_labels(labels + [('le', bound)])} {_format_value(cumulative)}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(fields.get('sum', 0.0))}")
+                lines.append(f"{name}_count{_format_labels(labels)} {_format_value(fields.get('count', 0.0))}")
+        return "\n".join(lines) + "\n"
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> float:
+    """Percentil por posição mais próxima de uma amostra já ordenada (0.0 se vazia).
+
+    Usado nas latências de /health (pool do banco, servidor de impressão,
+    filas por impressora) e pelo benchmark.
+    """
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if math.isinf(bound) else repr(float(bound))
+
+
+def _format_value(value: float) -> str:
+    if math.isfinite(value) and value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: list) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in labels) + "}"
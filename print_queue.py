@@ -0,0 +1,523 @@
+"""Fila de impressão assíncrona com IDs de job e spool durável.
+
+A requisição enfileira o serial e volta na hora com um ID; threads de
+despacho do próprio processo enviam os jobs ao servidor de impressão. O estado
+de cada job fica em SQLite (modo WAL), compartilhado pelos workers do gunicorn:
+o polling ou o SSE de um job pode cair em qualquer worker.
+
+A fila em memória é limitada: com `maxsize` jobs aguardando, `submit` levanta
+`QueueFullError` e o endpoint responde 503 (backpressure) em vez de acumular
+threads presas.
+
+Spool: quando o servidor de impressão está fora do ar (falha que pode ser
+repetida sem risco de etiqueta duplicada), o job fica no SQLite com status
+`spooled`. Uma thread de reenvio por processo pega sempre o job mais antigo
+(um por vez em todos os workers, via `BEGIN IMMEDIATE` + lease), com backoff
+exponencial. Enquanto houver spool, jobs novos entram atrás dele para manter a
+ordem. Como tudo está no arquivo, o spool sobrevive a reinícios do container.
+
+Jobs `queued`/`printing` da fila em memória levam o dono (processo) que os
+aceitou, e cada processo renova um heartbeat no SQLite. Quando o dono para de
+bater (container reiniciado, worker morto), na partida de qualquer processo e
+periodicamente depois dela, os `queued` voltam para o spool na ordem de
+criação. Os `printing` (e os reenvios cujo lease venceu, que o processo renova
+enquanto envia) podem já ter chegado à impressora: viram `error` pedindo
+conferência, nunca reenvio automático.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Optional
+
+log = logging.getLogger(__name__)
+
+STATUS_QUEUED = "queued"
+STATUS_PRINTING = "printing"
+STATUS_SPOOLED = "spooled"
+STATUS_DONE = "done"
+STATUS_ERROR = "error"
+FINAL_STATUSES = (STATUS_DONE, STATUS_ERROR)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS print_jobs (
+    id TEXT PRIMARY KEY,
+    serial TEXT NOT NULL,
+    status TEXT NOT NULL,
+    message TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL,
+    lease_until REAL,
+    owner TEXT
+)
+"""
+
+# Heartbeat dos processos donos de jobs da fila em memória
+_OWNERS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS print_queue_owners (
+    owner TEXT PRIMARY KEY,
+    seen REAL NOT NULL
+)
+"""
+
+# Colunas do spool acrescentadas a bancos criados antes dele
+_SPOOL_COLUMNS = {
+    "attempts": "INTEGER NOT NULL DEFAULT 0",
+    "next_attempt": "REAL",
+    "lease_until": "REAL",
+    "owner": "TEXT",
+}
+
+_JOB_COLUMNS = "id, serial, status, message, created, updated, attempts, next_attempt"
+
+# Pendentes do spool: aguardando reenvio ou com reenvio em andamento
+_SPOOL_PENDING = f"(status = '{STATUS_SPOOLED}' OR (status = '{STATUS_PRINTING}' AND lease_until IS NOT NULL))"
+# Jobs da fila em memória (sem lease do spool): aguardando ou em envio por um processo
+_IN_MEMORY = f"(status IN ('{STATUS_QUEUED}', '{STATUS_PRINTING}') AND lease_until IS NULL)"
+
+# Envio interrompido no meio: a etiqueta pode ter saído, então não há reenvio
+INTERRUPTED_MESSAGE = "Envio interrompido: verificar impressão antes de reimprimir"
+
+
+class QueueFullError(RuntimeError):
+    """Fila de impressão cheia; o cliente deve tentar novamente mais tarde."""
+
+
+class JobStore:
+    """Estado dos jobs em SQLite, uma conexão por thread."""
+
+    def __init__(self, path: str, retention: float = 86400.0) -> None:
+        self.path = path
+        self.retention = retention
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute(_SCHEMA)
+        existing = {row["name"] for row in conn.execute("PRAGMA table_info(print_jobs)")}
+        for column, definition in _SPOOL_COLUMNS.items():
+            if column not in existing:
+                conn.execute(f"ALTER TABLE print_jobs ADD COLUMN {column} {definition}")
+        conn.execute("CREATE INDEX IF NOT EXISTS print_jobs_updated ON print_jobs (updated)")
+        conn.execute("CREATE INDEX IF NOT EXISTS print_jobs_lease ON print_jobs (lease_until) WHERE lease_until IS NOT NULL")
+        # Índice parcial só com o spool: a cabeça da fila sai direto dele, mesmo
+        # com milhares de jobs finalizados na tabela
+        conn.execute(f"CREATE INDEX IF NOT EXISTS print_jobs_spool ON print_jobs (created) WHERE {_SPOOL_PENDING}")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS print_jobs_in_memory ON print_jobs (owner) WHERE {_IN_MEMORY}")
+        conn.execute(_OWNERS_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def create(
+        self,
+        job_id: str,
+        serial: str,
+        status: str = STATUS_QUEUED,
+        message: Optional[str] = None,
+        owner: Optional[str] = None,
+    ) -> dict:
+        now = time.time()
+        self._connect().execute(
+            "INSERT INTO print_jobs (id, serial, status, message, created, updated, owner) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job_id, serial, status, message, now, now, owner),
+        )
+        return {"id": job_id, "serial": serial, "status": status, "message": message,
+                "created": now, "updated": now, "attempts": 0, "next_attempt": None}
+
+    def update(self, job_id: str, status: str, message: Optional[str] = None) -> None:
+        self._connect().execute(
+            "UPDATE print_jobs SET status = ?, message = ?, updated = ?, lease_until = NULL WHERE id = ?",
+            (status, message, time.time(), job_id),
+        )
+
+    def get(self, job_id: str) -> Optional[dict]:
+        row = self._connect().execute(
+            f"SELECT {_JOB_COLUMNS} FROM print_jobs WHERE id = ?",
+            (job_id,),
+        ).fetchone()
+        return dict(row) if row is not None else None
+
+    # ----------------------------------------------------------------- spool
+    def spool(self, job_id: str, message: Optional[str], attempts: int, next_attempt: Optional[float]) -> None:
+        """Coloca (ou devolve) o job no spool para reenvio."""
+        self._connect().execute(
+            "UPDATE print_jobs SET status = ?, message = ?, updated = ?, attempts = ?, "
+            "next_attempt = ?, lease_until = NULL WHERE id = ?",
+            (STATUS_SPOOLED, message, time.time(), attempts, next_attempt, job_id),
+        )
+
+    def has_spooled(self) -> bool:
+        return self._connect().execute(f"SELECT 1 FROM print_jobs WHERE {_SPOOL_PENDING} LIMIT 1").fetchone() is not None
+
+    def claim_spooled(self, lease: float) -> tuple[Optional[dict], Optional[float]]:
+        """Reserva o job mais antigo do spool, se nenhum outro reenvio estiver em andamento.
+
+        Retorna (job, None) ou (None, segundos até o próximo reenvio possível).
+        Lease vencido (o processo morreu no meio do envio, já que o lease é
+        renovado enquanto ele envia) vira erro: a etiqueta pode ter saído.
+        """
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            expired = conn.execute(
+                "UPDATE print_jobs SET status = ?, message = ?, updated = ?, lease_until = NULL "
+                "WHERE status = ? AND lease_until IS NOT NULL AND lease_until <= ?",
+                (STATUS_ERROR, INTERRUPTED_MESSAGE, now, STATUS_PRINTING, now),
+            ).rowcount
+            if expired:
+                log.warning("[SPOOL] %s reenvio(s) com lease vencido marcados como erro", expired)
+            busy = conn.execute(
+                "SELECT lease_until FROM print_jobs WHERE lease_until IS NOT NULL AND lease_until > ? AND status = ? LIMIT 1",
+                (now, STATUS_PRINTING),
+            ).fetchone()
+            if busy is not None:
+                conn.execute("COMMIT")
+                return None, busy["lease_until"] - now
+
+            row = conn.execute(
+                f"SELECT {_JOB_COLUMNS} FROM print_jobs WHERE {_SPOOL_PENDING} ORDER BY created, rowid LIMIT 1"
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None, None
+            if row["next_attempt"] is not None and row["next_attempt"] > now:
+                conn.execute("COMMIT")
+                return None, row["next_attempt"] - now
+
+            conn.execute(
+                "UPDATE print_jobs SET status = ?, lease_until = ?, updated = ? WHERE id = ?",
+                (STATUS_PRINTING, now + lease, now, row["id"]),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        job = dict(row)
+        job["status"] = STATUS_PRINTING
+        return job, None
+
+    def renew_lease(self, job_id: str, lease: float) -> None:
+        """Estende o lease do reenvio em andamento (envio lento não é tomado como morto)."""
+        self._connect().execute(
+            "UPDATE print_jobs SET lease_until = ? WHERE id = ? AND status = ? AND lease_until IS NOT NULL",
+            (time.time() + lease, job_id, STATUS_PRINTING),
+        )
+
+    def release_backoff(self) -> None:
+        """Servidor voltou: o restante do spool pode sair sem esperar o backoff."""
+        self._connect().execute(
+            f"UPDATE print_jobs SET next_attempt = NULL WHERE {_SPOOL_PENDING} AND next_attempt IS NOT NULL"
+        )
+
+    def spool_stats(self) -> dict:
+        conn = self._connect()
+        pending = conn.execute(
+            f"SELECT COUNT(*) FROM print_jobs INDEXED BY print_jobs_spool WHERE {_SPOOL_PENDING}"
+        ).fetchone()[0]
+        head = conn.execute(
+            f"SELECT id, serial, created, attempts, next_attempt, message FROM print_jobs "
+            f"WHERE {_SPOOL_PENDING} ORDER BY created, rowid LIMIT 1"
+        ).fetchone()
+        return {"pending": pending, "oldest": dict(head) if head is not None else None}
+
+    # ---------------------------------------------------------------- órfãos
+    def heartbeat(self, owner: str) -> None:
+        """Marca o processo dono como vivo."""
+        self._connect().execute(
+            "INSERT OR REPLACE INTO print_queue_owners (owner, seen) VALUES (?, ?)",
+            (owner, time.time()),
+        )
+
+    def recover_orphans(self, stale: float, spool: bool = True) -> tuple[int, int]:
+        """Trata os jobs da fila em memória cujo dono parou de bater.
+
+        `stale`: segundos sem heartbeat para considerar o dono morto. Os
+        `queued` nunca foram enviados e voltam ao spool (sem spool viram erro,
+        para o cliente não esperar para sempre). Os `printing` podem ter saído
+        e viram erro pedindo conferência. Retorna (recuperados, interrompidos).
+        """
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM print_queue_owners WHERE seen < ?", (now - stale,))
+            orphans = (
+                f"{_IN_MEMORY} AND (owner IS NULL OR owner NOT IN (SELECT owner FROM print_queue_owners))"
+            )
+            interrupted = conn.execute(
+                f"UPDATE print_jobs SET status = ?, message = ?, updated = ?, owner = NULL "
+                f"WHERE {orphans} AND status = ?",
+                (STATUS_ERROR, INTERRUPTED_MESSAGE, now, STATUS_PRINTING),
+            ).rowcount
+            if spool:
+                recovered = conn.execute(
+                    f"UPDATE print_jobs SET status = ?, message = ?, updated = ?, next_attempt = NULL, "
+                    f"owner = NULL WHERE {orphans}",
+                    (STATUS_SPOOLED, "Recuperado após reinício: aguardando reenvio", now),
+                ).rowcount
+            else:
+                recovered = 0
+                interrupted += conn.execute(
+                    f"UPDATE print_jobs SET status = ?, message = ?, updated = ?, owner = NULL WHERE {orphans}",
+                    (STATUS_ERROR, "Interrompido por reinício do serviço", now),
+                ).rowcount
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return recovered, interrupted
+
+    def purge(self) -> int:
+        """Remove jobs finalizados há mais de `retention` segundos."""
+        cursor = self._connect().execute(
+            "DELETE FROM print_jobs WHERE status IN (?, ?) AND updated < ?",
+            (*FINAL_STATUSES, time.time() - self.retention),
+        )
+        return cursor.rowcount
+
+
+class PrintJobQueue:
+    """Fila limitada + threads de despacho e de reenvio, criadas em cada processo.
+
+    `send(serial)` retorna (sucesso, mensagem, pode_repetir). `pode_repetir`
+    indica falha sem risco de duplicar a etiqueta (ex.: servidor fora do ar);
+    com o spool ativo esses jobs ficam no SQLite e são reenviados com backoff
+    exponencial (`backoff` * 2^(tentativas-1), até `backoff_max` segundos).
+    """
+
+    def __init__(
+        self,
+        send: Callable[[str], tuple[bool, str, bool]],
+        store: JobStore,
+        maxsize: int = 100,
+        workers: int = 2,
+        spool: bool = True,
+        backoff: float = 2.0,
+        backoff_max: float = 300.0,
+        lease: float = 60.0,
+        poll: float = 1.0,
+    ) -> None:
+        self.send = send
+        self.store = store
+        self.maxsize = maxsize
+        self.workers = workers
+        self.spool_enabled = spool
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.lease = lease
+        self.poll = poll
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._owner: Optional[str] = None
+        # Job do spool sendo reenviado por este processo (lease renovado no heartbeat)
+        self._replaying: Optional[str] = None
+        self._queue: "queue.Queue[tuple[str, str]]" = queue.Queue(maxsize=maxsize)
+        self._submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self.spooled = 0
+        self.replayed = 0
+        self.recovered = 0
+        self.interrupted = 0
+        self.in_flight = 0
+
+    def start(self) -> None:
+        """Inicia as threads deste processo (idempotente, refeito após fork)."""
+        self._ensure_started()
+
+    def submit(self, serial: str) -> dict:
+        self._ensure_started()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            # Reserva a vaga antes de gravar, para não registrar job que não cabe.
+            if self._queue.qsize() >= self.maxsize:
+                self.rejected += 1
+                raise QueueFullError(f"Fila de impressão cheia ({self.maxsize} jobs aguardando)")
+            job = self.store.create(job_id, serial, owner=self._owner)
+            self._queue.put_nowait((job_id, serial))
+            self._submitted += 1
+            purge = self._submitted % 100 == 0
+        if purge:
+            self.store.purge()
+        return job
+
+    def spool_serial(self, serial: str, message: Optional[str] = None) -> dict:
+        """Grava direto no spool (impressão síncrona que não pôde sair agora)."""
+        self._ensure_started()
+        job = self.store.create(uuid.uuid4().hex, serial, status=STATUS_SPOOLED, message=message)
+        with self._lock:
+            self.spooled += 1
+        return job
+
+    def has_spooled(self) -> bool:
+        return self.spool_enabled and self.store.has_spooled()
+
+    def get(self, job_id: str) -> Optional[dict]:
+        return self.store.get(job_id)
+
+    def stats(self) -> dict:
+        stats = {
+            "pid": os.getpid(),
+            "queued": self._queue.qsize(),
+            "maxsize": self.maxsize,
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "spooled": self.spooled,
+            "replayed": self.replayed,
+            "recovered": self.recovered,
+            "interrupted": self.interrupted,
+        }
+        if self.spool_enabled:
+            stats["spool"] = self.store.spool_stats()
+        return stats
+
+    def retry_delay(self, attempts: int) -> float:
+        return min(self.backoff_max, self.backoff * (2 ** max(0, attempts - 1)))
+
+    def _ensure_started(self) -> None:
+        # Threads não sobrevivem ao fork do gunicorn: cada worker inicia as suas.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.maxsize)
+            # Dono novo por processo; jobs de processos que não batem mais
+            # (reinício do container) voltam ao spool antes dos novos
+            self._owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+            self.store.heartbeat(self._owner)
+            self._recover()
+            threading.Thread(target=self._keepalive, name="print-queue-owner", daemon=True).start()
+            for index in range(self.workers):
+                threading.Thread(target=self._run, name=f"print-queue-{index}", daemon=True).start()
+            if self.spool_enabled:
+                threading.Thread(target=self._replay, name="print-spool", daemon=True).start()
+            self._pid = os.getpid()
+
+    def _recover(self) -> None:
+        # Só a partida (com self._lock) e depois a thread de heartbeat chamam:
+        # os contadores não são disputados
+        try:
+            recovered, interrupted = self.store.recover_orphans(self.lease, self.spool_enabled)
+        except sqlite3.Error as e:
+            log.error("[FILA] Erro ao recuperar jobs órfãos: %s", e)
+            return
+        if recovered:
+            self.recovered += recovered
+            log.warning("[FILA] %s job(s) de processo encerrado voltaram ao spool", recovered)
+        if interrupted:
+            self.interrupted += interrupted
+            log.warning("[FILA] %s job(s) de processo encerrado marcados como erro (%s)",
+                        interrupted, INTERRUPTED_MESSAGE)
+
+    def _keepalive(self) -> None:
+        # Heartbeat bem abaixo de `lease`; a recuperação cobre workers mortos
+        # depois da partida (timeout do gunicorn, OOM)
+        interval = max(0.5, self.lease / 6)
+        owner = self._owner
+        while True:
+            time.sleep(interval)
+            try:
+                self.store.heartbeat(owner)
+                replaying = self._replaying
+                if replaying is not None:
+                    self.store.renew_lease(replaying, self.lease)
+            except sqlite3.Error as e:
+                log.error("[FILA] Erro no heartbeat: %s", e)
+                continue
+            self._recover()
+
+    def _deliver(self, serial: str) -> tuple[bool, str, bool]:
+        try:
+            return self.send(serial)
+        except Exception as e:
+            return False, f"Erro ao executar impressão: {e}", False
+
+    def _run(self) -> None:
+        jobs = self._queue
+        while True:
+            job_id, serial = jobs.get()
+            with self._lock:
+                self.in_flight += 1
+            try:
+                # Com spool pendente, o job entra atrás dele para manter a ordem.
+                if self.has_spooled():
+                    self.store.spool(job_id, "Aguardando etiquetas anteriores do spool", 0, None)
+                    with self._lock:
+                        self.spooled += 1
+                    continue
+
+                self.store.update(job_id, STATUS_PRINTING)
+                success, message, retryable = self._deliver(serial)
+                if not success and retryable and self.spool_enabled:
+                    self.store.spool(job_id, message, 1, time.time() + self.retry_delay(1))
+                    with self._lock:
+                        self.spooled += 1
+                    continue
+
+                self.store.update(job_id, STATUS_DONE if success else STATUS_ERROR, message)
+                with self._lock:
+                    if success:
+                        self.completed += 1
+                    else:
+                        self.failed += 1
+            except Exception as e:
+                log.error("[FILA] Erro ao atualizar job %s: %s", job_id, e)
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+
+    def _replay(self) -> None:
+        while True:
+            try:
+                job, wait = self.store.claim_spooled(self.lease)
+            except sqlite3.Error as e:
+                log.error("[SPOOL] Erro ao consultar spool: %s", e)
+                job, wait = None, None
+            if job is None:
+                time.sleep(min(self.poll, wait) if wait is not None else self.poll)
+                continue
+
+            attempts = job["attempts"] + 1
+            self._replaying = job["id"]
+            try:
+                success, message, retryable = self._deliver(job["serial"])
+            finally:
+                self._replaying = None
+            try:
+                if success:
+                    self.store.update(job["id"], STATUS_DONE, message)
+                    self.store.release_backoff()
+                    with self._lock:
+                        self.replayed += 1
+                        self.completed += 1
+                    log.info("[SPOOL] Reenviado %s (tentativa %s)", job['serial'], attempts)
+                elif retryable:
+                    delay = self.retry_delay(attempts)
+                    self.store.spool(job["id"], message, attempts, time.time() + delay)
+                    log.info("[SPOOL] %s: %s - nova tentativa em %.0fs", job['serial'], message, delay)
+                else:
+                    self.store.update(job["id"], STATUS_ERROR, message)
+                    with self._lock:
+                        self.failed += 1
+            except sqlite3.Error as e:
+                log.error("[SPOOL] Erro ao atualizar job %s: %s", job['id'], e)
@@ -1,93 +1,268 @@
 """Servidor de impressão com suporte a Calibri
 Recebe serial number e gera imagem com Calibri Bold antes de imprimir
 """
-from flask import Flask, request, jsonify
-from PIL import Image, ImageDraw, ImageFont
-import subprocess
-from pathlib import Path
+from flask import Flask, Response, request, jsonify, g
+from PIL import Image
+import os
+import logging
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from fonts import CALIBRI_BOLD, get_font, registry as font_registry
+from glyph_atlas import get_atlas, render_text
+from json_logging import logging_stats, new_request_id, request_id_var, setup_logging
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsRegistry
+from send_to_printer import PrintJob, PrintJobError, PrintStatusUnknownError, print_session_stats, process_print_job
+from ttl_cache import TTLCache
+from zpl_graphics import GFA_ENCODINGS, crop_to_ink, gfa_ratio, gfa_size, image_to_gfa
 
 app = Flask(__name__)
 
-def text_to_zpl_image(text, font_path=r"C:\Windows\Fonts\calibrib.ttf", font_size=29):
+# Logs estruturados com o mesmo X-Request-ID enviado pelo app principal
+setup_logging()
+log = logging.getLogger('print_server')
+
+# Métricas Prometheus (/metrics): um processo só, valores em memória
+metrics = MetricsRegistry(os.getenv('METRICS_DIR') or None)
+http_request_seconds = metrics.histogram(
+    'print_server_http_request_seconds', 'Duração das requisições HTTP', ['endpoint', 'method', 'status']
+)
+http_requests_in_flight = metrics.gauge(
+    'print_server_http_requests_in_flight', 'Requisições HTTP em andamento', ['endpoint']
+)
+stage_seconds = metrics.histogram(
+    'print_server_stage_seconds', 'Duração de cada etapa: render (Calibri) e spool (spooler do Windows)', ['stage']
+)
+stage_in_flight = metrics.gauge('print_server_stage_in_flight', 'Etapas em andamento', ['stage'])
+label_cache_lookups = metrics.counter(
+    'print_server_label_cache_total', 'Consultas ao cache de ZPL por resultado', ['result']
+)
+labels_spooled = metrics.counter(
+    'print_server_labels_total', 'Etiquetas enviadas à spooler por fonte (calibri ou zpl pronto)', ['font']
+)
+gfa_bytes = metrics.counter(
+    'print_server_gfa_bytes_total', 'Bytes dos ^GFA renderizados: hex equivalente (raw) e enviado (encoded)', ['kind']
+)
+errors_total = metrics.counter('print_server_errors_total', 'Erros por etapa e tipo', ['stage', 'type'])
+
+@contextmanager
+def observe_stage(stage):
+    with stage_in_flight.labels(stage).track_inprogress(), stage_seconds.labels(stage).time():
+        yield
+
+def count_error(stage, error):
+    errors_total.labels(stage, error if isinstance(error, str) else type(error).__name__).inc()
+
+DEFAULT_FONT = CALIBRI_BOLD
+DEFAULT_FONT_SIZE = 29
+
+# Cache do ZPL final por (serial, fonte, tamanho, espelhamento): reimpressões
+# após atolamento não passam pelo Pillow. LABEL_CACHE_ENABLED=0 desativa.
+LABEL_CACHE_ENABLED = os.getenv('LABEL_CACHE_ENABLED', '1').strip().lower() not in ('0', 'false', 'no', 'off')
+LABEL_CACHE_SIZE = int(os.getenv('LABEL_CACHE_SIZE', '256'))
+LABEL_CACHE_MAX_BYTES = int(os.getenv('LABEL_CACHE_MAX_BYTES', str(4 * 1024 * 1024)))
+
+# Atlas de glifos para renderizar seriais (GLYPH_ATLAS=0 volta ao FreeType puro)
+GLYPH_ATLAS_ENABLED = os.getenv('GLYPH_ATLAS', '1').strip().lower() not in ('0', 'false', 'no', 'off')
+
+# Codificação do bitmap no ^GFA: acs (compressão ASCII do ZPL, padrão),
+# z64 (deflate + base64, firmware x.14 ou mais novo) ou hex (sem compressão)
+GFA_ENCODING = os.getenv('GFA_ENCODING', 'acs').strip().lower()
+if GFA_ENCODING not in GFA_ENCODINGS:
+    log.warning("GFA_ENCODING=%s desconhecido, usando hex", GFA_ENCODING)
+    GFA_ENCODING = 'hex'
+
+# Margem fixa (dots) do bitmap antes do recorte na tinta: mantém a altura da
+# tinta na etiqueta e é a referência da redução de payload nos logs/métricas
+LABEL_PADDING = 10
+
+# Impressão em lote: máximo de seriais por requisição e threads de renderização
+PRINT_BATCH_LIMIT = int(os.getenv('PRINT_BATCH_LIMIT', '200'))
+RENDER_WORKERS = int(os.getenv('RENDER_WORKERS') or min(4, os.cpu_count() or 1))
+
+label_cache = (
+    TTLCache(maxsize=LABEL_CACHE_SIZE, max_bytes=LABEL_CACHE_MAX_BYTES, sizeof=len)
+    if LABEL_CACHE_ENABLED else None
+)
+
+def text_to_zpl_image(text, font_path=DEFAULT_FONT, font_size=DEFAULT_FONT_SIZE, mirror=True):
     """Converte texto com fonte Calibri em imagem ZPL (espelhado horizontalmente)"""
     try:
-        print(f"[DEBUG] Texto original: {text}", flush=True)
-        
-        # Criar fonte
-        font = ImageFont.truetype(font_path, font_size)
-        
-        # Calcular tamanho do texto
-        bbox = font.getbbox(text)
-        text_width = bbox[2] - bbox[0]
-        text_height = bbox[3] - bbox[1]
-        
-        # Adicionar padding
-        padding = 10
-        img_width = text_width + (padding * 2)
-        img_height = text_height + (padding * 2)
-        
-        # Criar imagem em branco (1 bit - preto e branco)
-        image = Image.new('1', (img_width, img_height), 1)  # 1 = branco
-        draw = ImageDraw.Draw(image)
-        
-        # Desenhar texto normal
-        x = padding
-        y = padding - bbox[1]  # Ajustar baseline
-        draw.text((x, y), text, font=font, fill=0)  # 0 = preto
-        
-        # Espelhar horizontalmente
-        image = image.transpose(Image.FLIP_LEFT_RIGHT)
-        
-        print(f"[DEBUG] Texto desenhado e espelhado: {text}", flush=True)
-        
-        # Converter para bytes ZPL
-        bytes_per_row = (img_width + 7) // 8
-        total_bytes = bytes_per_row * img_height
-        
-        # Converter imagem para hex
-        hex_data = []
-        for y in range(img_height):
-            row_bytes = []
-            for x in range(0, img_width, 8):
-                byte_val = 0
-                for bit in range(8):
-                    if x + bit < img_width:
-                        pixel = image.getpixel((x + bit, y))
-                        if pixel == 0:  # Preto
-                            byte_val |= (1 << (7 - bit))
-                row_bytes.append(f"{byte_val:02X}")
-            hex_data.append(''.join(row_bytes))
-        
-        hex_string = ''.join(hex_data)
-        
-        # Calcular posição para centralizar na etiqueta (360 dots de largura)
+        log.debug("Texto original: %s", text)
+        
+        # Fonte carregada uma vez por processo
+        font = get_font(font_path, font_size)
+        if font is None:
+            count_error('render', 'fonte_indisponivel')
+            return None
+        
+        with observe_stage('render'):
+            # Desenhar texto normal (1 bit, sem margem); o atlas de glifos
+            # monta o mesmo bitmap do FreeType sem rasterizar a string inteira
+            image = render_text(text, font, padding=0, use_atlas=GLYPH_ATLAS_ENABLED)
+            # Tamanho que o bitmap teria com a margem fixa de 10px de antes
+            padded_bytes = gfa_size(image.width + 2 * LABEL_PADDING, image.height + 2 * LABEL_PADDING)
+            
+            # Recortar na tinta: só linhas e colunas com pixel preto vão no ^GFA
+            image, ink_box = crop_to_ink(image)
+            img_width, img_height = image.size
+            
+            # Espelhar horizontalmente
+            if mirror:
+                image = image.transpose(Image.FLIP_LEFT_RIGHT)
+            
+            log.debug("Texto desenhado%s: %s", ' e espelhado' if mirror else '', text)
+            
+            # Converter para bytes ZPL (^GFA, bytes por linha arredondados para múltiplo de 8)
+            gfa_data, total_bytes, bytes_per_row = image_to_gfa(image, GFA_ENCODING)
+            gfa_bytes.labels('raw').inc(total_bytes * 2)
+            gfa_bytes.labels('encoded').inc(len(gfa_data))
+            gfa_bytes.labels('padded').inc(padded_bytes * 2)
+        
+        # Centralizar a tinta na etiqueta (360 dots de largura); na vertical a
+        # tinta fica onde ficava com a margem (topo em 15 + margem)
         x_pos = (360 - img_width) // 2
-        y_pos = 15
+        y_pos = 15 + LABEL_PADDING + (ink_box[1] if ink_box else 0)
         
         # Criar comando ZPL com espelhamento horizontal
         zpl = (
             f"^XA"
             f"^PMY"
             f"^FO{x_pos},{y_pos}"
-            f"^GFA,{total_bytes},{total_bytes},{bytes_per_row},{hex_string}"
+            f"^GFA,{total_bytes},{total_bytes},{bytes_per_row},{gfa_data}"
             f"^FS"
             f"^PQ1,0,1,Y"
             f"^XZ"
         )
         
-        print(f"[DEBUG] Imagem gerada: {img_width}x{img_height} pixels")
-        print(f"[DEBUG] Posição: X={x_pos}, Y={y_pos}")
+        # A redução e a razão do ^GFA custam contas por etiqueta: só em DEBUG
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Imagem gerada: %sx%s pixels (tinta)", img_width, img_height)
+            log.debug(
+                "Bitmap: %s bytes, %s com margem (%.0f%% menor)",
+                total_bytes, padded_bytes, 100 * (1 - total_bytes / padded_bytes),
+            )
+            log.debug("^GFA %s: %s caracteres (%.1fx menor que hex)", GFA_ENCODING, len(gfa_data), gfa_ratio(total_bytes, gfa_data))
+            log.debug("Posição: X=%s, Y=%s", x_pos, y_pos)
         
         return zpl
         
     except Exception as e:
-        print(f"[DEBUG] Erro ao gerar imagem: {str(e)}")
+        log.error("Erro ao gerar imagem: %s", e)
+        count_error('render', e)
         return None
 
+def render_label(text, font_path=DEFAULT_FONT, font_size=DEFAULT_FONT_SIZE, mirror=True):
+    """Gera o ZPL da etiqueta, reaproveitando o cache quando habilitado.
+
+    Retorna (zpl, veio_do_cache).
+    """
+    key = (text, font_path, font_size, mirror)
+    if label_cache is not None:
+        zpl = label_cache.get(key)
+        if zpl is not None:
+            log.debug("ZPL do cache: %s", text)
+            label_cache_lookups.labels('hit').inc()
+            return zpl, True
+        label_cache_lookups.labels('miss').inc()
+    
+    zpl = text_to_zpl_image(text, font_path=font_path, font_size=font_size, mirror=mirror)
+    if zpl and label_cache is not None:
+        label_cache.set(key, zpl)
+    return zpl, False
+
+def spool_zpl(zpl, font='zpl'):
+    """Envia o ZPL para a spooler no próprio processo (sem subprocess por etiqueta).
+
+    Retorna (impressora, erro, desconhecido). Falhas da impressora ou do
+    pywin32 viram mensagem de erro da requisição e não derrubam o servidor.
+    `desconhecido` indica que o job pode ter saído (tempo esgotado já no
+    envio): a resposta leva "status": "unknown" e o app não repete.
+    """
+    try:
+        with observe_stage('spool'):
+            printer = process_print_job(PrintJob(text=zpl))
+    except PrintStatusUnknownError as e:
+        count_error('spool', e)
+        return None, str(e), True
+    except PrintJobError as e:
+        count_error('spool', e)
+        return None, str(e), False
+    except Exception as e:
+        count_error('spool', e)
+        return None, f"{type(e).__name__}: {e}", False
+    labels_spooled.labels(font).inc(zpl.count('^XA') or 1)
+    return printer, None, False
+
+# As threads só são criadas no primeiro lote
+_render_pool = ThreadPoolExecutor(max_workers=max(1, RENDER_WORKERS), thread_name_prefix='render')
+
+def render_labels(serials):
+    """Renderiza vários seriais em paralelo, na ordem recebida.
+
+    Retorna uma lista de (zpl, veio_do_cache); zpl é None se a renderização falhou.
+    """
+    if len(serials) == 1 or RENDER_WORKERS <= 1:
+        return [render_label(serial, font_size=DEFAULT_FONT_SIZE) for serial in serials]
+    return list(_render_pool.map(lambda serial: render_label(serial, font_size=DEFAULT_FONT_SIZE), serials))
+
+@app.before_request
+def bind_request_id():
+    g.request_id = new_request_id(request.headers.get('X-Request-ID'))
+    g.request_id_token = request_id_var.set(g.request_id)
+
+@app.after_request
+def add_request_id_header(response):
+    request_id = g.get('request_id')
+    if request_id:
+        response.headers['X-Request-ID'] = request_id
+    return response
+
+@app.teardown_request
+def unbind_request_id(exc=None):
+    token = g.pop('request_id_token', None)
+    if token is not None:
+        request_id_var.reset(token)
+
+@app.before_request
+def start_request_metrics():
+    g.metrics_endpoint = request.url_rule.rule if request.url_rule is not None else 'nao_encontrado'
+    g.metrics_start = time.perf_counter()
+    http_requests_in_flight.labels(g.metrics_endpoint).inc()
+
+@app.after_request
+def observe_request_metrics(response):
+    start = g.get('metrics_start')
+    if start is not None:
+        http_request_seconds.labels(g.metrics_endpoint, request.method, response.status_code).observe(
+            time.perf_counter() - start
+        )
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exc=None):
+    endpoint = g.pop('metrics_endpoint', None)
+    if endpoint is not None:
+        http_requests_in_flight.labels(endpoint).dec()
+    if exc is not None:
+        count_error('request', exc)
+
 @app.route('/health', methods=['GET'])
 def health():
     """Endpoint de health check"""
-    return jsonify({"status": "ok", "calibri": "enabled"})
+    return jsonify({
+        "status": "ok",
+        "calibri": "enabled" if get_font(DEFAULT_FONT, DEFAULT_FONT_SIZE) is not None else "unavailable",
+        "print_sessions": print_session_stats(),
+        "fonts": font_registry.stats(),
+        "label_cache": label_cache.stats() if label_cache is not None else {"enabled": False},
+        "logging": logging_stats()
+    })
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Métricas no formato do Prometheus"""
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
 
 @app.route('/print-calibri', methods=['POST'])
 def print_calibri():
@@ -99,40 +274,94 @@ def print_calibri():
         if not serial:
             return jsonify({"error": "Serial não informado"}), 400
         
-        print(f"[PRINT-CALIBRI] Recebido serial: {serial}")
+        log.info("[PRINT-CALIBRI] Recebido serial: %s", serial)
         
-        # Gerar ZPL com Calibri
-        zpl_command = text_to_zpl_image(serial, font_size=29)
+        # Gerar ZPL com Calibri (ou reaproveitar de uma impressão anterior)
+        zpl_command, cached = render_label(serial, font_size=DEFAULT_FONT_SIZE)
         
         if not zpl_command:
             return jsonify({"error": "Falha ao gerar imagem com Calibri"}), 500
         
-        print(f"[PRINT-CALIBRI] ZPL gerado: {len(zpl_command)} bytes")
-        
-        # Imprimir usando send_to_printer.py
-        script_dir = Path(__file__).parent.resolve()
-        send_to_printer = script_dir / 'send_to_printer.py'
-        cmd = ['python', str(send_to_printer), '--text', zpl_command]
-        print(f"[PRINT-CALIBRI] Executando: {' '.join(cmd[:2])}")
-        print(f"[PRINT-CALIBRI] Diretório: {script_dir}")
-        result = subprocess.run(cmd, capture_output=True, text=True, cwd=script_dir)
+        log.info("[PRINT-CALIBRI] ZPL %s: %s bytes", 'do cache' if cached else 'gerado', len(zpl_command))
         
-        print(f"[PRINT-CALIBRI] Return code: {result.returncode}")
-        print(f"[PRINT-CALIBRI] Stdout: {result.stdout}")
-        print(f"[PRINT-CALIBRI] Stderr: {result.stderr}")
+        # Enviar para a spooler no próprio processo
+        printer, error, unknown = spool_zpl(zpl_command, font='calibri')
         
-        if result.returncode == 0:
+        if error is None:
+            log.info("[PRINT-CALIBRI] Enviado para %s", printer)
             return jsonify({
                 "status": "ok",
-                "printer": "Zebra PU",
+                "printer": printer,
                 "font": "Calibri Bold",
-                "size": len(zpl_command)
+                "size": len(zpl_command),
+                "cached": cached
             })
         else:
-            return jsonify({"error": f"Erro na impressão: {result.stderr}"}), 500
+            log.error("[PRINT-CALIBRI] Erro na impressão: %s", error)
+            return jsonify({"error": f"Erro na impressão: {error}", "status": "unknown" if unknown else "error"}), 500
+            
+    except Exception as e:
+        log.error("[PRINT-CALIBRI] Erro: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/print-calibri-batch', methods=['POST'])
+def print_calibri_batch():
+    """Imprime vários seriais com Calibri em um único documento na spooler
+
+    Corpo: {"serials": [...]}. As etiquetas são renderizadas em paralelo e
+    enviadas como um só fluxo ZPL (vários ^XA...^XZ), na ordem recebida.
+    A resposta traz o resultado de cada serial, na mesma ordem.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        serials = data.get('serials')
+        
+        if not isinstance(serials, list) or not serials:
+            return jsonify({"error": "Lista de seriais não informada"}), 400
+        if len(serials) > PRINT_BATCH_LIMIT:
+            return jsonify({"error": f"Máximo de {PRINT_BATCH_LIMIT} seriais por lote"}), 400
+        if not all(isinstance(serial, str) and serial.strip() for serial in serials):
+            return jsonify({"error": "Seriais devem ser textos não vazios"}), 400
+        
+        serials = [serial.strip() for serial in serials]
+        log.info("[PRINT-CALIBRI-BATCH] Recebidos %s seriais", len(serials))
+        
+        rendered = render_labels(serials)
+        results = []
+        labels = []
+        for serial, (zpl, cached) in zip(serials, rendered):
+            if zpl:
+                labels.append(zpl)
+                results.append({"serial": serial, "status": "ok", "size": len(zpl), "cached": cached})
+            else:
+                results.append({"serial": serial, "status": "error", "error": "Falha ao gerar imagem com Calibri"})
+        
+        if not labels:
+            return jsonify({"error": "Falha ao gerar imagem com Calibri", "results": results}), 500
+        
+        # Um documento só: uma ida à spooler para o lote inteiro
+        stream = "".join(labels)
+        printer, error, unknown = spool_zpl(stream, font='calibri')
+        
+        if error is not None:
+            log.error("[PRINT-CALIBRI-BATCH] Erro na impressão: %s", error)
+            for result in results:
+                if result["status"] == "ok":
+                    result.update(status="unknown" if unknown else "error", error=f"Erro na impressão: {error}")
+            return jsonify({"error": f"Erro na impressão: {error}", "results": results}), 500
+        
+        log.info("[PRINT-CALIBRI-BATCH] %s etiquetas (%s bytes) enviadas para %s", len(labels), len(stream), printer)
+        return jsonify({
+            "status": "ok" if len(labels) == len(serials) else "partial",
+            "printer": printer,
+            "font": "Calibri Bold",
+            "printed": len(labels),
+            "size": len(stream),
+            "results": results
+        })
             
     except Exception as e:
-        print(f"[PRINT-CALIBRI] Erro: {str(e)}")
+        log.error("[PRINT-CALIBRI-BATCH] Erro: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @app.route('/print', methods=['POST'])
@@ -145,18 +374,14 @@ def print_zpl():
         if not zpl:
             return jsonify({"error": "ZPL não informado"}), 400
         
-        print(f"[PRINT] Recebido ZPL: {len(zpl)} bytes")
+        log.info("[PRINT] Recebido ZPL: %s bytes", len(zpl))
         
-        # Imprimir usando send_to_printer.py
-        script_dir = Path(__file__).parent.resolve()
-        send_to_printer = script_dir / 'send_to_printer.py'
-        cmd = ['python', str(send_to_printer), '--text', zpl]
-        result = subprocess.run(cmd, capture_output=True, text=True, cwd=script_dir)
+        printer, error, unknown = spool_zpl(zpl)
         
-        if result.returncode == 0:
-            return jsonify({"status": "ok", "printer": "Zebra PU"})
+        if error is None:
+            return jsonify({"status": "ok", "printer": printer})
         else:
-            return jsonify({"error": f"Erro na impressão: {result.stderr}"}), 500
+            return jsonify({"error": f"Erro na impressão: {error}", "status": "unknown" if unknown else "error"}), 500
             
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -168,9 +393,20 @@ if __name__ == '__main__':
     print()
     print("Endpoints disponíveis:")
     print("  GET  /health         - Health check")
+    print("  GET  /metrics        - Métricas (Prometheus)")
     print("  POST /print-calibri  - Imprimir com Calibri (envia serial)")
+    print("  POST /print-calibri-batch - Imprimir vários seriais em um documento")
     print("  POST /print          - Imprimir ZPL direto")
     print()
+    font_ms = font_registry.preload([(DEFAULT_FONT, DEFAULT_FONT_SIZE)])
+    font = get_font(DEFAULT_FONT, DEFAULT_FONT_SIZE)
+    if font is not None:
+        print(f"Fonte Calibri carregada em {font_ms:.1f}ms")
+        if GLYPH_ATLAS_ENABLED:
+            atlas = get_atlas(font)
+            print(f"Atlas de glifos: {'ativo' if atlas.enabled else 'desativado (diverge do FreeType)'}")
+    else:
+        print(f"AVISO: fonte {DEFAULT_FONT} indisponível, /print-calibri vai falhar")
     print("Iniciando servidor na porta 9021...")
     print()
     
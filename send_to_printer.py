@@ -5,6 +5,8 @@ Funcionalidades principais:
 - Substituição de um ou múltiplos marcadores dentro do template (via `--token` e
   `--var TOKEN=valor`).
 - Servidor HTTP simples (Flask) que expõe um endpoint POST /print para receber jobs remotos.
+- Arte estática dos templates (caixas ^GB e gráficos ^GFA fixos) vira gráfico
+  armazenado na impressora: vai uma vez por ~DG e as etiquetas só a chamam com ^XG.
 
 O formato JSON esperado pelo endpoint é:
 {
@@ -18,16 +20,26 @@ O formato JSON esperado pelo endpoint é:
 from __future__ import annotations
 
 import argparse
+import hashlib
 import json
 import locale
+import logging
 import os
+import queue
+import re
+import select
+import struct
 import subprocess
 import sys
 import tempfile
 import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional, TYPE_CHECKING
+from typing import Callable, Optional, TYPE_CHECKING
 
 if TYPE_CHECKING:
     from flask import Flask, Response
@@ -42,7 +54,33 @@ ZPL_TEST_PAYLOAD = """^XA
 """
 
 BASE_DIR = Path(__file__).resolve().parent
-_PRINT_LOCK = threading.Lock()
+
+log = logging.getLogger(__name__)
+
+# Backend de envio: "win32" (spooler do Windows) ou "fake" (spooler em memória,
+# para testes e benchmarks fora do Windows). Os PRINT_FAKE_* simulam, em ms, a
+# escrita, a abertura da impressora e o início/fim de cada documento.
+PRINT_BACKEND = os.getenv("PRINT_BACKEND", "win32").strip().lower()
+PRINT_FAKE_DELAY_MS = float(os.getenv("PRINT_FAKE_DELAY_MS", "0"))
+PRINT_FAKE_OPEN_MS = float(os.getenv("PRINT_FAKE_OPEN_MS", "0"))
+PRINT_FAKE_DOC_MS = float(os.getenv("PRINT_FAKE_DOC_MS", "0"))
+# Segundos que um handle de impressora ocioso continua aberto (0 = fecha a cada job)
+PRINT_SESSION_IDLE_S = float(os.getenv("PRINT_SESSION_IDLE_S", "300"))
+# Máximo de jobs já enfileirados que o worker de uma impressora junta em um documento
+PRINT_BATCH_MAX = int(os.getenv("PRINT_BATCH_MAX", "10"))
+# Segundos que uma requisição espera o job sair da fila (0 = sem limite)
+PRINT_JOB_TIMEOUT_S = float(os.getenv("PRINT_JOB_TIMEOUT_S", "120"))
+# Gráficos armazenados (opcional): liga a conversão da arte estática dos
+# templates, memória da impressora onde ficam (R: = RAM, E: = flash) e segundos
+# até reenviar. R: perde tudo quando a impressora reinicia, e ^XG de gráfico
+# ausente imprime a etiqueta sem a arte, sem erro; 0 = nunca reenviar
+PRINT_STORED_GRAPHICS = os.getenv("PRINT_STORED_GRAPHICS", "0") != "0"
+PRINT_ASSET_DEVICE = os.getenv("PRINT_ASSET_DEVICE", "R").strip().upper().rstrip(":") or "R"
+PRINT_ASSET_REFRESH_S = float(os.getenv("PRINT_ASSET_REFRESH_S", "300"))
+# Registro de templates do servidor HTTP: os .prn do diretório base ficam
+# compilados em memória e são atualizados por inotify (Linux) ou por varredura
+# de mtime a cada PRINT_TEMPLATE_POLL_S segundos (0 = sem registro: stat por job)
+PRINT_TEMPLATE_POLL_S = float(os.getenv("PRINT_TEMPLATE_POLL_S", "2"))
 
 DEFAULT_ENCODING = locale.getpreferredencoding(False)
 if not DEFAULT_ENCODING or DEFAULT_ENCODING.lower() in {"ansi_x3.4-1968", "us-ascii"}:
@@ -53,6 +91,14 @@ class PrintJobError(RuntimeError):
     """Erro ao montar ou enviar o job para a impressora."""
 
 
+class PrintStatusUnknownError(PrintJobError):
+    """O job já estava sendo enviado quando a espera acabou: pode ter saído.
+
+    Quem chama não deve repetir automaticamente (nem pelo spool, nem com outra
+    fonte), para não duplicar a etiqueta.
+    """
+
+
 @dataclass
 class PrintJob:
     text: str
@@ -61,6 +107,8 @@ class PrintJob:
     token: str = "{{1}}"
     encoding: str = DEFAULT_ENCODING
     variables: Optional[dict[str, str]] = None
+    # Gráficos armazenados que o texto chama com ^XG (baixados antes, se preciso)
+    assets: tuple["StoredGraphic", ...] = ()
 
 
 def _read_text(args: argparse.Namespace) -> str:
@@ -166,75 +214,1029 @@ def _normalize_token_key(token: str) -> str:
 
 
 def _apply_template(
-    template_path: Path,
+    template: "_CompiledTemplate",
     payload: Optional[str],
     token: str,
     extra_variables: Optional[dict[str, str]] = None,
-) -> str:
-    template_text = template_path.read_text(encoding="utf-8-sig")
-
-    replacements: list[tuple[str, str]] = []
-    if payload is not None:
-        replacements.append((token, payload))
+) -> tuple[str, tuple["StoredGraphic", ...]]:
+    """Texto final do template e os gráficos armazenados que ele chama.
 
+    `{{1}}`, `{1}` e `1` indicam o mesmo marcador; o primeiro valor informado
+    para um marcador vale (o texto principal antes de `extra_variables`).
+    """
+    values: dict[str, str] = {}
+    missing_tokens: list[str] = []
+    replacements = [(token, payload)] if payload is not None else []
     if extra_variables:
-        for raw_token, value in extra_variables.items():
-            replacements.append((raw_token, value))
-
-    successful_tokens: set[str] = set()
-
+        replacements.extend(extra_variables.items())
     for raw_token, value in replacements:
-        for candidate in _token_candidates(raw_token):
-            if candidate in template_text:
-                template_text = template_text.replace(candidate, value)
-                successful_tokens.add(_normalize_token_key(raw_token))
-                break
-    missing_tokens: list[str] = []
-    for raw_token, _ in replacements:
-        if _normalize_token_key(raw_token) not in successful_tokens:
+        name = _normalize_token_key(raw_token)
+        if name not in template.slots:
             missing_tokens.append(raw_token)
+        else:
+            values.setdefault(name, value)
 
     if missing_tokens:
         formatted = ", ".join(f"'{tok}'" for tok in missing_tokens)
-        raise PrintJobError(f"Token(s) {formatted} não encontrado(s) em {template_path}.")
+        raise PrintJobError(f"Token(s) {formatted} não encontrado(s) em {template.path}.")
 
-    return template_text
+    return template.render(values), template.assets
 
 
-def _send_with_win32(job: PrintJob) -> str:
-    try:
-        import win32print  # type: ignore
-    except ImportError as exc:  # pragma: no cover - fallback acionado
-        raise PrintJobError("Pacote pywin32 não disponível") from exc
+@dataclass(frozen=True)
+class StoredGraphic:
+    """Gráfico na memória da impressora, nomeado pelo hash do conteúdo."""
+
+    name: str  # ex.: R:3FA2C91B.GRF
+    command: bytes  # ~DG que grava o gráfico
+
 
-    printer_name = job.printer or win32print.GetDefaultPrinter()
-    if not printer_name:
-        raise PrintJobError("Nenhuma impressora padrão encontrada")
+def stored_graphic(data: bytes, bytes_per_row: int, device: str = PRINT_ASSET_DEVICE) -> StoredGraphic:
+    """~DG para o bitmap já compactado (formato ^GFA, 1 = preto).
+
+    O nome vem do SHA-1 do conteúdo: arte alterada vira outro gráfico e a
+    mesma arte em templates diferentes é baixada uma vez só. Os dados vão com
+    a compressão ACS, aceita pelo ~DG (caixas são quase só linhas em branco).
+    """
+    from zpl_graphics import encode_gfa
+
+    digest = hashlib.sha1(bytes_per_row.to_bytes(4, "big") + data).hexdigest()
+    name = f"{device}:{digest[:8].upper()}.GRF"
+    command = f"~DG{name},{len(data)},{bytes_per_row},{encode_gfa(data, bytes_per_row, 'acs')}\n"
+    return StoredGraphic(name, command.encode("ascii"))
+
+
+def graphic_from_image(image, device: str = PRINT_ASSET_DEVICE) -> StoredGraphic:
+    """Gráfico armazenado de uma imagem Pillow (ex.: static/img/logo_opera.png já em 1 bit)."""
+    from zpl_graphics import pack_image
+
+    data, bytes_per_row = pack_image(image)
+    return stored_graphic(data, bytes_per_row, device)
+
+
+_FORMAT_BLOCK = re.compile(r"\^XA.*?\^XZ", re.S)
+_BOX_FIELD = re.compile(r"\^FO(\d+),(\d+)\^GB([\d,BW]*)\^FS(?:\r?\n)?")
+_GFA_FIELD = re.compile(r"\^FO(\d+),(\d+)\^GFA,(\d+),\d+,(\d+),([^\^~{]*)\^FS(?:\r?\n)?")
+
+
+def _parse_box(params: str) -> Optional[tuple[int, int, int]]:
+    """(largura, altura, espessura) do ^GB, ou None se não for caixa preta reta."""
+    values = params.split(",")
+    if len(values) > 5:
+        return None
+    values += [""] * (5 - len(values))
+    width, height, thickness, color, rounding = values
+    if color not in ("", "B") or rounding not in ("", "0"):
+        return None
+    thickness_value = int(thickness or 1)
+    # Largura/altura menores que a espessura valem a espessura (linhas)
+    return (
+        max(int(width or thickness_value), thickness_value),
+        max(int(height or thickness_value), thickness_value),
+        thickness_value,
+    )
+
+
+def _draw_boxes(boxes: list[tuple[int, int, int, int, int]]):
+    """Bitmap 1 bit das caixas e a origem dele no rótulo."""
+    from PIL import Image, ImageDraw
+
+    left = min(x for x, _, _, _, _ in boxes)
+    top = min(y for _, y, _, _, _ in boxes)
+    right = max(x + width for x, _, width, _, _ in boxes)
+    bottom = max(y + height for _, y, _, height, _ in boxes)
+    image = Image.new("1", (right - left, bottom - top), 1)
+    draw = ImageDraw.Draw(image)
+    for x, y, width, height, thickness in boxes:
+        x, y = x - left, y - top
+        # Borda desenhada para dentro da caixa, como no ^GB; só preto (OR)
+        for x0, y0, x1, y1 in (
+            (x, y, x + width, y + thickness),
+            (x, y + height - thickness, x + width, y + height),
+            (x, y, x + thickness, y + height),
+            (x + width - thickness, y, x + width, y + height),
+        ):
+            draw.rectangle((x0, y0, x1 - 1, y1 - 1), fill=0)
+    return image, left, top
+
+
+def extract_static_artwork(template_text: str, device: str = PRINT_ASSET_DEVICE) -> tuple[str, tuple[StoredGraphic, ...]]:
+    """Troca a arte estática de cada formato (^XA..^XZ) por chamadas ^XG.
+
+    - Caixas ^GB (pretas, sem cantos arredondados, posicionadas por ^FO) viram
+      um único gráfico no lugar da primeira caixa.
+    - ^GFA sem marcadores (logos exportados pelo ZebraDesigner) viram um
+      gráfico cada, na mesma posição.
+    Templates com ^FR (campo reverso, depende da ordem de desenho) ficam como estão.
+    """
+    if "^FR" in template_text:
+        return template_text, ()
+
+    from zpl_graphics import decode_gfa
+
+    assets: dict[str, StoredGraphic] = {}
+
+    def recall(graphic: StoredGraphic, x: int, y: int) -> str:
+        assets.setdefault(graphic.name, graphic)
+        return f"^FO{x},{y}^XG{graphic.name},1,1^FS\n"
+
+    def rewrite_logo(match: "re.Match[str]") -> str:
+        x, y, total_bytes, bytes_per_row, field = match.groups()
+        try:
+            data = decode_gfa(field.strip(), int(total_bytes), int(bytes_per_row))
+        except ValueError:
+            return match.group(0)
+        return recall(stored_graphic(data, int(bytes_per_row), device), int(x), int(y))
+
+    def rewrite_block(match: "re.Match[str]") -> str:
+        block = _GFA_FIELD.sub(rewrite_logo, match.group(0))
+        boxes = []
+        spans = []
+        for box in _BOX_FIELD.finditer(block):
+            size = _parse_box(box.group(3))
+            if size is not None:
+                boxes.append((int(box.group(1)), int(box.group(2))) + size)
+                spans.append(box.span())
+        if not boxes:
+            return block
+        image, x, y = _draw_boxes(boxes)
+        parts = [block[:spans[0][0]], recall(graphic_from_image(image, device), x, y)]
+        for (_, end), (start, _) in zip(spans, spans[1:]):
+            parts.append(block[end:start])
+        parts.append(block[spans[-1][1]:])
+        return "".join(parts)
 
     try:
-        payload = job.text.encode(job.encoding)
-    except UnicodeEncodeError as exc:
-        raise PrintJobError(
-            "Caracteres não suportados pela codificação atual. Defina --encoding ou 'encoding' no JSON."
-        ) from exc
+        rewritten = _FORMAT_BLOCK.sub(rewrite_block, template_text)
+    except ImportError:
+        # Sem Pillow (CLI avulsa) o template segue sem gráficos armazenados
+        return template_text, ()
+    return rewritten, tuple(assets.values())
+
+
+# Marcadores `{{nome}}` ou `{nome}` (sem espaços nem chaves dentro)
+_PLACEHOLDER = re.compile(r"\{\{([^{}\s]+)\}\}|\{([^{}\s]+)\}")
+
+
+class _CompiledTemplate:
+    """Template quebrado uma vez em trechos literais e posições de marcadores.
+
+    `chunks` guarda o texto original inteiro (marcadores inclusive); `slots`
+    diz, por nome, em que posições de `chunks` o valor entra. Renderizar é
+    trocar essas posições em uma cópia da lista e fazer um único join;
+    marcadores sem valor continuam como estão no arquivo.
+    """
+
+    __slots__ = ("chunks", "slots", "assets", "path")
+
+    def __init__(self, text: str, assets: tuple[StoredGraphic, ...] = (), path: Optional[Path] = None) -> None:
+        chunks: list[str] = []
+        slots: dict[str, list[int]] = {}
+        position = 0
+        for match in _PLACEHOLDER.finditer(text):
+            chunks.append(text[position:match.start()])
+            slots.setdefault(match.group(1) or match.group(2), []).append(len(chunks))
+            chunks.append(match.group(0))
+            position = match.end()
+        chunks.append(text[position:])
+        self.chunks = chunks
+        self.slots = {name: tuple(indexes) for name, indexes in slots.items()}
+        self.assets = assets
+        self.path = path
+
+    @property
+    def text(self) -> str:
+        return "".join(self.chunks)
+
+    def render(self, values: dict[str, str]) -> str:
+        chunks = self.chunks.copy()
+        slots = self.slots
+        for name, value in values.items():
+            for index in slots[name]:
+                chunks[index] = value
+        return "".join(chunks)
+
+
+_template_cache: dict[Path, tuple[int, _CompiledTemplate]] = {}
+_template_cache_lock = threading.Lock()
+
+
+def _compile_template(template_path: Path) -> _CompiledTemplate:
+    text = template_path.read_text(encoding="utf-8-sig")
+    assets: tuple[StoredGraphic, ...] = ()
+    if PRINT_STORED_GRAPHICS:
+        text, assets = extract_static_artwork(text)
+    return _CompiledTemplate(text, assets, template_path)
+
+
+def _load_template(template_path: Path) -> _CompiledTemplate:
+    """Template lido, convertido e compilado uma vez por versão do arquivo (mtime)."""
+    mtime = template_path.stat().st_mtime_ns
+    cached = _template_cache.get(template_path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    template = _compile_template(template_path)
+    with _template_cache_lock:
+        _template_cache[template_path] = (mtime, template)
+    return template
+
+
+# Eventos do inotify (linux/inotify.h) que mudam o conteúdo ou a lista de arquivos
+_IN_CLOSE_WRITE = 0x008
+_IN_MOVED_FROM = 0x040
+_IN_MOVED_TO = 0x080
+_IN_DELETE = 0x200
+_IN_DELETE_SELF = 0x400
+_IN_Q_OVERFLOW = 0x4000
+_INOTIFY_EVENT = struct.Struct("iIII")
+
+
+def _inotify_watch(directory: Path) -> Optional[int]:
+    """Descritor inotify observando o diretório, ou None fora do Linux/sem suporte."""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        fd = libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+        if fd < 0:
+            return None
+        mask = _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_DELETE | _IN_DELETE_SELF
+        if libc.inotify_add_watch(fd, os.fsencode(str(directory)), mask) < 0:
+            os.close(fd)
+            return None
+        return fd
+    except (OSError, AttributeError):
+        return None
+
 
-    with _PRINT_LOCK:
-        handle = win32print.OpenPrinter(printer_name)
+class TemplateRegistry:
+    """Templates .prn do diretório base, compilados na partida e mantidos em memória.
+
+    `get` resolve o nome do template (`model_prn`) com uma consulta a dict,
+    sem stat/resolve por requisição. Uma thread mantém o índice em dia: no
+    Linux lê os eventos do inotify do diretório; nos demais sistemas (ou se o
+    inotify falhar) varre os mtimes a cada `poll_interval` segundos.
+    Só o diretório base é indexado; outros caminhos (subdiretórios, caminho
+    absoluto) seguem pelo `_resolve_template` + cache por mtime.
+    """
+
+    def __init__(self, base_dir: Path = BASE_DIR, poll_interval: float = 2.0) -> None:
+        self.base_dir = base_dir
+        self.poll_interval = poll_interval
+        self.watcher = "nenhum"
+        self.reloads = 0
+        self.errors: dict[str, str] = {}
+        self._templates: dict[str, _CompiledTemplate] = {}
+        self._versions: dict[str, tuple[int, int]] = {}
+        # Grafias alternativas já vistas ("./ZEBRA.prn", caminho absoluto) -> nome
+        self._aliases: dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._inotify_fd: Optional[int] = None
+
+    def start(self) -> "TemplateRegistry":
+        self.scan()
+        fd = _inotify_watch(self.base_dir)
+        self._inotify_fd = fd
+        self.watcher = "inotify" if fd is not None else "mtime"
+        self._thread = threading.Thread(
+            target=self._watch_inotify if fd is not None else self._watch_mtime,
+            args=(fd,) if fd is not None else (),
+            name="templates",
+            daemon=True,
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        # Depois do join: a thread não pode estar no select de um fd já reaproveitado
+        self._close_inotify()
+
+    def get(self, value: str) -> _CompiledTemplate:
+        template = self._templates.get(self._aliases.get(value, value))
+        if template is not None:
+            return template
+
+        template_path = _resolve_template(value)
+        if template_path.parent == self.base_dir:
+            template = self._templates.get(template_path.name)
+            if template is not None:
+                if len(self._aliases) < 256:
+                    self._aliases[value] = template_path.name
+                return template
+        return _load_template(template_path)
+
+    def scan(self) -> None:
+        """Sincroniza o índice com o diretório (recompila só o que mudou)."""
+        found: dict[str, tuple[int, int]] = {}
         try:
-            doc_info = ("Python RAW", None, "RAW")
-            win32print.StartDocPrinter(handle, 1, doc_info)
+            entries = list(os.scandir(self.base_dir))
+        except OSError as exc:
+            log.warning("Não foi possível listar templates em %s: %s", self.base_dir, exc)
+            return
+        for entry in entries:
+            if not entry.name.lower().endswith(".prn"):
+                continue
             try:
-                written = win32print.WritePrinter(handle, payload)
-                if written != len(payload):
+                if entry.is_file():
+                    info = entry.stat()
+                    found[entry.name] = (info.st_mtime_ns, info.st_size)
+            except OSError:
+                continue
+        for name in set(self._templates) - set(found):
+            self._remove(name)
+        for name, version in found.items():
+            if self._versions.get(name) != version:
+                self._reload(name, version)
+
+    def stats(self) -> dict:
+        return {
+            "watcher": self.watcher,
+            "templates": sorted(self._templates),
+            "reloads": self.reloads,
+            "errors": dict(self.errors),
+        }
+
+    def _reload(self, name: str, version: Optional[tuple[int, int]] = None) -> None:
+        path = self.base_dir / name
+        try:
+            if version is None:
+                info = path.stat()
+                version = (info.st_mtime_ns, info.st_size)
+            template = _compile_template(path)
+        except FileNotFoundError:
+            self._remove(name)
+            return
+        except Exception as exc:
+            # Fica fora do índice; o pedido cai no caminho com stat e recebe o erro real
+            self._remove(name)
+            self.errors[name] = str(exc)
+            log.warning("Template %s não compilou: %s", name, exc)
+            return
+        with self._lock:
+            self._templates[name] = template
+            self._versions[name] = version
+            self.errors.pop(name, None)
+            self.reloads += 1
+
+    def _remove(self, name: str) -> None:
+        with self._lock:
+            self._templates.pop(name, None)
+            self._versions.pop(name, None)
+            self._aliases = {alias: target for alias, target in self._aliases.items() if target != name}
+
+    def _close_inotify(self) -> None:
+        """Fecha o fd do inotify uma única vez (stop e a thread podem chamar)."""
+        with self._lock:
+            fd, self._inotify_fd = self._inotify_fd, None
+        if fd is not None:
+            os.close(fd)
+
+    def _watch_mtime(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            self.scan()
+
+    def _watch_inotify(self, fd: int) -> None:
+        try:
+            while not self._stop.is_set():
+                ready, _, _ = select.select([fd], [], [], 1.0)
+                if not ready:
+                    continue
+                try:
+                    buffer = os.read(fd, 65536)
+                except BlockingIOError:
+                    continue
+                changed: set[str] = set()
+                rescan = directory_gone = False
+                offset = 0
+                while offset < len(buffer):
+                    _, mask, _, length = _INOTIFY_EVENT.unpack_from(buffer, offset)
+                    offset += _INOTIFY_EVENT.size
+                    name = buffer[offset:offset + length].rstrip(b"\0").decode(sys.getfilesystemencoding(), "replace")
+                    offset += length
+                    if mask & _IN_DELETE_SELF:
+                        directory_gone = True
+                    elif mask & _IN_Q_OVERFLOW:
+                        rescan = True
+                    elif name.lower().endswith(".prn"):
+                        changed.add(name)
+                if directory_gone:
+                    # Diretório removido/substituído: não há mais o que observar
+                    log.warning("Diretório de templates %s removido; passando para varredura", self.base_dir)
+                    self._close_inotify()
+                    self.watcher = "mtime"
+                    self.scan()
+                    self._watch_mtime()
+                    return
+                if rescan:
+                    self.scan()
+                for name in changed:
+                    self._reload(name)
+        finally:
+            self._close_inotify()
+
+
+class Spooler(ABC):
+    """Operações da spooler usadas por `PrinterSessionManager`.
+
+    Isola a API do sistema operacional (win32print) para que a lógica de
+    sessões e lotes possa ser exercitada fora do Windows com `FakeSpooler`.
+    Subclasses implementam todas as operações (checado ao instanciar).
+    """
+
+    name = "abstract"
+
+    @abstractmethod
+    def default_printer(self) -> Optional[str]:
+        """Nome da impressora padrão, ou None se não houver."""
+
+    @abstractmethod
+    def open(self, printer_name: str) -> object:
+        """Abre a impressora e retorna o handle."""
+
+    @abstractmethod
+    def close(self, handle: object) -> None:
+        """Fecha o handle."""
+
+    @abstractmethod
+    def start_document(self, handle: object, doc_name: str) -> None:
+        """Inicia um documento RAW."""
+
+    @abstractmethod
+    def write(self, handle: object, payload: bytes) -> int:
+        """Escreve no documento aberto; retorna os bytes aceitos."""
+
+    @abstractmethod
+    def end_document(self, handle: object) -> None:
+        """Encerra o documento, que segue para a impressora."""
+
+
+class Win32Spooler(Spooler):
+    name = "win32"
+
+    def __init__(self) -> None:
+        try:
+            import win32print  # type: ignore
+        except ImportError as exc:  # pragma: no cover - fallback acionado
+            raise PrintJobError("Pacote pywin32 não disponível") from exc
+        self._win32print = win32print
+
+    def default_printer(self) -> Optional[str]:
+        return self._win32print.GetDefaultPrinter()
+
+    def open(self, printer_name: str) -> object:
+        return self._win32print.OpenPrinter(printer_name)
+
+    def close(self, handle: object) -> None:
+        self._win32print.ClosePrinter(handle)
+
+    def start_document(self, handle: object, doc_name: str) -> None:
+        self._win32print.StartDocPrinter(handle, 1, (doc_name, None, "RAW"))
+
+    def write(self, handle: object, payload: bytes) -> int:
+        return self._win32print.WritePrinter(handle, payload)
+
+    def end_document(self, handle: object) -> None:
+        self._win32print.EndDocPrinter(handle)
+
+
+class FakeSpooler(Spooler):
+    """Spooler em memória para testes e benchmarks.
+
+    Os atrasos simulam o custo de abrir a impressora, de iniciar/encerrar um
+    documento e de escrever os bytes. `fail_next(etapa)` faz a próxima chamada
+    da etapa ("open", "start_document", "write", "end_document") falhar.
+    """
+
+    name = "fake"
+
+    def __init__(
+        self,
+        open_delay: float = 0.0,
+        document_delay: float = 0.0,
+        write_delay: float = 0.0,
+        keep_documents: int = 100,
+    ) -> None:
+        self.open_delay = open_delay
+        self.document_delay = document_delay
+        self.write_delay = write_delay
+        self.keep_documents = keep_documents
+        self.documents: list[tuple[str, bytes]] = []
+        self.opens = 0
+        self.closes = 0
+        self._failures: dict[str, int] = {}
+        self._next_handle = 0
+        self._open_handles: dict[int, str] = {}
+        self._current: dict[int, list[bytes]] = {}
+        self._lock = threading.Lock()
+
+    def fail_next(self, stage: str, times: int = 1) -> None:
+        with self._lock:
+            self._failures[stage] = self._failures.get(stage, 0) + times
+
+    def _maybe_fail(self, stage: str) -> None:
+        with self._lock:
+            remaining = self._failures.get(stage, 0)
+            if remaining:
+                self._failures[stage] = remaining - 1
+        if remaining:
+            raise OSError(f"Falha simulada em {stage}")
+
+    def default_printer(self) -> Optional[str]:
+        return "fake"
+
+    def open(self, printer_name: str) -> object:
+        self._maybe_fail("open")
+        if self.open_delay:
+            time.sleep(self.open_delay)
+        with self._lock:
+            self._next_handle += 1
+            self._open_handles[self._next_handle] = printer_name
+            self.opens += 1
+            return self._next_handle
+
+    def close(self, handle: object) -> None:
+        with self._lock:
+            self._open_handles.pop(handle, None)
+            self._current.pop(handle, None)
+            self.closes += 1
+
+    def start_document(self, handle: object, doc_name: str) -> None:
+        self._maybe_fail("start_document")
+        if handle not in self._open_handles:
+            raise OSError("Handle de impressora inválido")
+        if self.document_delay:
+            time.sleep(self.document_delay / 2)
+        self._current[handle] = []
+
+    def write(self, handle: object, payload: bytes) -> int:
+        self._maybe_fail("write")
+        if self.write_delay:
+            time.sleep(self.write_delay)
+        self._current[handle].append(payload)
+        return len(payload)
+
+    def end_document(self, handle: object) -> None:
+        self._maybe_fail("end_document")
+        if self.document_delay:
+            time.sleep(self.document_delay / 2)
+        chunks = self._current.pop(handle, [])
+        with self._lock:
+            self.documents.append((self._open_handles.get(handle, "?"), b"".join(chunks)))
+            del self.documents[:-self.keep_documents or None]
+
+
+@dataclass
+class _PrinterSession:
+    handle: object
+    opened_at: float
+    last_used: float
+    documents: int = 0
+    jobs: int = 0
+
+
+class PrinterSessionManager:
+    """Mantém um handle aberto por impressora e envia lotes como um só documento.
+
+    - `idle_timeout`: handles parados há mais que isso (segundos) são reabertos
+      antes do uso; 0 fecha o handle após cada documento (comportamento antigo).
+    - Falha ao iniciar o documento descarta o handle e tenta uma vez com um
+      handle novo (nada foi enviado ainda). Falhas durante a escrita descartam o
+      handle mas não são repetidas, para não duplicar etiquetas.
+    - `on_new_session` (em `send`): chamado quando o documento sai no primeiro
+      uso de um handle (aberto agora ou reaberto após ociosidade ou erro); o
+      que ele retornar vai no início do documento.
+    """
+
+    def __init__(self, spooler: Spooler, idle_timeout: float = 300.0, doc_name: str = "Python RAW") -> None:
+        self.spooler = spooler
+        self.idle_timeout = idle_timeout
+        self.doc_name = doc_name
+        self._sessions: dict[str, _PrinterSession] = {}
+        # Um lock por impressora: uma Zebra lenta não segura as demais.
+        self._printer_locks: dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.reopens = 0
+        self.errors = 0
+
+    def send(
+        self,
+        printer_name: Optional[str],
+        payloads: list[bytes],
+        on_new_session: Optional[Callable[[], list[bytes]]] = None,
+    ) -> str:
+        """Envia os payloads, na ordem, em um único documento RAW."""
+        printer_name = printer_name or self.spooler.default_printer()
+        if not printer_name:
+            raise PrintJobError("Nenhuma impressora padrão encontrada")
+
+        with self._printer_lock(printer_name):
+            session = self._start_document(printer_name)
+            prelude = on_new_session() if on_new_session is not None and not session.documents else []
+            document = b"".join(prelude + payloads)
+            try:
+                written = self.spooler.write(session.handle, document)
+                if written != len(document):
                     raise PrintJobError(
-                        f"Somente {written} de {len(payload)} bytes enviados à spooler."
+                        f"Somente {written} de {len(document)} bytes enviados à spooler."
                     )
+            except Exception as exc:
+                self._count_error()
+                self._end_quietly(session)
+                self._drop(printer_name)
+                if isinstance(exc, PrintJobError):
+                    raise
+                raise PrintJobError(f"Falha ao enviar para {printer_name}: {exc}") from exc
+
+            try:
+                self.spooler.end_document(session.handle)
+            except Exception as exc:
+                self._count_error()
+                self._drop(printer_name)
+                raise PrintJobError(f"Falha ao finalizar documento em {printer_name}: {exc}") from exc
+
+            session.last_used = time.monotonic()
+            session.documents += 1
+            session.jobs += len(payloads)
+            if not self.idle_timeout:
+                self._drop(printer_name)
+
+        return printer_name
+
+    def close_all(self) -> None:
+        for printer_name in list(self._sessions):
+            with self._printer_lock(printer_name):
+                self._drop(printer_name)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            sessions = list(self._sessions.items())
+            return {
+                "backend": self.spooler.name,
+                "idle_timeout": self.idle_timeout,
+                "reopens": self.reopens,
+                "errors": self.errors,
+                "printers": {
+                    name: {
+                        "open_for_s": round(now - session.opened_at, 1),
+                        "idle_for_s": round(now - session.last_used, 1),
+                        "documents": session.documents,
+                        "jobs": session.jobs,
+                    }
+                    for name, session in sessions
+                },
+            }
+
+    def _start_document(self, printer_name: str) -> _PrinterSession:
+        for attempt in range(2):
+            session = self._session(printer_name)
+            try:
+                self.spooler.start_document(session.handle, self.doc_name)
+                return session
+            except Exception as exc:
+                self._count_error()
+                self._drop(printer_name)
+                if attempt:
+                    raise PrintJobError(f"Falha ao iniciar documento em {printer_name}: {exc}") from exc
+                with self._lock:
+                    self.reopens += 1
+        raise AssertionError("inalcançável")
+
+    def _printer_lock(self, printer_name: str) -> threading.Lock:
+        lock = self._printer_locks.get(printer_name)
+        if lock is None:
+            with self._lock:
+                lock = self._printer_locks.setdefault(printer_name, threading.Lock())
+        return lock
+
+    def _count_error(self) -> None:
+        with self._lock:
+            self.errors += 1
+
+    def _session(self, printer_name: str) -> _PrinterSession:
+        now = time.monotonic()
+        session = self._sessions.get(printer_name)
+        if session is not None and self.idle_timeout and now - session.last_used > self.idle_timeout:
+            self._drop(printer_name)
+            session = None
+        if session is None:
+            try:
+                handle = self.spooler.open(printer_name)
+            except Exception as exc:
+                self._count_error()
+                raise PrintJobError(f"Não foi possível abrir a impressora {printer_name}: {exc}") from exc
+            session = _PrinterSession(handle=handle, opened_at=now, last_used=now)
+            with self._lock:
+                self._sessions[printer_name] = session
+        return session
+
+    def _end_quietly(self, session: _PrinterSession) -> None:
+        try:
+            self.spooler.end_document(session.handle)
+        except Exception:
+            pass
+
+    def _drop(self, printer_name: str) -> None:
+        with self._lock:
+            session = self._sessions.pop(printer_name, None)
+        if session is None:
+            return
+        try:
+            self.spooler.close(session.handle)
+        except Exception:
+            pass
+
+
+class PrinterAssetManager:
+    """Quais gráficos armazenados cada impressora já recebeu.
+
+    A chave é o nome do gráfico, que vem do hash do conteúdo. O worker da
+    impressora pede os que faltam (`pending`), manda os ~DG no mesmo documento,
+    antes das etiquetas, e marca como enviados só se o documento saiu
+    (`mark_sent`); falha no envio esquece a impressora (`forget`).
+    Gráficos em R: somem quando a impressora reinicia sem que a spooler avise:
+    passados `refresh_s` segundos do envio o gráfico é reenviado (0 = nunca).
+    """
+
+    def __init__(self, refresh_s: float = 300.0) -> None:
+        self.refresh_s = refresh_s
+        self._held: dict[str, dict[str, float]] = {}
+        self._lock = threading.Lock()
+        self.downloads = 0
+        self.download_bytes = 0
+
+    def pending(self, printer_name: str, assets: list[StoredGraphic]) -> list[StoredGraphic]:
+        now = time.monotonic()
+        with self._lock:
+            held = self._held.get(printer_name, {})
+            return [
+                asset for asset in assets
+                if asset.name not in held or (self.refresh_s and now - held[asset.name] > self.refresh_s)
+            ]
+
+    def mark_sent(self, printer_name: str, assets: list[StoredGraphic]) -> None:
+        now = time.monotonic()
+        with self._lock:
+            held = self._held.setdefault(printer_name, {})
+            for asset in assets:
+                held[asset.name] = now
+            self.downloads += len(assets)
+            self.download_bytes += sum(len(asset.command) for asset in assets)
+
+    def forget(self, printer_name: str) -> None:
+        with self._lock:
+            self._held.pop(printer_name, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "refresh_s": self.refresh_s,
+                "downloads": self.downloads,
+                "download_bytes": self.download_bytes,
+                "printers": {name: sorted(held) for name, held in self._held.items()},
+            }
+
+
+@dataclass
+class _QueuedJob:
+    payload: bytes
+    future: Future
+    enqueued_at: float
+    assets: tuple[StoredGraphic, ...] = ()
+
+
+class _PrinterQueue:
+    def __init__(self, printer_name: str, latency_samples: int) -> None:
+        self.printer_name = printer_name
+        self.jobs: "queue.Queue[_QueuedJob]" = queue.Queue()
+        self.in_flight = 0
+        self.sent = 0
+        self.failed = 0
+        self.documents = 0
+        self.last_error: Optional[str] = None
+        self.wait_ms: deque[float] = deque(maxlen=latency_samples)
+        self.send_ms: deque[float] = deque(maxlen=latency_samples)
+        self.thread: Optional[threading.Thread] = None
+
+
+class PrinterDispatcher:
+    """Uma fila e um worker por impressora.
+
+    Jobs para impressoras diferentes saem em paralelo; jobs para a mesma
+    impressora saem na ordem de chegada. O worker junta até `max_batch` jobs já
+    enfileirados em um único documento (se o documento falhar, todos os jobs
+    dele recebem o erro). Gráficos armazenados que a impressora ainda não tem
+    vão no início do documento (`assets`).
+    """
+
+    def __init__(
+        self,
+        manager: PrinterSessionManager,
+        max_batch: int = 10,
+        latency_samples: int = 500,
+        assets: Optional[PrinterAssetManager] = None,
+    ) -> None:
+        self.manager = manager
+        self.max_batch = max(1, max_batch)
+        self.latency_samples = latency_samples
+        self.assets = assets or PrinterAssetManager()
+        self._queues: dict[str, _PrinterQueue] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, printer_name: Optional[str], payload: bytes, assets: tuple[StoredGraphic, ...] = ()) -> Future:
+        printer_name = printer_name or self.manager.spooler.default_printer()
+        if not printer_name:
+            raise PrintJobError("Nenhuma impressora padrão encontrada")
+
+        future: Future = Future()
+        self._queue_for(printer_name).jobs.put(_QueuedJob(payload, future, time.monotonic(), assets))
+        return future
+
+    def stats(self) -> dict:
+        with self._lock:
+            queues = list(self._queues.values())
+        return {
+            "max_batch": self.max_batch,
+            "stored_graphics": self.assets.stats(),
+            "printers": {
+                printer_queue.printer_name: {
+                    "queued": printer_queue.jobs.qsize(),
+                    "in_flight": printer_queue.in_flight,
+                    "sent": printer_queue.sent,
+                    "failed": printer_queue.failed,
+                    "documents": printer_queue.documents,
+                    "last_error": printer_queue.last_error,
+                    "wait_ms": _latency_summary(printer_queue.wait_ms),
+                    "send_ms": _latency_summary(printer_queue.send_ms),
+                }
+                for printer_queue in queues
+            },
+        }
+
+    def _queue_for(self, printer_name: str) -> _PrinterQueue:
+        printer_queue = self._queues.get(printer_name)
+        if printer_queue is not None:
+            return printer_queue
+        with self._lock:
+            printer_queue = self._queues.get(printer_name)
+            if printer_queue is None:
+                printer_queue = _PrinterQueue(printer_name, self.latency_samples)
+                printer_queue.thread = threading.Thread(
+                    target=self._run,
+                    args=(printer_queue,),
+                    name=f"printer-{printer_name}",
+                    daemon=True,
+                )
+                printer_queue.thread.start()
+                self._queues[printer_name] = printer_queue
+            return printer_queue
+
+    def _run(self, printer_queue: _PrinterQueue) -> None:
+        while True:
+            batch = [printer_queue.jobs.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(printer_queue.jobs.get_nowait())
+                except queue.Empty:
+                    break
+
+            batch = [job for job in batch if job.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            started = time.monotonic()
+            printer_queue.in_flight = len(batch)
+            for job in batch:
+                printer_queue.wait_ms.append((started - job.enqueued_at) * 1000.0)
+            assets = list({asset.name: asset for job in batch for asset in job.assets}.values())
+            downloads = self.assets.pending(printer_queue.printer_name, assets) if assets else []
+
+            def resend_all() -> list[bytes]:
+                # Handle novo: a impressora pode ter reiniciado desde o último
+                # ~DG (R: perdido), então todos os gráficos do lote vão de novo
+                nonlocal downloads
+                sent = {asset.name for asset in downloads}
+                missing = [asset for asset in assets if asset.name not in sent]
+                downloads = downloads + missing
+                return [asset.command for asset in missing]
+
+            try:
+                self.manager.send(
+                    printer_queue.printer_name,
+                    [asset.command for asset in downloads] + [job.payload for job in batch],
+                    on_new_session=resend_all if assets else None,
+                )
+            except Exception as exc:
+                if assets:
+                    self.assets.forget(printer_queue.printer_name)
+                printer_queue.failed += len(batch)
+                printer_queue.last_error = str(exc)
+                for job in batch:
+                    job.future.set_exception(exc)
+            else:
+                if downloads:
+                    self.assets.mark_sent(printer_queue.printer_name, downloads)
+                printer_queue.sent += len(batch)
+                printer_queue.documents += 1
+                for job in batch:
+                    job.future.set_result(printer_queue.printer_name)
             finally:
-                win32print.EndDocPrinter(handle)
-        finally:
-            win32print.ClosePrinter(handle)
+                printer_queue.in_flight = 0
+                printer_queue.send_ms.append((time.monotonic() - started) * 1000.0)
+
+
+def _latency_summary(samples: "deque[float]") -> dict:
+    from metrics import percentile
+
+    ordered = sorted(samples)
+    if not ordered:
+        return {"samples": 0}
+    return {
+        "samples": len(ordered),
+        "p50": round(percentile(ordered, 0.50), 3),
+        "p95": round(percentile(ordered, 0.95), 3),
+        "max": round(ordered[-1], 3),
+    }
+
 
-    return printer_name
+_SESSION_MANAGER: Optional[PrinterSessionManager] = None
+_DISPATCHER: Optional[PrinterDispatcher] = None
+_SESSION_MANAGER_LOCK = threading.Lock()
+
+
+def _build_spooler() -> Spooler:
+    if PRINT_BACKEND == "fake":
+        return FakeSpooler(
+            open_delay=PRINT_FAKE_OPEN_MS / 1000.0,
+            document_delay=PRINT_FAKE_DOC_MS / 1000.0,
+            write_delay=PRINT_FAKE_DELAY_MS / 1000.0,
+        )
+    return Win32Spooler()
+
+
+def get_session_manager() -> PrinterSessionManager:
+    global _SESSION_MANAGER
+    if _SESSION_MANAGER is None:
+        with _SESSION_MANAGER_LOCK:
+            if _SESSION_MANAGER is None:
+                _SESSION_MANAGER = PrinterSessionManager(_build_spooler(), idle_timeout=PRINT_SESSION_IDLE_S)
+    return _SESSION_MANAGER
+
+
+def get_dispatcher() -> PrinterDispatcher:
+    global _DISPATCHER
+    if _DISPATCHER is None:
+        manager = get_session_manager()
+        with _SESSION_MANAGER_LOCK:
+            if _DISPATCHER is None:
+                _DISPATCHER = PrinterDispatcher(
+                    manager,
+                    max_batch=PRINT_BATCH_MAX,
+                    assets=PrinterAssetManager(refresh_s=PRINT_ASSET_REFRESH_S),
+                )
+    return _DISPATCHER
+
+
+def _encode_job(job: PrintJob) -> bytes:
+    try:
+        return job.text.encode(job.encoding)
+    except UnicodeEncodeError as exc:
+        raise PrintJobError(
+            "Caracteres não suportados pela codificação atual. Defina --encoding ou 'encoding' no JSON."
+        ) from exc
+
+
+def _wait_printed(future: Future, printer_name: Optional[str]) -> str:
+    try:
+        return future.result(timeout=PRINT_JOB_TIMEOUT_S or None)
+    except FutureTimeoutError as exc:
+        # Ainda na fila: cancelado, o worker da impressora descarta o job
+        if future.cancel():
+            raise PrintJobError(
+                f"Tempo esgotado ({PRINT_JOB_TIMEOUT_S:.0f}s) aguardando a impressora {printer_name or 'padrão'}; "
+                "job cancelado."
+            ) from exc
+        if future.done():
+            # Terminou entre o timeout e o cancel: vale o resultado real
+            return future.result()
+        raise PrintStatusUnknownError(
+            f"Tempo esgotado ({PRINT_JOB_TIMEOUT_S:.0f}s) com o job já em envio para a impressora "
+            f"{printer_name or 'padrão'}: verifique se a etiqueta saiu antes de reimprimir."
+        ) from exc
+
+
+def _send_with_spooler(job: PrintJob) -> str:
+    future = get_dispatcher().submit(job.printer, _encode_job(job), job.assets)
+    return _wait_printed(future, job.printer)
 
 
 def _send_with_startfile(job: PrintJob) -> str:
@@ -247,7 +1249,8 @@ def _send_with_startfile(job: PrintJob) -> str:
         with tempfile.NamedTemporaryFile(
             "w", encoding=job.encoding, suffix=".txt", delete=False
         ) as tmp:
-            tmp.write(job.text)
+            # Sem controle do que a impressora já tem: os ~DG vão junto sempre
+            tmp.write("".join(asset.command.decode("ascii") for asset in job.assets) + job.text)
             temp_path = Path(tmp.name)
     except UnicodeEncodeError as exc:
         raise PrintJobError(
@@ -284,10 +1287,33 @@ def _send_with_startfile(job: PrintJob) -> str:
 
 
 def process_print_job(job: PrintJob) -> str:
-    printer_used = _send_with_win32(job)
+    printer_used = _send_with_spooler(job)
     return printer_used
 
 
+def process_print_jobs(jobs: list[PrintJob]) -> list[str]:
+    """Enfileira vários jobs de uma vez e aguarda todos.
+
+    Jobs para a mesma impressora saem na ordem da lista e o worker da impressora
+    junta os que estiverem na fila em um só documento. Retorna a impressora
+    usada por job.
+    """
+    payloads = [_encode_job(job) for job in jobs]
+    dispatcher = get_dispatcher()
+    futures = [dispatcher.submit(job.printer, payload, job.assets) for job, payload in zip(jobs, payloads)]
+    return [_wait_printed(future, job.printer) for job, future in zip(jobs, futures)]
+
+
+def print_session_stats() -> dict:
+    """Sessões e filas por impressora (ou o erro, se a spooler não carregar)."""
+    try:
+        stats = get_session_manager().stats()
+        stats["queues"] = get_dispatcher().stats()
+        return stats
+    except PrintJobError as exc:
+        return {"backend": PRINT_BACKEND, "error": str(exc)}
+
+
 def _parse_cli_variables(var_args: Optional[list[str]]) -> Optional[dict[str, str]]:
     if not var_args:
         return None
@@ -343,10 +1369,11 @@ def _prepare_job_from_args(args: argparse.Namespace) -> PrintJob:
 
     template_path = None
     final_text: str
+    assets: tuple[StoredGraphic, ...] = ()
 
     if args.template:
         template_path = _resolve_template(str(args.template))
-        final_text = _apply_template(template_path, text_input, args.token, variables)
+        final_text, assets = _apply_template(_load_template(template_path), text_input, args.token, variables)
     else:
         if text_input is None:
             raise PrintJobError("Nada foi informado para impressão.")
@@ -359,6 +1386,7 @@ def _prepare_job_from_args(args: argparse.Namespace) -> PrintJob:
         template=template_path,
         token=args.token,
         variables=variables,
+        assets=assets,
     )
 
 
@@ -382,10 +1410,15 @@ def create_app() -> "Flask":
         ) from exc
 
     app = Flask(__name__)
+    templates = TemplateRegistry(BASE_DIR, PRINT_TEMPLATE_POLL_S).start() if PRINT_TEMPLATE_POLL_S > 0 else None
 
     @app.route("/health", methods=["GET"])
     def health() -> "Response":
-        return jsonify({"status": "ok"})
+        return jsonify({
+            "status": "ok",
+            "print_sessions": print_session_stats(),
+            "templates": templates.stats() if templates is not None else None,
+        })
 
     @app.route("/print", methods=["POST"])
     def print_endpoint() -> "Response":
@@ -444,10 +1477,15 @@ def create_app() -> "Flask":
         try:
             template_path = None
             text_to_print = text
+            assets: tuple[StoredGraphic, ...] = ()
             if template_arg:
-                template_path = _resolve_template(str(template_arg))
-                text_to_print = _apply_template(
-                    template_path,
+                if templates is not None:
+                    template = templates.get(str(template_arg))
+                else:
+                    template = _load_template(_resolve_template(str(template_arg)))
+                template_path = template.path
+                text_to_print, assets = _apply_template(
+                    template,
                     text_to_print,
                     token,
                     variables,
@@ -465,6 +1503,7 @@ def create_app() -> "Flask":
                 token=token,
                 encoding=encoding,
                 variables=variables,
+                assets=assets,
             )
 
             printer_used = process_print_job(job)
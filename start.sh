@@ -18,6 +18,17 @@ echo "Timeout: $TIMEOUT"
 echo "Porta: 9020"
 echo "=========================================="
 
+# Métricas: cada worker grava as suas em METRICS_DIR e /metrics soma todas.
+# Arquivos de uma execução anterior não podem entrar na soma.
+export METRICS_DIR=${METRICS_DIR:-/tmp/etiquetas-metrics}
+rm -rf "$METRICS_DIR"
+mkdir -p "$METRICS_DIR"
+
+# Invalidações de cache entre workers: as de uma execução anterior não
+# interessam a processos novos, então o arquivo recomeça vazio.
+export CACHE_INVALIDATION_FILE=${CACHE_INVALIDATION_FILE:-/tmp/etiquetas-cache-invalidation.log}
+rm -f "$CACHE_INVALIDATION_FILE"
+
 # Iniciar aplicação com Gunicorn
 exec gunicorn \
     --bind 0.0.0.0:9020 \
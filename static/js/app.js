@@ -9,7 +9,11 @@ const CONFIG = {
     DEBOUNCE_DELAY: 300,
     ANIMATION_DURATION: 300,
     SNACKBAR_DURATION: 4000,
-    CAMERA_SCAN_INTERVAL: 100
+    CAMERA_SCAN_INTERVAL: 100,
+    JOB_POLL_INTERVAL: 1000,
+    JOB_POLL_TIMEOUT: 60000,
+    // SSE prende uma thread do servidor por job acompanhado: só sob demanda
+    JOB_USE_SSE: false
 };
 
 // === ESTADO GLOBAL ===
@@ -368,6 +372,77 @@ const SerialSearch = {
     }
 };
 
+// === FILA DE IMPRESSÃO ===
+// A impressão é enfileirada no servidor (resposta 202 com o job) e o
+// resultado é consultado por polling curto em /jobs/<id>. Server-sent events
+// só com CONFIG.JOB_USE_SSE (o servidor limita os streams e responde 503,
+// que cai de volta no polling).
+const PrintJobs = {
+    // 'spooled' encerra o acompanhamento: a reimpressão pode levar minutos
+    terminal(status) {
+        return status === 'done' || status === 'error' || status === 'spooled';
+    },
+    
+    acompanhar(job, serial) {
+        const finalizar = (estado) => {
+            if (estado.status === 'done') {
+                Snackbar.show(`Serial ${serial} impresso`, 'success');
+            } else if (estado.status === 'spooled') {
+                Snackbar.show(`Servidor de impressão indisponível: ${serial} guardado e será impresso quando ele voltar`, 'warning');
+            } else {
+                Snackbar.show(`Erro na impressão de ${serial}: ${estado.message || 'falha desconhecida'}`, 'error');
+            }
+        };
+        
+        if (!CONFIG.JOB_USE_SSE || typeof EventSource === 'undefined') {
+            this.consultar(job.id, finalizar);
+            return;
+        }
+        
+        const eventos = new EventSource(`/jobs/${encodeURIComponent(job.id)}/events`);
+        let terminou = false;
+        
+        eventos.addEventListener('status', (event) => {
+            const estado = JSON.parse(event.data);
+            if (PrintJobs.terminal(estado.status)) {
+                terminou = true;
+                eventos.close();
+                finalizar(estado);
+            }
+        });
+        
+        const usarPolling = () => {
+            eventos.close();
+            if (!terminou) {
+                terminou = true;
+                this.consultar(job.id, finalizar);
+            }
+        };
+        eventos.addEventListener('timeout', usarPolling);
+        eventos.onerror = usarPolling;
+    },
+    
+    async consultar(jobId, finalizar) {
+        const limite = Date.now() + CONFIG.JOB_POLL_TIMEOUT;
+        while (Date.now() < limite) {
+            try {
+                const response = await fetch(`/jobs/${encodeURIComponent(jobId)}`);
+                if (response.ok) {
+                    const result = await response.json();
+                    if (PrintJobs.terminal(result.job.status)) {
+                        finalizar(result.job);
+                        return;
+                    }
+                }
+            } catch (error) {
+                console.error('Erro ao consultar job:', error);
+            }
+            await new Promise(resolve => setTimeout(resolve, CONFIG.JOB_POLL_INTERVAL));
+        }
+        Snackbar.show('Sem confirmação da impressora. Verifique a etiqueta.', 'warning');
+    }
+};
+
 // === IMPRESSÃO ===
 const PrintManager = {
     async imprimirEtiqueta() {
@@ -386,14 +461,16 @@ const PrintManager = {
                     'Content-Type': 'application/json'
                 },
                 body: JSON.stringify({
-                    serialNumber: globalState.currentData.serial_number
+                    serialNumber: globalState.currentData.serial_number,
+                    async: true
                 })
             });
             
             const result = await response.json();
             
             if (response.ok && result.success) {
-                Snackbar.show('Etiqueta impressa com sucesso!', 'success');
+                Snackbar.show('Etiqueta enviada para a fila de impressão', 'info');
+                PrintJobs.acompanhar(result.job, globalState.currentData.serial_number);
                 SerialSearch.limparResultados();
             } else {
                 Snackbar.show(result.error || 'Erro ao imprimir etiqueta', 'error');
@@ -429,14 +506,16 @@ const PrintManager = {
                     'Content-Type': 'application/json'
                 },
                 body: JSON.stringify({
-                    codigoBarras: codigo
+                    codigoBarras: codigo,
+                    async: true
                 })
             });
             
             const result = await response.json();
             
             if (response.ok && result.success) {
-                Snackbar.show('Etiqueta impressa com sucesso!', 'success');
+                Snackbar.show('Etiqueta enviada para a fila de impressão', 'info');
+                PrintJobs.acompanhar(result.job, result.serial);
                 globalState.currentData = result.data;
                 SerialSearch.exibirResultado(result);
             } else {
@@ -0,0 +1,273 @@
+"""Cache LRU em memória com TTL e contadores.
+
+Usado para dados que mudam raramente durante um turno (ex.: projeto/veículo
+de uma OP). Thread-safe; cada processo do gunicorn tem o seu. Para que uma
+invalidação manual chegue a todos os processos use `InvalidationLog`.
+"""
+from __future__ import annotations
+
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem trava, o arquivo de invalidações não é compactado
+    fcntl = None
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Cache LRU limitado por quantidade de itens e, opcionalmente, por bytes.
+
+    - `maxsize`: número máximo de entradas.
+    - `ttl`: segundos de validade de cada entrada (None = sem expiração).
+    - `max_bytes` + `sizeof`: limite de memória estimado pela função `sizeof`.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        sizeof: Optional[Callable[[Any], int]] = None,
+    ) -> None:
+        if maxsize < 1:
+            raise ValueError("maxsize deve ser >= 1")
+        if max_bytes is not None and sizeof is None:
+            raise ValueError("max_bytes exige uma função sizeof")
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+
+        self._lock = threading.Lock()
+        # chave -> (valor, expira_em, tamanho)
+        self._data: "OrderedDict[Hashable, tuple[Any, Optional[float], int]]" = OrderedDict()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+
+            value, expires_at, _ = entry
+            if expires_at is not None and expires_at <= now:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        size = self._sizeof(value) if self._sizeof is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, expires_at, size)
+            self._bytes += size
+
+            while len(self._data) > self.maxsize or (
+                self.max_bytes is not None and self._bytes > self.max_bytes
+            ):
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> bool:
+        with self._lock:
+            if key not in self._data:
+                return False
+            self._remove(key)
+            self.invalidations += 1
+            return True
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        with self._lock:
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self) -> int:
+        with self._lock:
+            removed = len(self._data)
+            self._data.clear()
+            self._bytes = 0
+            self.invalidations += removed
+            return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+            if self.max_bytes is not None:
+                stats["bytes"] = self._bytes
+                stats["max_bytes"] = self.max_bytes
+            return stats
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def _remove(self, key: Hashable) -> None:
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+
+class InvalidationLog:
+    """Propaga invalidações manuais entre processos via arquivo append-only.
+
+    Cada linha é `namespace<TAB>chave` (ou `*` para limpar tudo). Os processos
+    verificam o arquivo no máximo a cada `interval` segundos com um `stat`.
+    Passando de `max_bytes`, quem publica troca o arquivo (sob `flock`) por um
+    novo que começa com a metade final do antigo: cada leitor termina o antigo
+    pelo descritor aberto e relê o novo desde o início. Repetir uma
+    invalidação só custa um miss; só perde linhas quem ficar mais de meio
+    arquivo atrasado.
+    """
+
+    def __init__(self, path: Optional[str] = None, interval: float = 1.0, max_bytes: int = 256 * 1024) -> None:
+        self.path = path or os.path.join(tempfile.gettempdir(), "etiquetas-cache-invalidation.log")
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self._handlers: dict[str, Callable[[Optional[str]], None]] = {}
+        self._lock = threading.Lock()
+        self._next_check = 0.0
+        self._handle = None
+        self._pid: Optional[int] = None
+        # Invalidações anteriores ao início do processo não importam.
+        try:
+            self._offset = os.path.getsize(self.path)
+        except OSError:
+            self._offset = 0
+
+    def register(self, namespace: str, handler: Callable[[Optional[str]], None]) -> None:
+        """`handler(chave)` recebe None quando o namespace inteiro deve ser limpo."""
+        self._handlers[namespace] = handler
+
+    def publish(self, namespace: str, key: Optional[str] = None) -> None:
+        line = f"{namespace}\t{'*' if key is None else key}\n"
+        if "\n" in line[:-1] or line.count("\t") != 1:
+            raise ValueError("Chaves de invalidação não podem conter TAB ou quebra de linha")
+        data = line.encode("utf-8")
+        while True:
+            with open(self.path, "ab") as handle:
+                if fcntl is None:
+                    handle.write(data)
+                    break
+                fcntl.flock(handle, fcntl.LOCK_EX)
+                # Outro processo pode ter trocado o arquivo entre o open e a trava
+                if not self._is_current(handle):
+                    continue
+                if os.fstat(handle.fileno()).st_size + len(data) > self.max_bytes:
+                    self._rotate(data, keep=self.max_bytes // 2)
+                else:
+                    handle.write(data)
+                break
+        self.poll(force=True)
+
+    def _rotate(self, data: bytes, keep: int) -> None:
+        # Chamado com a trava do arquivo atual: ninguém mais escreve nele depois
+        with open(self.path, "rb") as current:
+            current.seek(max(0, os.fstat(current.fileno()).st_size - keep))
+            tail = current.read()
+        if len(tail) >= keep:
+            tail = tail[tail.find(b"\n") + 1:]
+        temp = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp, "wb") as handle:
+            handle.write(tail + data)
+        os.replace(temp, self.path)
+
+    def _is_current(self, handle) -> bool:
+        try:
+            return os.path.samestat(os.stat(self.path), os.fstat(handle.fileno()))
+        except OSError:
+            return False
+
+    def _open(self):
+        if self._handle is not None and self._pid == os.getpid():
+            return self._handle
+        if self._handle is not None:
+            # Herdado do processo pai: o offset do arquivo seria compartilhado
+            self._handle.close()
+            self._handle = None
+        try:
+            self._handle = open(self.path, "rb")
+        except OSError:
+            return None
+        self._pid = os.getpid()
+        return self._handle
+
+    def _read_new(self, handle) -> bytes:
+        size = os.fstat(handle.fileno()).st_size
+        if size < self._offset:
+            self._offset = 0
+        if size == self._offset:
+            return b""
+        handle.seek(self._offset)
+        chunk = handle.read()
+        # Linha incompleta (escrita em andamento) fica para a próxima leitura.
+        complete = chunk[: chunk.rfind(b"\n") + 1]
+        self._offset += len(complete)
+        return complete
+
+    def poll(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now < self._next_check:
+            return
+
+        with self._lock:
+            self._next_check = now + self.interval
+            handle = self._open()
+            if handle is None:
+                return
+            # Verificado antes da leitura: se já foi trocado, o arquivo antigo
+            # está completo e é lido até o fim antes de passar ao novo.
+            rotated = not self._is_current(handle) and os.path.exists(self.path)
+            complete = self._read_new(handle)
+            if rotated:
+                handle.close()
+                self._handle = None
+                self._offset = 0
+                handle = self._open()
+                if handle is not None:
+                    complete += self._read_new(handle)
+
+        for line in complete.decode("utf-8").splitlines():
+            namespace, _, key = line.partition("\t")
+            handler = self._handlers.get(namespace)
+            if handler is not None:
+                handler(None if key == "*" else key)
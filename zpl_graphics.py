@@ -0,0 +1,217 @@
+"""Conversão de bitmaps Pillow para o campo gráfico ^GFA do ZPL.
+
+Compartilhado por `app.py` e `print_server_calibri.py`. A imagem modo '1' já é
+armazenada pelo Pillow compactada em bits (MSB primeiro, 1 = branco, linhas
+completadas até o byte). O ZPL usa a polaridade contrária (1 = preto) e espera
+os bits de preenchimento no fim de cada linha zerados, então basta inverter os
+bytes por tabela, limpar o preenchimento e gerar o hex, tudo em C.
+
+O campo de dados pode ir em três codificações (`GFA_ENCODINGS`):
+- `hex`: dois caracteres por byte, sem compressão;
+- `acs`: compressão ASCII do ZPL. Contadores de repetição G-Y (1-19) e
+  g-z (20-400), `,` e `!` completam a linha com 0/F, `:` repete a linha
+  anterior;
+- `z64`: `:Z64:` + base64 do deflate (zlib) + `:` + CRC-16 do base64.
+
+`decode_gfa` faz o caminho inverso das três e serve de validador.
+
+`crop_to_ink` recorta o bitmap na região com tinta antes da codificação: linhas
+e colunas em branco não vão para a impressora, e a posição do ^FO passa a ser
+calculada pela tinta, não pela caixa da fonte.
+"""
+from __future__ import annotations
+
+import base64
+import binascii
+import re
+import zlib
+from typing import Optional
+
+from PIL import Image, ImageChops
+
+GFA_ENCODINGS = ("hex", "acs", "z64")
+
+# Tabela de tradução byte -> byte invertido (polaridade Pillow -> ZPL).
+_INVERT = bytes(255 - value for value in range(256))
+
+
+def _padding_mask_table(width: int) -> bytes:
+    """Tabela que zera os bits de preenchimento do último byte de cada linha."""
+    used_bits = width % 8 or 8
+    mask = (0xFF << (8 - used_bits)) & 0xFF
+    return bytes(value & mask for value in range(256))
+
+
+_MASK_TABLES = [_padding_mask_table(bits) for bits in range(8)]
+
+
+def pack_image(image: Image.Image) -> tuple[bytes, int]:
+    """Compacta a imagem em bytes no formato ^GFA. Retorna (dados, bytes_por_linha)."""
+    if image.mode != "1":
+        image = image.convert("1")
+
+    width, height = image.size
+    bytes_per_row = (width + 7) // 8
+    data = bytearray(image.tobytes().translate(_INVERT))
+
+    if width % 8 and height:
+        last = slice(bytes_per_row - 1, None, bytes_per_row)
+        data[last] = data[last].translate(_MASK_TABLES[width % 8])
+
+    return bytes(data), bytes_per_row
+
+
+def crop_to_ink(image: Image.Image) -> tuple[Image.Image, Optional[tuple[int, int, int, int]]]:
+    """Recorta a imagem '1' na menor caixa que contém todos os pixels pretos.
+
+    Retorna (recorte, caixa), com a caixa (esquerda, topo, direita, base) da
+    tinta na imagem original, ou None se não houver tinta (nesse caso o
+    recorte é um único pixel branco, já que o ^GFA não aceita campo vazio).
+    A largura não é arredondada aqui: `pack_image` completa cada linha até o
+    byte com bits brancos, então o campo fica alinhado ao byte sem colunas
+    extras de bitmap.
+    """
+    if image.mode != "1":
+        image = image.convert("1")
+    box = ImageChops.invert(image.convert("L")).getbbox() if image.width and image.height else None
+    if box is None:
+        return Image.new("1", (1, 1), 1), None
+    if box == (0, 0, image.width, image.height):
+        return image, box
+    return image.crop(box), box
+
+
+def gfa_size(width: int, height: int) -> int:
+    """Bytes do bitmap ^GFA de uma imagem width x height (linhas alinhadas ao byte)."""
+    return (width + 7) // 8 * height
+
+
+def image_to_gfa(image: Image.Image, encoding: str = "hex") -> tuple[str, int, int]:
+    """Converte a imagem no campo de dados ^GFA. Retorna (dados, total_bytes, bytes_por_linha)."""
+    data, bytes_per_row = pack_image(image)
+    return encode_gfa(data, bytes_per_row, encoding), len(data), bytes_per_row
+
+
+def encode_gfa(data: bytes, bytes_per_row: int, encoding: str = "hex") -> str:
+    """Campo de dados ^GFA dos bytes compactados, na codificação pedida."""
+    if encoding == "hex":
+        return data.hex().upper()
+    if encoding == "acs":
+        return _encode_acs(data.hex().upper(), bytes_per_row * 2)
+    if encoding == "z64":
+        encoded = base64.b64encode(zlib.compress(data, 9))
+        return f":Z64:{encoded.decode('ascii')}:{binascii.crc_hqx(encoded, 0):04X}"
+    raise ValueError(f"Codificação ^GFA desconhecida: {encoding!r} (use {', '.join(GFA_ENCODINGS)})")
+
+
+def gfa_ratio(total_bytes: int, field: str) -> float:
+    """Quantas vezes o campo ficou menor que o hex sem compressão."""
+    return (total_bytes * 2) / len(field) if field else 1.0
+
+
+# --------------------------------------------------------------------- ACS
+_LOW_COUNTS = "GHIJKLMNOPQRSTUVWXY"  # 1..19
+_HIGH_COUNTS = "ghijklmnopqrstuvwxyz"  # 20, 40, ..., 400
+_MAX_RUN = 400 + 19
+# Só sequências de 3 ou mais: 1 e 2 repetições já são o menor formato
+_RUNS = re.compile(r"([0-9A-F])\1{2,}")
+_repeat_cache: dict[str, str] = {}
+
+
+def _repeat(char: str, count: int) -> str:
+    """`count` repetições de um dígito hex no formato ACS."""
+    parts = []
+    while count > 0:
+        chunk = min(count, _MAX_RUN)
+        count -= chunk
+        if chunk <= 2:
+            parts.append(char * chunk)
+            continue
+        high, low = divmod(chunk, 20)
+        parts.append((_HIGH_COUNTS[high - 1] if high else "") + (_LOW_COUNTS[low - 1] if low else "") + char)
+    return "".join(parts)
+
+
+def _encode_acs(hex_data: str, row_chars: int) -> str:
+    rows = []
+    previous = None
+    for start in range(0, len(hex_data), row_chars):
+        row = hex_data[start:start + row_chars]
+        if row == previous:
+            rows.append(":")
+            continue
+        previous = row
+        # Fim da linha só com 0 (ou F) vira um `,` (ou `!`)
+        body, filler = row.rstrip("0"), ","
+        light = row.rstrip("F")
+        if len(light) < len(body):
+            body, filler = light, "!"
+        if len(body) == len(row):
+            filler = ""
+        rows.append(_RUNS.sub(_compress_run, body) + filler)
+    return "".join(rows)
+
+
+def _compress_run(match: "re.Match[str]") -> str:
+    run = match.group(0)
+    encoded = _repeat_cache.get(run)
+    if encoded is None:
+        encoded = _repeat(run[0], len(run))
+        if len(_repeat_cache) < 4096:
+            _repeat_cache[run] = encoded
+    return encoded
+
+
+def _decode_acs(field: str, total_bytes: int, bytes_per_row: int) -> bytes:
+    row_chars = bytes_per_row * 2
+    rows: list[str] = []
+    row: list[str] = []
+    filled = 0
+    count = 0
+    for char in field:
+        if char in _LOW_COUNTS:
+            count += _LOW_COUNTS.index(char) + 1
+        elif char in _HIGH_COUNTS:
+            count += (_HIGH_COUNTS.index(char) + 1) * 20
+        elif char in "0123456789ABCDEF":
+            repeat = count or 1
+            if filled + repeat > row_chars:
+                raise ValueError("Repetição ACS atravessa o fim da linha")
+            row.append(char * repeat)
+            filled += repeat
+            count = 0
+        elif char in ",!":
+            row.append(("0" if char == "," else "F") * (row_chars - filled))
+            filled = row_chars
+        elif char == ":":
+            if filled or not rows:
+                raise ValueError("`:` fora do início de linha ou sem linha anterior")
+            rows.append(rows[-1])
+            continue
+        else:
+            raise ValueError(f"Caractere inválido no campo ACS: {char!r}")
+        if char not in _LOW_COUNTS and char not in _HIGH_COUNTS and filled == row_chars:
+            rows.append("".join(row))
+            row, filled = [], 0
+    if filled or count:
+        raise ValueError("Campo ACS terminou no meio de uma linha")
+    return bytes.fromhex("".join(rows))
+
+
+def decode_gfa(field: str, total_bytes: int, bytes_per_row: int) -> bytes:
+    """Bytes compactados de um campo ^GFA (hex, ACS ou :Z64:), validando tamanho e CRC.
+
+    Levanta ValueError se o campo estiver malformado.
+    """
+    if field.startswith(":Z64:"):
+        encoded, _, crc = field[5:].rpartition(":")
+        if f"{binascii.crc_hqx(encoded.encode('ascii'), 0):04X}" != crc.upper():
+            raise ValueError("CRC do campo :Z64: não confere")
+        data = zlib.decompress(base64.b64decode(encoded, validate=True))
+    elif re.fullmatch(r"[0-9A-Fa-f]*", field) and len(field) == total_bytes * 2:
+        data = bytes.fromhex(field)
+    else:
+        data = _decode_acs(field, total_bytes, bytes_per_row)
+    if len(data) != total_bytes:
+        raise ValueError(f"Campo ^GFA com {len(data)} bytes, esperado {total_bytes}")
+    return data